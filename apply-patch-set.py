@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Workforce Democracy Project - Patch Set Runner
+Applies several ai-service.js patch scripts as one transaction
+
+What it does:
+1. Loads the PATCH from each patch script, in the order given
+2. Applies them one after another in memory, skipping any the file
+   already passes the checks of
+3. Verifies every patch's checks and `node --check` before touching disk
+4. Creates ONE backup and writes the file ONCE (atomically, via rename)
+5. Reloads the PM2 backend ONCE (zero-downtime, see pm2_reload.py) and
+   waits for the new workers to answer /health
+6. Rolls back to the backup (and reloads again) if any step fails
+
+Usage: python3 apply-patch-set.py [script.py ...] [--file PATH] [--dry-run] [--no-restart]
+
+To patch several backend checkouts at once (canary first), see patch_deploy.py.
+"""
+
+import argparse
+import os
+import sys
+
+import patch_deploy
+from backup_store import BackupStore
+from patch_deploy import DEFAULT_PATCHES, TransactionError, load_patch
+from patch_engine import write_atomic
+from pm2_reload import HEALTH_URL, PM2_APP, ReloadError, reload
+
+AI_SERVICE = '/var/www/workforce-democracy/backend/ai-service.js'
+
+# Colors for output
+class Colors:
+    HEADER = '\033[95m'
+    BLUE = '\033[94m'
+    GREEN = '\033[92m'
+    YELLOW = '\033[93m'
+    RED = '\033[91m'
+    ENDC = '\033[0m'
+    BOLD = '\033[1m'
+
+def print_step(step, message):
+    print(f"{Colors.BLUE}🔧 Step {step}: {message}{Colors.ENDC}")
+
+def print_success(message):
+    print(f"{Colors.GREEN}   ✅ {message}{Colors.ENDC}")
+
+def print_warning(message):
+    print(f"{Colors.YELLOW}   ⚠️  {message}{Colors.ENDC}")
+
+def print_error(message):
+    print(f"{Colors.RED}   ❌ {message}{Colors.ENDC}")
+
+_LOG = {'success': print_success, 'warning': print_warning}
+
+def _log(level, message):
+    _LOG[level](message)
+
+def compose(text, patches):
+    """Applies each patch to the previous one's output (see patch_deploy)"""
+    return patch_deploy.compose(text, patches, _log)
+
+def check_syntax(text):
+    patch_deploy.check_syntax(text, _log)
+
+def reload_backend(target, health_url):
+    """Reloads the backend next to target and waits for its new workers"""
+    ecosystem = os.path.join(os.path.dirname(os.path.abspath(target)), 'ecosystem.config.js')
+    try:
+        data = reload(PM2_APP, ecosystem, health_url)
+    except ReloadError as e:
+        raise TransactionError(str(e))
+    pid = f" (pid {data['pid']})" if data.get('pid') else ''
+    print_success(f"New backend workers healthy{pid}")
+
+def rollback(target, store, backup, restart, health_url):
+    print_error("Rolling back...")
+    store.restore(target, backup['hash'])
+    print_warning(f"Restored {target} from backup {backup['hash'][:12]}")
+    if restart:
+        try:
+            reload_backend(target, health_url)
+            print_warning("Backend reloaded on the previous code")
+        except TransactionError as e:
+            print_error(f"Reload after rollback failed too: {e}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply ai-service.js patch scripts as one transaction")
+    parser.add_argument('patches', nargs='*', default=DEFAULT_PATCHES,
+                        help="patch scripts to apply, in order (default: all four)")
+    parser.add_argument('--file', default=AI_SERVICE, help="file to patch")
+    parser.add_argument('--dry-run', action='store_true', help="verify only, don't write or restart")
+    parser.add_argument('--no-restart', action='store_true', help="write the file but don't reload PM2")
+    parser.add_argument('--health-url', default=HEALTH_URL, help="polled after the reload")
+    args = parser.parse_args()
+
+    print(f"{Colors.HEADER}{'=' * 64}")
+    print("  Workforce Democracy - Patch Set Transaction")
+    print(f"{'=' * 64}{Colors.ENDC}\n")
+
+    if not os.path.exists(args.file):
+        print_error(f"{args.file} not found")
+        sys.exit(1)
+
+    # Step 1: Compose every patch in memory
+    print_step(1, f"Applying {len(args.patches)} patches in memory...")
+    with open(args.file, 'r', encoding='utf-8') as f:
+        original = f.read()
+    try:
+        patches = [load_patch(script) for script in args.patches]
+        updated = compose(original, patches)
+        if updated == original:
+            print_success("Nothing to do - every patch is already applied\n")
+            return
+        # Step 2: Verify before touching disk
+        print()
+        print_step(2, "Verifying patched file...")
+        check_syntax(updated)
+    except TransactionError as e:
+        print_error(str(e))
+        print_warning(f"{args.file} was not modified")
+        sys.exit(1)
+    print()
+
+    if args.dry_run:
+        print_success("Dry run - all patches verified, nothing written\n")
+        return
+
+    # Step 3: One backup, one atomic write
+    print_step(3, "Creating backup and writing file...")
+    store = BackupStore.for_file(args.file)
+    backup = store.backup(args.file, "pre-patch-set")
+    print_success(f"Backup created: {backup['hash'][:12]} in {store.root}")
+
+    restart = not args.no_restart
+    try:
+        write_atomic(args.file, updated)
+        print_success(f"{args.file} updated\n")
+
+        # Step 4: One reload
+        if restart:
+            print_step(4, "Reloading PM2 backend...")
+            reload_backend(args.file, args.health_url)
+    except (TransactionError, OSError) as e:
+        print_error(str(e))
+        rollback(args.file, store, backup, restart, args.health_url)
+        sys.exit(1)
+
+    print(f"\n{Colors.GREEN}✅ SUCCESS! {len(patches)} patches applied{Colors.ENDC}\n")
+    print(f"Backup saved as: {backup['hash'][:12]} (pre-patch-set)")
+    print(f"To rollback if needed: python3 backup_store.py restore {args.file} {backup['hash'][:12]} && pm2 reload {PM2_APP}\n")
+
+if __name__ == "__main__":
+    main()
@@ -5,18 +5,24 @@ This script applies the citation mismatch fix to ai-service.js
 
 What it does:
 1. Creates backup of current ai-service.js
-2. Applies v37.5.0 changes (pre-search sources before LLM call)
-3. Restarts PM2 backend
+2. Applies v37.5.0 changes (pre-search sources before LLM call) in one
+   pass through patch_engine, so no change shifts another's lines
+3. Reloads PM2 backend without downtime and waits for /health
 4. Shows startup logs to verify the fix loaded
 
 Usage: python3 apply-v37.5.0-citation-fix.py
 """
 
 import os
+import re
 import sys
 import subprocess
-from datetime import datetime
-import shutil
+
+from backup_store import BackupStore
+from patch_deploy import TransactionError, check_syntax
+from patch_engine import (APPLIED, InsertAfter, Patch, PatchError, ReplaceBetween,
+                          ReplaceLine, ReplaceText, Source, apply_edits, write_atomic)
+from pm2_reload import ReloadError, reload
 
 # Colors for output
 class Colors:
@@ -40,6 +46,11 @@ def print_warning(message):
 def print_error(message):
     print(f"{Colors.RED}   ❌ {message}{Colors.ENDC}")
 
+_LOG = {'success': print_success, 'warning': print_warning}
+
+def _log(level, message):
+    _LOG[level](message)
+
 def run_command(cmd, shell=False):
     """Run a command and return output"""
     try:
@@ -52,85 +63,8 @@ def run_command(cmd, shell=False):
         print_error(f"Command failed: {e}")
         return None
 
-def main():
-    print(f"{Colors.HEADER}{'=' * 64}")
-    print("  Workforce Democracy - v37.5.0 Citation Fix Deployment")
-    print(f"{'=' * 64}{Colors.ENDC}\n")
-    
-    # Step 1: Navigate to backend directory
-    backend_dir = "/var/www/workforce-democracy/backend"
-    ai_service_file = os.path.join(backend_dir, "ai-service.js")
-    
-    if not os.path.exists(ai_service_file):
-        print_error(f"ai-service.js not found at {ai_service_file}")
-        sys.exit(1)
-    
-    os.chdir(backend_dir)
-    print_success(f"Working directory: {backend_dir}\n")
-    
-    # Step 2: Create backup
-    print_step(1, "Creating backup...")
-    timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
-    backup_file = f"ai-service-BACKUP-pre-v37.5.0-{timestamp}.js"
-    shutil.copy2(ai_service_file, backup_file)
-    print_success(f"Backup created: {backup_file}\n")
-    
-    # Step 3: Read current file
-    print_step(2, "Reading current ai-service.js...")
-    with open(ai_service_file, 'r', encoding='utf-8') as f:
-        content = f.read()
-    
-    lines = content.split('\n')
-    print_success(f"Read {len(lines)} lines\n")
-    
-    # Step 4: Apply v37.5.0 changes
-    print_step(3, "Applying v37.5.0 changes...")
-    
-    # Change 1: Update header version
-    for i, line in enumerate(lines):
-        if "WORKFORCE DEMOCRACY PROJECT - AI Service (CONSOLIDATED v37.1.0)" in line:
-            lines[i] = line.replace("v37.1.0", "v37.5.0")
-            print_success("Updated version header to v37.5.0")
-            break
-    
-    # Change 2: Add v37.5.0 feature description
-    for i, line in enumerate(lines):
-        if "- From llm-proxy.js: Smart caching, NEWS_SOURCES, searchAdditionalSources" in line:
-            lines.insert(i + 1, " * - v37.5.0: Pre-search sources BEFORE LLM call to fix citation mismatches")
-            print_success("Added v37.5.0 feature description")
-            break
-    
-    # Change 3: Add startup markers after header comment
-    for i, line in enumerate(lines):
-        if line.strip() == "*/" and i < 30:  # Header comment closing
-            # Insert console.log statements after the closing comment
-            insert_pos = i + 1
-            new_lines = [
-                "",
-                "console.log('🚀🚀🚀 AI-SERVICE.JS v37.5.0 LOADED - CITATION FIX ACTIVE 🚀🚀🚀');",
-                "console.log('📅 File loaded at:', new Date().toISOString());",
-                "console.log('✨ Features: Pre-search sources BEFORE LLM call to prevent citation mismatches');"
-            ]
-            for j, new_line in enumerate(new_lines):
-                lines.insert(insert_pos + j, new_line)
-            print_success("Added startup log markers")
-            break
-    
-    # Change 4: Update buildContextualPrompt function signature
-    for i, line in enumerate(lines):
-        if "function buildContextualPrompt(query, context, chatType) {" in line:
-            lines[i] = "function buildContextualPrompt(query, context, chatType, preFetchedSources = []) {"
-            print_success("Updated buildContextualPrompt function signature")
-            break
-    
-    # Change 5: Add pre-fetched sources to prompt (after governmentData section)
-    for i, line in enumerate(lines):
-        if "// Add government data if available" in line:
-            # Find the closing brace (3 lines down typically)
-            for j in range(i, min(i + 10, len(lines))):
-                if lines[j].strip() == "}":
-                    insert_pos = j + 1
-                    presearch_section = """    
+# JavaScript inserted by the v37.5.0 changes
+PRESEARCH_SECTION = """    
     // V37.5.0: Add pre-fetched sources (NEW!)
     // This is the critical fix - LLM now sees sources BEFORE generating response
     if (preFetchedSources && preFetchedSources.length > 0) {
@@ -148,21 +82,8 @@ def main():
         });
         prompt += `\\nREMEMBER: You have ${preFetchedSources.length} sources. Only use [1] through [${preFetchedSources.length}] in your response.\\n\\n`;
     }"""
-                    lines.insert(insert_pos, presearch_section)
-                    print_success("Added pre-fetched sources to LLM prompt")
-                    break
-            break
-    
-    # Change 6: Add Phase 1 pre-search (after systemPrompt declaration)
-    for i, line in enumerate(lines):
-        if "For NYC mayoral race or other local elections happening" in line and "you WILL receive up-to-date sources" in lines[i+1]:
-            # Find the next line that's not part of the template string
-            for j in range(i, min(i + 20, len(lines))):
-                if "const response = await axios.post" in lines[j]:
-                    insert_pos = j - 1
-                    # Remove old code between systemPrompt and axios.post if it exists
-                    # We'll insert the new Phase 1 code here
-                    presearch_phase = """        
+
+PRESEARCH_PHASE = """        
         // =============================================================================
         // PHASE 1: Search for sources FIRST (v37.5.0 FIX)
         // =============================================================================
@@ -212,18 +133,8 @@ def main():
         // =============================================================================
         // PHASE 2: Call LLM with sources already available
         // ============================================================================="""
-                    lines.insert(insert_pos, presearch_phase)
-                    print_success("Added Phase 1 pre-search and Phase 2 LLM call")
-                    break
-            break
-    
-    # Change 7: Update source return logic (after aiText assignment)
-    for i, line in enumerate(lines):
-        if "const aiText = response.data.choices[0].message.content;" in line:
-            # Look for the section between aiText and the return statement
-            # Replace old source extraction with new v37.5.0 logic
-            insert_pos = i + 2  # After usage line
-            new_source_logic = """        
+
+NEW_SOURCE_LOGIC = """        
         console.log(`✅ AI response: "${aiText.substring(0, 50)}..."`);
         
         // V37.5.0: Sources already validated and deduplicated before LLM call
@@ -231,32 +142,121 @@ def main():
         const validSources = uniqueSources; // Use the same sources we gave to LLM
         
         console.log(`✅ Returning ${validSources.length} sources (same as provided to LLM)`);"""
-            
-            # Find and remove old source extraction code
-            for j in range(i + 1, min(i + 50, len(lines))):
-                if "return {" in lines[j]:
-                    # Delete lines between i+2 and j-1
-                    del lines[i+2:j]
-                    # Insert new logic
-                    lines.insert(i+2, new_source_logic)
-                    print_success("Updated source return logic")
-                    break
-            break
+
+# The last two lines of the system prompt, on consecutive lines
+SYSTEM_PROMPT_END = re.compile(r'For NYC mayoral race or other local elections happening[^\n]*\n'
+                               r'[^\n]*you WILL receive up-to-date sources')
+
+def citation_fix_edits():
+    """The v37.5.0 changes, resolved against the unpatched file in one pass"""
+    return [
+        # Change 1: Update header version
+        ReplaceText("Updated version header to v37.5.0",
+                    "WORKFORCE DEMOCRACY PROJECT - AI Service (CONSOLIDATED v37.1.0)",
+                    "v37.5.0", old="v37.1.0"),
+        # Change 2: Add v37.5.0 feature description
+        InsertAfter("Added v37.5.0 feature description",
+                    "- From llm-proxy.js: Smart caching, NEWS_SOURCES, searchAdditionalSources",
+                    " * - v37.5.0: Pre-search sources BEFORE LLM call to fix citation mismatches",
+                    required=False),
+        # Change 3: Add startup markers after header comment (it closes in the first 30 lines)
+        InsertAfter("Added startup log markers", re.compile(r'^\s*\*/\s*$', re.M), window=30, lines=[
+            "",
+            "console.log('🚀🚀🚀 AI-SERVICE.JS v37.5.0 LOADED - CITATION FIX ACTIVE 🚀🚀🚀');",
+            "console.log('📅 File loaded at:', new Date().toISOString());",
+            "console.log('✨ Features: Pre-search sources BEFORE LLM call to prevent citation mismatches');",
+        ]),
+        # Change 4: Update buildContextualPrompt function signature
+        ReplaceLine("Updated buildContextualPrompt function signature",
+                    "function buildContextualPrompt(query, context, chatType) {",
+                    "function buildContextualPrompt(query, context, chatType, preFetchedSources = []) {"),
+        # Change 5: Add pre-fetched sources to prompt (after governmentData section,
+        # whose closing brace is within 10 lines of its comment)
+        InsertAfter("Added pre-fetched sources to LLM prompt", re.compile(r'^\s*\}\s*$', re.M),
+                    PRESEARCH_SECTION, within="buildContextualPrompt",
+                    after="// Add government data if available", window=10),
+        # Change 6: Add Phase 1 pre-search (after systemPrompt declaration),
+        # replacing the old userMessage code up to the axios call, which must
+        # follow within 20 lines of the end of the system prompt
+        ReplaceBetween("Added Phase 1 pre-search and Phase 2 LLM call", SYSTEM_PROMPT_END,
+                       "const response = await axios.post", PRESEARCH_PHASE, offset=1, limit=20),
+        # Change 7: Update source return logic (after aiText assignment)
+        ReplaceBetween("Updated source return logic",
+                       "const aiText = response.data.choices[0].message.content;",
+                       "return {", NEW_SOURCE_LOGIC, offset=1, limit=50),
+        # Change 8: Update buildContextualPrompt comment
+        InsertAfter("Updated buildContextualPrompt comment",
+                    "Build contextual prompt with available data",
+                    " * V37.5.0: Now includes pre-searched sources so LLM knows what to cite",
+                    unless=" * V37.5.0: Now includes pre-searched sources", required=False),
+    ]
+
+PATCH = Patch("v37.5.0 citation fix", citation_fix_edits(), [
+    ("v37.5.0 version marker", "v37.5.0"),
+    ("Startup rockets", "🚀🚀🚀 AI-SERVICE.JS v37.5.0 LOADED"),
+    ("Pre-search code", "Pre-searching sources before LLM call"),
+    ("Phase 1 comment", "PHASE 1: Search for sources FIRST"),
+    ("Updated function signature", "buildContextualPrompt(query, context, chatType, preFetchedSources = [])"),
+])
+
+def main():
+    print(f"{Colors.HEADER}{'=' * 64}")
+    print("  Workforce Democracy - v37.5.0 Citation Fix Deployment")
+    print(f"{'=' * 64}{Colors.ENDC}\n")
+    
+    # Step 1: Navigate to backend directory
+    backend_dir = "/var/www/workforce-democracy/backend"
+    ai_service_file = os.path.join(backend_dir, "ai-service.js")
+    
+    if not os.path.exists(ai_service_file):
+        print_error(f"ai-service.js not found at {ai_service_file}")
+        sys.exit(1)
     
-    # Change 8: Update buildContextualPrompt comment
-    for i, line in enumerate(lines):
-        if "Build contextual prompt with available data" in line and "V37.5.0" not in lines[i+1]:
-            lines.insert(i + 1, " * V37.5.0: Now includes pre-searched sources so LLM knows what to cite")
-            print_success("Updated buildContextualPrompt comment")
-            break
+    os.chdir(backend_dir)
+    print_success(f"Working directory: {backend_dir}\n")
+    
+    # Step 2: Read current file
+    print_step(1, "Reading current ai-service.js...")
+    source = Source.read(ai_service_file)
+    print_success(f"Read {len(source.lines)} lines, indexed {len(source.functions)} functions\n")
+    
+    # Step 3: Apply v37.5.0 changes
+    print_step(2, "Applying v37.5.0 changes...")
+    try:
+        updated_content, report = apply_edits(source, PATCH.edits)
+    except PatchError as e:
+        print_error(f"Could not apply changes: {e}")
+        print_warning(f"{ai_service_file} was not modified")
+        sys.exit(1)
+    
+    for name, status in report:
+        if status == APPLIED:
+            print_success(name)
+        else:
+            print_warning(f"{name}: {status}")
     
     print()
     
+    if updated_content == ''.join(source.lines):
+        print_success("v37.5.0 changes already present - nothing to do")
+        return
+    
+    try:
+        check_syntax(updated_content, _log)
+    except TransactionError as e:
+        print_error(str(e))
+        print_warning(f"{ai_service_file} was not modified")
+        sys.exit(1)
+    
+    # Step 4: Create backup, now that the file is known to change
+    print_step(3, "Creating backup...")
+    store = BackupStore.for_file(ai_service_file)
+    backup = store.backup(ai_service_file, "pre-v37.5.0")
+    print_success(f"Backup created: {backup['hash'][:12]} in {store.root}\n")
+    
     # Step 5: Write updated file
     print_step(4, "Writing updated ai-service.js...")
-    updated_content = '\n'.join(lines)
-    with open(ai_service_file, 'w', encoding='utf-8') as f:
-        f.write(updated_content)
+    write_atomic(ai_service_file, updated_content)
     print_success(f"File updated successfully\n")
     
     # Step 6: Verify changes
@@ -264,13 +264,7 @@ def main():
     with open(ai_service_file, 'r', encoding='utf-8') as f:
         verify_content = f.read()
     
-    checks = [
-        ("v37.5.0 version marker", "v37.5.0" in verify_content),
-        ("Startup rockets", "🚀🚀🚀 AI-SERVICE.JS v37.5.0 LOADED" in verify_content),
-        ("Pre-search code", "Pre-searching sources before LLM call" in verify_content),
-        ("Phase 1 comment", "PHASE 1: Search for sources FIRST" in verify_content),
-        ("Updated function signature", "buildContextualPrompt(query, context, chatType, preFetchedSources = [])" in verify_content),
-    ]
+    checks = [(check_name, expected in verify_content) for check_name, expected in PATCH.checks]
     
     all_passed = True
     for check_name, passed in checks:
@@ -282,23 +276,30 @@ def main():
     
     if not all_passed:
         print_error("\nSome checks failed! Restoring from backup...")
-        shutil.copy2(backup_file, ai_service_file)
-        print_warning(f"Restored from {backup_file}")
+        store.restore(ai_service_file, backup['hash'])
+        print_warning(f"Restored from backup {backup['hash'][:12]}")
         sys.exit(1)
     
     print()
     
-    # Step 7: Restart PM2
-    print_step(6, "Restarting PM2 backend...")
-    run_command("pm2 stop backend", shell=True)
-    run_command("pm2 delete backend", shell=True)
-    run_command("pm2 start server.js --name backend", shell=True)
-    print_success("PM2 restarted\n")
+    # Step 7: Zero-downtime reload, done once the new workers answer /health
+    print_step(6, "Reloading PM2 backend...")
+    try:
+        health = reload(ecosystem=os.path.join(backend_dir, "ecosystem.config.js"))
+    except ReloadError as e:
+        print_error(f"Reload failed: {e}")
+        print_error("Restoring from backup...")
+        store.restore(ai_service_file, backup['hash'])
+        try:
+            reload(ecosystem=os.path.join(backend_dir, "ecosystem.config.js"))
+        except ReloadError as e:
+            print_error(f"Reload of the backup failed too: {e}")
+        print_warning(f"Restored from backup {backup['hash'][:12]}")
+        sys.exit(1)
+    print_success(f"New backend worker healthy (pid {health.get('pid', '?')})\n")
     
     # Step 8: Show logs
     print_step(7, "Checking startup logs for v37.5.0 markers...")
-    import time
-    time.sleep(2)
     print()
     print(f"{Colors.HEADER}{'=' * 64}{Colors.ENDC}")
     logs = run_command("pm2 logs backend --lines 30 --nostream", shell=True)
@@ -323,8 +324,8 @@ def main():
         print_warning("The changes were applied to the file, but may not be loading correctly.")
         print("Please check the full logs with: pm2 logs backend\n")
     
-    print(f"Backup saved as: {backup_file}")
-    print(f"To rollback if needed: cp {backup_file} ai-service.js && pm2 restart backend\n")
+    print(f"Backup saved as: {backup['hash'][:12]} (pre-v37.5.0)")
+    print(f"To rollback if needed: python3 backup_store.py restore {ai_service_file} {backup['hash'][:12]} && pm2 reload backend\n")
     print(f"{Colors.HEADER}{'=' * 64}{Colors.ENDC}")
 
 if __name__ == "__main__":
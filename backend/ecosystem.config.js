@@ -6,9 +6,17 @@ module.exports = {
     script: 'server.js',
     cwd: path.resolve(__dirname),
     instances: 1,
+    // cluster mode so `pm2 reload` starts the new worker before stopping the old one.
+    // A reload keeps the mode the app is running in: if `pm2 jlist` shows
+    // fork_mode, switch it once with `pm2 delete backend && pm2 start ecosystem.config.js --only backend`
+    exec_mode: 'cluster',
+    listen_timeout: 10000,
+    kill_timeout: 5000,
     autorestart: true,
     watch: false,
     max_memory_restart: '1G',
+    // timestamped log lines, so log_analyzer.py can time each request's phases
+    log_date_format: 'YYYY-MM-DDTHH:mm:ss.SSSZ',
     env: {
       NODE_ENV: 'production',
       PORT: 3001
@@ -586,7 +586,8 @@ const isLocalCandidateQuery = candidateKeywords.some(keyword =>
  * Health check
  */
 app.get('/health', (req, res) => {
-    res.json({ status: 'ok', timestamp: new Date().toISOString() });
+    // pid lets deploy scripts tell a reloaded worker from the old one
+    res.json({ status: 'ok', timestamp: new Date().toISOString(), pid: process.pid });
 });
 
 /**
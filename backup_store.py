@@ -0,0 +1,238 @@
+"""
+Content-addressed backup store for the files the patch scripts change
+
+Instead of a full `ai-service-BACKUP-<patch>-<timestamp>.js` copy next
+to the live file for every run, each unique version is stored once,
+gzip-compressed, under its SHA-256:
+
+    .backups/objects/ab/cdef....gz
+    .backups/index.jsonl    one line per backup: file, patch, time, hash, size
+
+By default the store is a `.backups` directory next to the backed-up
+file, so ai-service.js and its backups stay together.
+
+    from backup_store import BackupStore
+
+    store = BackupStore.for_file('ai-service.js')
+    entry = store.backup('ai-service.js', 'pre-v37.5.0')
+    ...
+    store.restore('ai-service.js', entry['hash'])
+
+Command line:
+
+    python3 backup_store.py list [FILE]
+    python3 backup_store.py save FILE [--patch NAME]
+    python3 backup_store.py restore FILE [REF]     REF: hash prefix, patch name or time prefix
+    python3 backup_store.py prune [--keep N] [FILE]
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+from patch_engine import write_atomic
+
+STORE_DIR = '.backups'
+KEEP = 10
+GRACE = 3600            # seconds an unreferenced object is left alone
+
+
+class BackupError(Exception):
+    """No backup matches (or a ref is ambiguous), or a stored object is
+    missing or corrupt."""
+
+
+class BackupStore:
+    """Deduplicated, compressed file versions plus an append-only index."""
+
+    def __init__(self, root=STORE_DIR):
+        self.root = root
+        self.index_path = os.path.join(root, 'index.jsonl')
+
+    @classmethod
+    def for_file(cls, path):
+        return cls(os.path.join(os.path.dirname(os.path.abspath(path)), STORE_DIR))
+
+    def _object_path(self, digest):
+        return os.path.join(self.root, 'objects', digest[:2], digest[2:] + '.gz')
+
+    def entries(self, path=None):
+        """Index entries, oldest first, for one file or all of them"""
+        if not os.path.exists(self.index_path):
+            return []
+        target = os.path.abspath(path) if path else None
+        with open(self.index_path, 'r', encoding='utf-8') as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+        if target:
+            entries = [entry for entry in entries if entry['file'] == target]
+        return entries
+
+    def backup(self, path, patch):
+        """Stores path's current contents (once per unique version) and
+        records it under patch. Returns the index entry - the existing one
+        when the newest backup of path already holds these contents."""
+        with open(path, 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        previous = self.entries(path)
+        if previous and previous[-1]['hash'] == digest and os.path.exists(self._object_path(digest)):
+            return previous[-1]
+        object_path = self._object_path(digest)
+        if not os.path.exists(object_path):
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            write_atomic(object_path, gzip.compress(data, compresslevel=6, mtime=0))
+        entry = {
+            'file': os.path.abspath(path),
+            'patch': patch,
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'hash': digest,
+            'size': len(data),
+        }
+        with open(self.index_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry) + '\n')
+        return entry
+
+    def find(self, path, ref=None):
+        """The newest backup of path matching ref (a hash prefix, a patch
+        name or a time prefix); the newest of all when ref is None. A ref
+        that picks out different versions - two hashes, or a patch name
+        and a time prefix that disagree - is ambiguous."""
+        entries = self.entries(path)
+        if ref is None:
+            if entries:
+                return entries[-1]
+            raise BackupError(f"no backup of {path}")
+        # oldest first, so the newest match of each kind is kept
+        matches = {}
+        hashes = set()
+        for entry in entries:
+            if entry['hash'].startswith(ref):
+                matches['hash prefix'] = entry
+                hashes.add(entry['hash'])
+            if entry['patch'] == ref:
+                matches['patch name'] = entry
+            if entry['time'].startswith(ref):
+                matches['time'] = entry
+        if not matches:
+            raise BackupError(f"no backup of {path} matching {ref!r}")
+        if len(hashes) > 1:
+            raise BackupError(f"{ref!r} is ambiguous: a prefix of {len(hashes)} backup hashes of {path}")
+        if len({entry['hash'] for entry in matches.values()}) > 1:
+            found = ', '.join(f"{kind} -> {entry['hash'][:12]}" for kind, entry in matches.items())
+            raise BackupError(f"{ref!r} is ambiguous for {path} ({found}); use a longer hash prefix")
+        return max(matches.values(), key=entries.index)
+
+    def read(self, digest):
+        try:
+            with open(self._object_path(digest), 'rb') as f:
+                data = gzip.decompress(f.read())
+        except (OSError, EOFError) as e:
+            raise BackupError(f"backup object {digest[:12]} unreadable: {e}")
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise BackupError(f"backup object {digest[:12]} is corrupt")
+        return data
+
+    def restore(self, path, ref=None):
+        """Atomically puts a backed-up version back at path; returns its entry"""
+        entry = self.find(path, ref)
+        write_atomic(path, self.read(entry['hash']))
+        return entry
+
+    def prune(self, keep=KEEP, path=None):
+        """Keeps the newest keep backups of each file (or only prunes
+        path's) and deletes stored objects nothing refers to any more -
+        only finished ones, and none written in the last GRACE seconds,
+        which a backup() in another process may not have indexed yet.
+        Returns (entries removed, objects removed)."""
+        entries = self.entries()
+        target = os.path.abspath(path) if path else None
+        per_file = {}
+        for entry in entries:
+            per_file.setdefault(entry['file'], []).append(entry)
+        dropped = set()
+        for file, versions in per_file.items():
+            if target is None or file == target:
+                dropped.update(id(entry) for entry in versions[:max(0, len(versions) - keep)])
+        kept = [entry for entry in entries if id(entry) not in dropped]
+        if dropped:
+            write_atomic(self.index_path, ''.join(json.dumps(entry) + '\n' for entry in kept))
+
+        referenced = {entry['hash'] for entry in kept}
+        removed = 0
+        objects = os.path.join(self.root, 'objects')
+        for prefix in (os.listdir(objects) if os.path.isdir(objects) else []):
+            directory = os.path.join(objects, prefix)
+            for name in os.listdir(directory):
+                object_path = os.path.join(directory, name)
+                if (name.endswith('.gz') and not name.startswith('.')
+                        and prefix + name[:-len('.gz')] not in referenced
+                        and time.time() - os.path.getmtime(object_path) > GRACE):
+                    os.unlink(object_path)
+                    removed += 1
+            if not os.listdir(directory):
+                os.rmdir(directory)
+        return len(dropped), removed
+
+
+def _size(n):
+    return f"{n / 1024:.1f} KB" if n >= 1024 else f"{n} B"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Content-addressed backups of patched files")
+    parser.add_argument('--store', help="store directory (default: .backups next to FILE, or ./.backups)")
+    commands = parser.add_subparsers(dest='command', required=True)
+    command = commands.add_parser('list', help="list backups, newest last")
+    command.add_argument('file', nargs='?')
+    command = commands.add_parser('save', help="back up a file")
+    command.add_argument('file')
+    command.add_argument('--patch', default='manual')
+    command = commands.add_parser('restore', help="restore a file (newest backup by default)")
+    command.add_argument('file')
+    command.add_argument('ref', nargs='?', help="hash prefix, patch name or time prefix")
+    command = commands.add_parser('prune', help="keep only the newest backups of each file")
+    command.add_argument('file', nargs='?')
+    command.add_argument('--keep', type=int, default=KEEP)
+    args = parser.parse_args()
+
+    if args.store:
+        store = BackupStore(args.store)
+    elif args.file:
+        store = BackupStore.for_file(args.file)
+    else:
+        store = BackupStore()
+
+    try:
+        if args.command == 'list':
+            entries = store.entries(args.file)
+            current = {}
+            for entry in entries:
+                if entry['file'] not in current and os.path.exists(entry['file']):
+                    with open(entry['file'], 'rb') as f:
+                        current[entry['file']] = hashlib.sha256(f.read()).hexdigest()
+                marker = '  (current)' if current.get(entry['file']) == entry['hash'] else ''
+                print(f"{entry['time']}  {entry['hash'][:12]}  {_size(entry['size']):>9}  "
+                      f"{entry['patch']:<24} {os.path.relpath(entry['file'])}{marker}")
+            if not entries:
+                print("No backups")
+        elif args.command == 'save':
+            entry = store.backup(args.file, args.patch)
+            print(f"📦 Backed up {args.file} as {entry['hash'][:12]} ({args.patch})")
+        elif args.command == 'restore':
+            entry = store.restore(args.file, args.ref)
+            print(f"✅ Restored {args.file} from {entry['hash'][:12]} ({entry['patch']}, {entry['time']})")
+        elif args.command == 'prune':
+            entries, objects = store.prune(args.keep, args.file)
+            print(f"🧹 Removed {entries} index entries and {objects} stored versions")
+    except (BackupError, OSError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Off-peak cache warmer for the chat pipeline
+
+analyzeSourceGaps (generated by enhance-prompting.py) sends the same
+fixed follow-up searches for every query in a category - "SNAP benefits
+cuts 2025 statistics dollar amounts" and so on - and the same user
+questions come back day after day. The first of each after a restart
+pays the full search and scraping latency: the article (24h) and RSS
+(1h) caches live in the backend process, and the response cache only
+knows a question once somebody has asked it.
+
+This replays, at a gentle rate and inside the quiet hours:
+
+1. the most frequent user queries in the PM2 logs (with their chat type,
+   which is part of the response cache key)
+2. every static follow-up query in enhance-prompting.py's CATEGORIES
+   (as a chat query its pre-search runs the same search the follow-up
+   does, so the same articles end up in the cache)
+
+through POST /api/chat/query, and appends what each replay found
+(response cache hit or not, response time) to a runs file. --report
+then compares real traffic in the logs before and after the last run:
+cache-hit rate and response time, for the warmed queries and overall.
+
+The request that asked for this pointed at smart-cache-manager.js's
+DAILY/WEEKLY tiers; only chart-generator.js uses that class, so the
+caches warmed here are the ones the chat path actually reads.
+
+Usage:
+    python3 cache_warmer.py --dry-run                # what would be replayed
+    python3 cache_warmer.py --quiet-hours 2-5 --rate 4 --top 40
+    python3 cache_warmer.py --report --hours 12
+
+The report needs timestamped log lines (log_date_format in
+backend/ecosystem.config.js).
+"""
+
+import argparse
+import datetime
+import glob
+import importlib.util
+import json
+import os
+import re
+import statistics
+import sys
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+
+from log_analyzer import LOGS, read_new
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+RUNS = os.path.join(SCRIPT_DIR, 'cache-warmer-runs.jsonl')
+CATEGORY_SCRIPT = os.path.join(SCRIPT_DIR, 'enhance-prompting.py')
+URL = 'http://127.0.0.1:3001/api/chat/query'
+USER_ID = 'cache-warmer'
+TOP = 50
+MIN_COUNT = 2
+RATE = 6                # queries per minute
+QUIET_HOURS = '2-5'
+TIMEOUT = 120
+HIT = ('cache', 'database')
+
+
+# =============================================================================
+# WHAT TO REPLAY
+# =============================================================================
+
+def normalize(query):
+    """server.js's normalizeQuery - queries equal after this share a
+    response cache entry"""
+    return re.sub(r'\s+', ' ', re.sub(r'[^\w\s]', '', query.lower().strip(), flags=re.ASCII))
+
+
+def log_records(patterns):
+    """Every finished request record in the logs (read from the start)"""
+    paths = sorted({path for pattern in patterns for path in glob.glob(os.path.expanduser(pattern))})
+    records = []
+    for path in paths:
+        _, finished, _ = read_new(path, {})
+        records.extend(finished)
+    return records
+
+
+def real_traffic(records, runs):
+    """records without the warmer's own replays: anything logged while a
+    run was going. Lines without a timestamp can't be placed and are kept."""
+    spans = [(run['started'], run['finished']) for run in runs]
+    return [record for record in records
+            if record['at'] is None or not any(start <= record['at'] <= end for start, end in spans)]
+
+
+def hot_queries(records, top=TOP, min_count=MIN_COUNT):
+    """[(chat type, query, times asked)], most asked first, in the
+    spelling users used most"""
+    counts = Counter()
+    spellings = {}
+    for record in records:
+        key = (record['chat'], normalize(record['query']))
+        counts[key] += 1
+        spellings.setdefault(key, Counter())[record['query']] += 1
+    return [(chat, spellings[(chat, norm)].most_common(1)[0][0], count)
+            for (chat, norm), count in counts.most_common(top) if count >= min_count]
+
+
+def follow_up_queries(script=CATEGORY_SCRIPT):
+    """The static follow-ups of every category; the fallback ones are
+    built from the user's query, so there is nothing to warm for them"""
+    spec = importlib.util.spec_from_file_location('enhance_prompting', script)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return [query for _, _, queries in module.CATEGORIES for query in queries if '{query}' not in query]
+
+
+def plan(hot, follow_ups, chat_type='general'):
+    """[(chat type, query, why)] - hot queries first, no duplicates"""
+    seen = set()
+    queue = []
+    for chat, query, count in hot:
+        seen.add((chat, normalize(query)))
+        queue.append((chat, query, f"asked {count}x"))
+    for query in follow_ups:
+        if (chat_type, normalize(query)) not in seen:
+            seen.add((chat_type, normalize(query)))
+            queue.append((chat_type, query, 'follow-up'))
+    return queue
+
+
+# =============================================================================
+# REPLAY
+# =============================================================================
+
+def quiet_hours(text):
+    start, _, end = text.partition('-')
+    return int(start) % 24, int(end) % 24
+
+
+def in_window(window, now):
+    start, end = window
+    hour = now.hour
+    return start <= hour < end if start < end else hour >= start or hour < end
+
+
+def seconds_until(window, now):
+    """Seconds until the window next opens (0 if it is open)"""
+    if in_window(window, now):
+        return 0
+    opens = now.replace(hour=window[0], minute=0, second=0, microsecond=0)
+    if opens <= now:
+        opens += datetime.timedelta(days=1)
+    return (opens - now).total_seconds()
+
+
+def replay(url, chat_type, query, timeout=TIMEOUT):
+    """One chat request; returns the result entry for the runs file"""
+    body = json.dumps({'chat_type': chat_type, 'user_id': USER_ID, 'query': query}).encode()
+    request = urllib.request.Request(url, data=body, headers={'Content-Type': 'application/json'})
+    started = time.monotonic()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            data = json.loads(response.read())
+        error = None if data.get('success') else data.get('error', 'failed')
+    except (urllib.error.URLError, OSError, ValueError) as e:
+        data, error = {}, str(getattr(e, 'reason', e))
+    return {
+        'chat': chat_type, 'query': query, 'source': data.get('source'), 'error': error,
+        'ms': data.get('response_time_ms', round((time.monotonic() - started) * 1000)),
+    }
+
+
+def warm(queue, url, rate=RATE, window=None, on_result=None):
+    """Replays queue at rate per minute, stopping early if the quiet
+    window closes or on Ctrl-C. Returns the run record."""
+    run = {'started': time.time(), 'url': url, 'results': []}
+    interval = 60 / rate
+    try:
+        for chat, query, _ in queue:
+            if window and not in_window(window, datetime.datetime.now()):
+                run['stopped'] = 'quiet hours ended'
+                break
+            began = time.monotonic()
+            result = replay(url, chat, query)
+            run['results'].append(result)
+            if on_result:
+                on_result(result)
+            time.sleep(max(0, interval - (time.monotonic() - began)))
+    except KeyboardInterrupt:
+        # still recorded, so its replays stay out of the hot queries
+        run['stopped'] = 'interrupted'
+    run['finished'] = time.time()
+    return run
+
+
+def load_runs(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+# =============================================================================
+# REPORT
+# =============================================================================
+
+def _summary(records):
+    if not records:
+        return None
+    hits = sum(record['outcome'] in HIT for record in records)
+    times = [record['ms'] for record in records if record['ms'] is not None]
+    return {'requests': len(records), 'hit_rate': hits / len(records),
+            'median_ms': statistics.median(times) if times else None}
+
+
+def compare(records, run, hours):
+    """Real traffic in the hours before the run started and after it
+    finished: {'warmed' | 'all': (before, after)} summaries. The run's own
+    requests (and anything during it) are left out."""
+    warmed = {(r['chat'], normalize(r['query'])) for r in run['results']}
+    span = hours * 3600
+    before = [r for r in records if r['at'] is not None and run['started'] - span <= r['at'] < run['started']]
+    after = [r for r in records if r['at'] is not None and run['finished'] < r['at'] <= run['finished'] + span]
+
+    def is_warmed(record):
+        return (record['chat'], normalize(record['query'])) in warmed
+
+    return {
+        'warmed': (_summary([r for r in before if is_warmed(r)]), _summary([r for r in after if is_warmed(r)])),
+        'all': (_summary(before), _summary(after)),
+    }
+
+
+def _describe(summary):
+    if summary is None:
+        return 'no requests'
+    ms = f", median {summary['median_ms'] / 1000:.2f}s" if summary['median_ms'] is not None else ''
+    return f"{summary['requests']} requests, {summary['hit_rate']:.0%} cache hits{ms}"
+
+
+def print_comparison(comparison, hours):
+    for name, label in (('warmed', 'warmed queries'), ('all', 'all traffic')):
+        before, after = comparison[name]
+        print(f"\n   {label}:")
+        print(f"     {hours:g}h before: {_describe(before)}")
+        print(f"     {hours:g}h after:  {_describe(after)}")
+        if before and after:
+            change = (after['hit_rate'] - before['hit_rate']) * 100
+            print(f"     hit rate {change:+.0f} points")
+
+
+def print_run(run):
+    results = run['results']
+    errors = [r for r in results if r['error']]
+    hits = [r for r in results if r['source'] in HIT]
+    when = datetime.datetime.fromtimestamp(run['started']).strftime('%Y-%m-%d %H:%M')
+    print(f"🔥 Run of {when}: {len(results)} replayed in {(run['finished'] - run['started']) / 60:.1f} min"
+          + (f" ({run['stopped']})" if run.get('stopped') else ''))
+    if results:
+        print(f"   {len(hits)} were already cached, {len(results) - len(hits) - len(errors)} warmed, "
+              f"{len(errors)} failed")
+
+
+# =============================================================================
+# COMMAND LINE
+# =============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay hot and follow-up queries to warm the chat caches")
+    parser.add_argument('--logs', nargs='*', default=[LOGS], help="PM2 out logs (default: %(default)s)")
+    parser.add_argument('--url', default=URL, help="chat endpoint (default: %(default)s)")
+    parser.add_argument('--top', type=int, default=TOP, help="hot queries to replay (default: %(default)s)")
+    parser.add_argument('--min-count', type=int, default=MIN_COUNT, help="times asked to count as hot")
+    parser.add_argument('--no-follow-ups', action='store_true', help="only replay logged queries")
+    parser.add_argument('--rate', type=float, default=RATE, help="queries per minute (default: %(default)s)")
+    parser.add_argument('--quiet-hours', type=quiet_hours, default=quiet_hours(QUIET_HOURS), metavar='START-END',
+                        help=f"local hours to run in (default: {QUIET_HOURS})")
+    parser.add_argument('--now', action='store_true', help="don't wait for the quiet hours")
+    parser.add_argument('--runs', default=RUNS, help="runs file (default: %(default)s)")
+    parser.add_argument('--dry-run', action='store_true', help="print what would be replayed")
+    parser.add_argument('--report', action='store_true', help="compare traffic before/after the last run")
+    parser.add_argument('--hours', type=float, default=24, help="report period (default: %(default)s)")
+    args = parser.parse_args()
+
+    try:
+        records = log_records(args.logs)
+        runs = load_runs(args.runs)
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    # the replays are logged like any chat; left in, every warmed query
+    # would count as asked once more each night and stay hot for good
+    records = real_traffic(records, runs)
+
+    if args.report:
+        if not runs:
+            print(f"❌ No warm runs recorded in {args.runs}")
+            sys.exit(1)
+        if records and all(record['at'] is None for record in records):
+            print("❌ The log lines have no timestamps - set log_date_format in ecosystem.config.js")
+            sys.exit(1)
+        print_run(runs[-1])
+        print_comparison(compare(records, runs[-1], args.hours), args.hours)
+        return
+
+    hot = hot_queries(records, args.top, args.min_count)
+    follow_ups = [] if args.no_follow_ups else follow_up_queries()
+    queue = plan(hot, follow_ups)
+    print(f"📋 {len(hot)} hot queries from {len(records)} logged requests, {len(follow_ups)} follow-ups "
+          f"-> {len(queue)} to replay at {args.rate:g}/min (~{len(queue) / args.rate:.0f} min)")
+    if args.dry_run:
+        for chat, query, why in queue:
+            print(f"   [{chat}] {query}  ({why})")
+        return
+    if not queue:
+        return
+
+    window = None if args.now else args.quiet_hours
+    if window:
+        wait = seconds_until(window, datetime.datetime.now())
+        if wait:
+            print(f"💤 Waiting {wait / 3600:.1f}h for the quiet hours ({window[0]:02d}:00-{window[1]:02d}:00)...")
+            time.sleep(wait)
+
+    def on_result(result):
+        icon = '❌' if result['error'] else ('💾' if result['source'] in HIT else '🔥')
+        print(f"   {icon} {result['ms']:>6}ms  {result['query'][:70]}"
+              + (f"  ({result['error']})" if result['error'] else ''))
+
+    run = warm(queue, args.url, args.rate, window, on_result)
+    with open(args.runs, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(run) + '\n')
+    print()
+    print_run(run)
+    if run.get('stopped') == 'interrupted':
+        sys.exit(130)
+    print(f"💾 Added to {args.runs}; run with --report once traffic has picked up again")
+
+
+if __name__ == '__main__':
+    main()
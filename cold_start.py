@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+Cold-start profiler for the backend, with a history per version
+
+The citation fix added `🚀🚀🚀 AI-SERVICE.JS v37.5.0 LOADED` so a human
+could spot the new code in `pm2 logs`; nothing measured how long
+server.js takes to come up, or what a patch does to that. This starts
+the backend (or any stand-in command) from scratch several times and
+timestamps, relative to the spawn:
+
+    first output     the first line the process prints
+    <marker>         the LAST line matching each startup marker before
+                     the server answers (see MARKERS, or --marker)
+    ready            the first 200 from the health endpoint reporting
+                     the started process's pid (server.js's /health
+                     includes process.pid; a stand-in has to as well)
+
+Each session's percentiles are appended to a JSON-lines history keyed
+by version (the marker's version, or --label) and by a fingerprint of
+the directory's top-level .js files, so a patch shows up as a new row
+even when the version string didn't change. The session is compared
+with the last one of a different fingerprint; with --check a startup
+regression beyond --tolerance exits non-zero.
+
+Usage:
+    python3 cold_start.py --backend-dir /var/www/workforce-democracy/backend --runs 10
+    python3 cold_start.py --backend-dir backend --command "node stand-in.js" --label stand-in
+    python3 cold_start.py --show                   # the history so far
+"""
+
+import argparse
+import datetime
+import hashlib
+import json
+import math
+import os
+import re
+import shlex
+import subprocess
+import sys
+import threading
+import time
+
+from pm2_reload import check_health
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+HISTORY = os.path.join(SCRIPT_DIR, 'cold-start-history.jsonl')
+PORT = 3102
+RUNS = 10
+DEADLINE = 60
+POLL = 0.01
+TOLERANCE = 0.2
+NOISE = 0.05            # seconds - smaller p50 changes are never regressions
+
+# name -> regex; a group in the regex is taken as the version
+MARKERS = {
+    'ai-service loaded': r'AI-SERVICE\.JS (v[\w.-]+) LOADED',
+    'routes loaded': r'API loaded',
+    'listening': r'Server running on port',
+}
+
+FIRST_OUTPUT = 'first output'
+READY = 'ready'
+
+
+class StartupError(Exception):
+    pass
+
+
+# =============================================================================
+# ONE START
+# =============================================================================
+
+def _read_lines(stream, lines):
+    for line in iter(stream.readline, ''):
+        lines.append((time.monotonic(), line.rstrip('\n')))
+
+
+def start_once(command, directory, env, url, markers, deadline=DEADLINE):
+    """Starts command in directory and stops it once url answers with its
+    pid. Returns ({stage: seconds since spawn}, version or None)."""
+    if check_health(url, timeout=1) is not None:
+        raise StartupError(f"{url} already answers before the start - stop whatever is listening there")
+    spawned = time.monotonic()
+    process = subprocess.Popen(command, cwd=directory, env=env, stdout=subprocess.PIPE,
+                               stderr=subprocess.STDOUT, text=True, errors='replace')
+    lines = []
+    reader = threading.Thread(target=_read_lines, args=(process.stdout, lines), daemon=True)
+    reader.start()
+    last = "no healthy answer"
+    try:
+        while True:
+            data = check_health(url, timeout=1)
+            if data is not None:
+                if data.get('pid') == process.pid:
+                    break
+                last = (f"answered by pid {data['pid']}, not the started {process.pid}" if data.get('pid')
+                        else "answered without a pid")
+            if process.poll() is not None:
+                reader.join(1)
+                tail = '\n'.join(line for _, line in lines[-5:])
+                raise StartupError(f"exited with code {process.returncode} before answering\n{tail}")
+            if time.monotonic() - spawned > deadline:
+                raise StartupError(f"{url}: {last} after {deadline}s")
+            time.sleep(POLL)
+        ready = time.monotonic()
+    finally:
+        process.terminate()
+        try:
+            process.wait(5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+        reader.join(1)
+
+    stages = {}
+    version = None
+    for stamp, line in lines:
+        if stamp > ready:
+            break
+        stages.setdefault(FIRST_OUTPUT, stamp - spawned)
+        for name, pattern in markers.items():
+            match = pattern.search(line)
+            if match:
+                stages[name] = stamp - spawned
+                if match.groups() and version is None:
+                    version = match.group(1)
+    stages[READY] = ready - spawned
+    return stages, version
+
+
+# =============================================================================
+# A SESSION
+# =============================================================================
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1)] if ordered else 0
+
+
+def fingerprint(directory):
+    """Hash of the directory's top-level .js files - what the patch scripts
+    change"""
+    digest = hashlib.sha256()
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if name.endswith('.js') and os.path.isfile(path):
+            digest.update(name.encode() + b'\0')
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+
+def profile(command, directory, env, url, markers, runs=RUNS, warmup=1, on_run=None):
+    """Starts the backend warmup + runs times; returns the session record
+    (everything but the label). on_run(n, stages or error) after each."""
+    samples = []
+    failures = []
+    versions = set()
+    for n in range(warmup + runs):
+        try:
+            stages, version = start_once(command, directory, env, url, markers)
+        except StartupError as e:
+            failures.append(str(e))
+            if on_run:
+                on_run(n - warmup, e)
+            continue
+        if version:
+            versions.add(version)
+        if n >= warmup:
+            samples.append(stages)
+        if on_run:
+            on_run(n - warmup, stages)
+    names = [FIRST_OUTPUT] + [name for name in markers if any(name in s for s in samples)] + [READY]
+    stages = {}
+    for name in names:
+        values = [s[name] for s in samples if name in s]
+        if values:
+            stages[name] = {'p50': _percentile(values, 0.5), 'p90': _percentile(values, 0.9),
+                            'min': min(values), 'max': max(values), 'runs': len(values)}
+    return {
+        'version': ', '.join(sorted(versions)) or None,
+        'fingerprint': fingerprint(directory),
+        'time': datetime.datetime.now().isoformat(timespec='seconds'),
+        'command': ' '.join(command),
+        'runs': len(samples),
+        'failed': len(failures),
+        'stages': stages,
+    }
+
+
+# =============================================================================
+# HISTORY
+# =============================================================================
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def append_history(path, record):
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record) + '\n')
+
+
+def baseline(history, record):
+    """The latest earlier session of a different build"""
+    for previous in reversed(history):
+        if previous['fingerprint'] != record['fingerprint'] and READY in previous['stages']:
+            return previous
+    return None
+
+
+def regressions(record, previous, tolerance=TOLERANCE):
+    """[(stage, old p50, new p50)] for stages whose p50 grew by more than
+    tolerance (and more than NOISE seconds)"""
+    found = []
+    for name, stats in record['stages'].items():
+        old = previous['stages'].get(name)
+        if old and stats['p50'] - old['p50'] > max(NOISE, tolerance * old['p50']):
+            found.append((name, old['p50'], stats['p50']))
+    return found
+
+
+def print_session(record, previous):
+    print(f"\n📊 {record['label']} ({record['fingerprint']}): {record['runs']} starts"
+          + (f", {record['failed']} failed" if record['failed'] else ''))
+    print(f"   {'stage':<20} {'p50':>8} {'p90':>8} {'min':>8} {'max':>8}"
+          + (f" {'p50 before':>11}" if previous else ''))
+    for name, stats in record['stages'].items():
+        row = f"   {name:<20}" + ''.join(f" {stats[key]:>7.3f}s" for key in ('p50', 'p90', 'min', 'max'))
+        old = previous and previous['stages'].get(name)
+        if old:
+            change = stats['p50'] - old['p50']
+            row += f" {old['p50']:>10.3f}s {change:+.3f}s"
+        print(row)
+    if previous:
+        print(f"   (before: {previous['label']} {previous['fingerprint']}, {previous['time']})")
+
+
+def print_history(history):
+    if not history:
+        print("No cold starts recorded yet")
+        return
+    print(f"{'when':<20} {'label':<24} {'build':<13} {'runs':>4} {'ready p50':>10} {'ready p90':>10}")
+    for record in history:
+        ready = record['stages'].get(READY, {})
+        print(f"{record['time']:<20} {record['label'][:24]:<24} {record['fingerprint']:<13} {record['runs']:>4}"
+              f" {ready.get('p50', 0):>9.3f}s {ready.get('p90', 0):>9.3f}s")
+
+
+# =============================================================================
+# COMMAND LINE
+# =============================================================================
+
+def _marker(text):
+    name, _, pattern = text.partition('=')
+    if not pattern:
+        raise argparse.ArgumentTypeError("expected NAME=REGEX")
+    return name, pattern
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile backend cold starts")
+    parser.add_argument('--backend-dir', default='.', help="directory to start it in (default: %(default)s)")
+    parser.add_argument('--command', default='node server.js', help="what to start (default: %(default)s)")
+    parser.add_argument('--port', type=int, default=PORT, help="PORT given to it (default: %(default)s)")
+    parser.add_argument('--health-path', default='/health')
+    parser.add_argument('--runs', type=int, default=RUNS)
+    parser.add_argument('--warmup', type=int, default=1, help="starts not counted (default: %(default)s)")
+    parser.add_argument('--marker', type=_marker, action='append', default=[], metavar='NAME=REGEX',
+                        help="extra startup marker (repeatable)")
+    parser.add_argument('--label', help="version label (default: the version in the startup marker)")
+    parser.add_argument('--history', default=HISTORY, help="history file (default: %(default)s)")
+    parser.add_argument('--no-save', action='store_true', help="don't add this session to the history")
+    parser.add_argument('--check', action='store_true', help="exit 1 if startup regressed")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help="allowed p50 growth for --check (default: %(default)s)")
+    parser.add_argument('--show', action='store_true', help="print the history and exit")
+    args = parser.parse_args()
+
+    try:
+        history = load_history(args.history)
+    except (OSError, ValueError) as e:
+        print(f"❌ {args.history}: {e}")
+        sys.exit(1)
+    if args.show:
+        print_history(history)
+        return
+
+    markers = {name: re.compile(pattern) for name, pattern in list(MARKERS.items()) + args.marker}
+    command = shlex.split(args.command)
+    url = f"http://127.0.0.1:{args.port}{args.health_path}"
+    env = dict(os.environ, PORT=str(args.port))
+    for key in ('GROQ_API_KEY', 'QWEN_API_KEY'):
+        env.setdefault(key, 'cold-start')
+
+    def on_run(n, result):
+        if isinstance(result, StartupError):
+            print(f"   ❌ start {n + 1}: {result}")
+        elif n >= 0:
+            print(f"   ✅ start {n + 1}: ready in {result[READY]:.3f}s")
+
+    if check_health(url, timeout=1) is not None:
+        print(f"❌ {url} already answers - stop whatever is listening on port {args.port} first")
+        sys.exit(1)
+    print(f"🚀 Starting `{args.command}` in {args.backend_dir} {args.warmup} + {args.runs} times...")
+    try:
+        record = profile(command, args.backend_dir, env, url, markers, args.runs, args.warmup, on_run)
+    except OSError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    if not record['runs']:
+        print("❌ The backend never became ready")
+        sys.exit(1)
+    record['label'] = args.label or record['version'] or 'unversioned'
+
+    previous = baseline(history, record)
+    print_session(record, previous)
+    if not args.no_save:
+        append_history(args.history, record)
+        print(f"💾 Added to {args.history}")
+
+    found = regressions(record, previous, args.tolerance) if previous else []
+    for name, old, new in found:
+        print(f"⚠️  {name}: p50 {old:.3f}s -> {new:.3f}s (+{(new - old) / old:.0%})")
+    if found and args.check:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,142 +1,76 @@
 #!/usr/bin/env python3
 """
 Enhance LLM prompting and add more diverse follow-up queries
+
+    python3 enhance-prompting.py               # patch ai-service.js
+    python3 enhance-prompting.py --benchmark   # time the category matcher (needs node)
 """
 
 import re
 import sys
 
-# Read the file
-with open('/root/progressive-policy-assistant/backend/ai-service.js', 'r', encoding='utf-8') as f:
-    content = f.read()
-
-print("🔍 Searching for analyzeSourceGaps function...")
-
-# Find the analyzeSourceGaps function
-gap_function_match = re.search(
-    r'(function analyzeSourceGaps\([^)]*\)\s*\{.*?(?=\n\s*function\s+\w+|$))',
-    content,
-    re.DOTALL
-)
-
-if not gap_function_match:
-    print("❌ Could not find analyzeSourceGaps function")
-    sys.exit(1)
-
-old_function = gap_function_match.group(1)
-print(f"✅ Found function ({len(old_function)} chars)")
-
-# Create enhanced version with more diverse queries
-new_function = '''function analyzeSourceGaps(sources, originalQuery) {
-    if (!originalQuery || typeof originalQuery !== 'string') {
-        return { needsMoreData: false, followUpQueries: [] };
-    }
-    
-    const queryLower = originalQuery.toLowerCase();
-    const followUpQueries = [];
-    
-    // Detect SNAP/welfare queries
-    if (queryLower.match(/snap|food stamp|welfare|benefit/i)) {
-        if (sources.length < 12) {
-            followUpQueries.push('SNAP benefits cuts 2025 statistics dollar amounts');
-            followUpQueries.push('SNAP benefits economic impact data poverty rates');
-            followUpQueries.push('SNAP benefits Supreme Court ruling congressional vote details');
-            followUpQueries.push('SNAP benefits state-by-state impact analysis');
-            followUpQueries.push('SNAP benefits recipients testimony quotes');
-        }
-    }
-    
-    // Detect healthcare queries
-    if (queryLower.match(/healthcare|medicaid|medicare|aca|affordable care/i)) {
-        if (sources.length < 12) {
-            followUpQueries.push('healthcare subsidies expiration impact statistics');
-            followUpQueries.push('medicaid cuts state budgets data');
-            followUpQueries.push('medicare changes enrollment numbers');
-            followUpQueries.push('ACA marketplace premium increases dollar amounts');
-        }
-    }
-    
-    // Detect tax/economic queries
-    if (queryLower.match(/tax|corporate|wealth|economy|deficit/i)) {
-        if (sources.length < 12) {
-            followUpQueries.push('corporate tax cuts revenue impact data');
-            followUpQueries.push('wealth tax proposals congressional analysis');
-            followUpQueries.push('deficit spending breakdown statistics');
-            followUpQueries.push('economic inequality data recent studies');
-        }
-    }
-    
-    // Detect labor/union queries
-    if (queryLower.match(/union|labor|worker|wage|strike/i)) {
-        if (sources.length < 12) {
-            followUpQueries.push('union organizing statistics 2025 data');
-            followUpQueries.push('minimum wage legislation state breakdown');
-            followUpQueries.push('labor strike outcomes worker testimony');
-            followUpQueries.push('wage theft enforcement statistics');
-        }
-    }
-    
-    // Detect climate/environment queries
-    if (queryLower.match(/climate|environment|fossil fuel|renewable|carbon/i)) {
-        if (sources.length < 12) {
-            followUpQueries.push('climate legislation carbon reduction targets');
-            followUpQueries.push('fossil fuel subsidies dollar amounts');
-            followUpQueries.push('renewable energy investment data');
-            followUpQueries.push('environmental regulation rollback impact studies');
-        }
-    }
-    
-    // Detect immigration queries
-    if (queryLower.match(/immigration|immigrant|border|asylum|deportation/i)) {
-        if (sources.length < 12) {
-            followUpQueries.push('immigration policy changes statistics 2025');
-            followUpQueries.push('border enforcement budget breakdown');
-            followUpQueries.push('asylum application processing data');
-            followUpQueries.push('deportation numbers impact analysis');
-        }
-    }
-    
-    // Generic fallback - analyze for key policy terms
-    if (followUpQueries.length === 0 && sources.length < 12) {
-        const policyTerms = queryLower.match(/budget|legislation|bill|congress|court|ruling|policy|reform/i);
-        if (policyTerms) {
-            followUpQueries.push(`${originalQuery} statistics data analysis`);
-            followUpQueries.push(`${originalQuery} congressional testimony expert quotes`);
-            followUpQueries.push(`${originalQuery} impact study research findings`);
-        }
-    }
-    
-    return {
-        needsMoreData: followUpQueries.length > 0,
-        followUpQueries: followUpQueries.slice(0, 5) // Max 5 follow-up queries
-    };
-}'''
-
-# Replace the function
-content = content.replace(old_function, new_function)
-print("✅ Replaced analyzeSourceGaps with enhanced version")
-
-# Now enhance the LLM system prompt
-print("\n🔍 Searching for system prompt...")
-
-# Find the system message in buildGroqMessages
-system_prompt_match = re.search(
-    r"(const systemMessage = \{[^}]*role: 'system',[^}]*content: `[^`]+`[^}]*\})",
-    content,
-    re.DOTALL
-)
-
-if system_prompt_match:
-    old_prompt = system_prompt_match.group(1)
-    print(f"✅ Found system prompt ({len(old_prompt)} chars)")
-    
-    # Find just the content part
-    content_match = re.search(r"content: `([^`]+)`", old_prompt, re.DOTALL)
-    if content_match:
-        old_content = content_match.group(1)
-        
-        # Enhanced prompt requesting specific data
-        new_content = old_content + '''
+from keyword_matcher import (BLOCK_END, BLOCK_START, analyze_source_gaps, benchmark,
+                             print_benchmark, source_gap_block)
+from patch_engine import (APPLIED, InsertBefore, MISSING, Patch, PatchError, ReplaceBetween,
+                          ReplaceFunction, Substitute, patch_file)
+
+AI_SERVICE = '/root/progressive-policy-assistant/backend/ai-service.js'
+
+# Policy categories analyzeSourceGaps looks for: (name, keywords, follow-up
+# queries). keyword_matcher.py compiles them into one matcher, so adding a
+# category doesn't slow down every query.
+CATEGORIES = [
+    ('SNAP/welfare', ['snap', 'food stamp', 'welfare', 'benefit'], [
+        'SNAP benefits cuts 2025 statistics dollar amounts',
+        'SNAP benefits economic impact data poverty rates',
+        'SNAP benefits Supreme Court ruling congressional vote details',
+        'SNAP benefits state-by-state impact analysis',
+        'SNAP benefits recipients testimony quotes',
+    ]),
+    ('healthcare', ['healthcare', 'medicaid', 'medicare', 'aca', 'affordable care'], [
+        'healthcare subsidies expiration impact statistics',
+        'medicaid cuts state budgets data',
+        'medicare changes enrollment numbers',
+        'ACA marketplace premium increases dollar amounts',
+    ]),
+    ('tax/economy', ['tax', 'corporate', 'wealth', 'economy', 'deficit'], [
+        'corporate tax cuts revenue impact data',
+        'wealth tax proposals congressional analysis',
+        'deficit spending breakdown statistics',
+        'economic inequality data recent studies',
+    ]),
+    ('labor/unions', ['union', 'labor', 'worker', 'wage', 'strike'], [
+        'union organizing statistics 2025 data',
+        'minimum wage legislation state breakdown',
+        'labor strike outcomes worker testimony',
+        'wage theft enforcement statistics',
+    ]),
+    ('climate/environment', ['climate', 'environment', 'fossil fuel', 'renewable', 'carbon'], [
+        'climate legislation carbon reduction targets',
+        'fossil fuel subsidies dollar amounts',
+        'renewable energy investment data',
+        'environmental regulation rollback impact studies',
+    ]),
+    ('immigration', ['immigration', 'immigrant', 'border', 'asylum', 'deportation'], [
+        'immigration policy changes statistics 2025',
+        'border enforcement budget breakdown',
+        'asylum application processing data',
+        'deportation numbers impact analysis',
+    ]),
+]
+
+# Tried when no category matched; {query} is the user's original query
+FALLBACK = (['budget', 'legislation', 'bill', 'congress', 'court', 'ruling', 'policy', 'reform'], [
+    '{query} statistics data analysis',
+    '{query} congressional testimony expert quotes',
+    '{query} impact study research findings',
+])
+
+SOURCE_GAP_BLOCK = source_gap_block(CATEGORIES, 'enhance-prompting.py')
+ANALYZE_SOURCE_GAPS = analyze_source_gaps(FALLBACK)
+
+# Enhanced prompt requesting specific data
+DATA_REQUIREMENTS = '''
 
 CRITICAL ANALYSIS REQUIREMENTS:
 1. CITE SPECIFIC DATA: Always include dollar amounts, percentages, and exact statistics from sources
@@ -151,17 +85,55 @@ EXAMPLE CITATIONS:
 
 When sources provide detailed statistics, include them verbatim. When sources quote experts or officials, include their exact words in quotation marks.'''
 
-        new_prompt = old_prompt.replace(old_content, new_content)
-        content = content.replace(old_prompt, new_prompt)
-        print("✅ Enhanced system prompt with specific data requirements")
-else:
-    print("⚠️ Could not find system prompt - skipping this enhancement")
-
-# Write back
-with open('/root/progressive-policy-assistant/backend/ai-service.js', 'w', encoding='utf-8') as f:
-    f.write(content)
-
-print("\n✅ All enhancements complete!")
-print("   • Enhanced analyzeSourceGaps with 6 policy categories")
-print("   • Increased follow-up queries to 5 per category")
-print("   • Added specific data citation requirements to LLM prompt")
+# The content template of the system message in buildGroqMessages
+SYSTEM_PROMPT = re.compile(r"(const systemMessage = \{[^}]*role: 'system',[^}]*content: `)([^`]+)(`)", re.DOTALL)
+
+# The matcher tables go right above analyzeSourceGaps the first time and
+# are regenerated in place after that
+SYSTEM_PROMPT_EDIT = "Enhanced system prompt with specific data requirements"
+
+PATCH = Patch("Enhanced prompting", [
+    InsertBefore("Added compiled keyword matcher", 'function analyzeSourceGaps(',
+                 SOURCE_GAP_BLOCK + '\n', unless=BLOCK_START),
+    ReplaceBetween("Regenerated compiled keyword matcher", BLOCK_START, BLOCK_END,
+                   SOURCE_GAP_BLOCK.split('\n')[1:-1], required=False),
+    ReplaceFunction("Replaced analyzeSourceGaps with enhanced version",
+                    'analyzeSourceGaps', ANALYZE_SOURCE_GAPS),
+    Substitute(SYSTEM_PROMPT_EDIT, SYSTEM_PROMPT,
+               lambda match: match.group(1) + match.group(2) + DATA_REQUIREMENTS + match.group(3),
+               count=1, within='buildGroqMessages', required=False),
+], [
+    ("Enhanced analyzeSourceGaps", "immigration policy changes statistics 2025"),
+    ("Compiled keyword matcher", "SOURCE_GAP_KEYWORDS.exec(queryLower)"),
+])
+
+def main():
+    if '--benchmark' in sys.argv[1:]:
+        # Per-query cost of the old one-regex-per-category shape vs the
+        # compiled matcher, with the table padded by made-up categories
+        print("⏱️  analyzeSourceGaps per query (node):\n")
+        results = benchmark(CATEGORIES, FALLBACK)
+        print_benchmark(results)
+        sys.exit(1 if any(mismatches for *_, mismatches in results) else 0)
+
+    print("🔍 Searching for analyzeSourceGaps function and system prompt...")
+
+    try:
+        _, report = patch_file(AI_SERVICE, PATCH.edits)
+    except PatchError:
+        print("❌ Could not find analyzeSourceGaps function")
+        sys.exit(1)
+
+    for name, status in report:
+        if status == APPLIED:
+            print(f"✅ {name}")
+        elif name == SYSTEM_PROMPT_EDIT and status == MISSING:
+            print("⚠️ Could not find system prompt - skipping this enhancement")
+
+    print("\n✅ All enhancements complete!")
+    print(f"   • Enhanced analyzeSourceGaps with {len(CATEGORIES)} policy categories, matched in one pass")
+    print("   • Increased follow-up queries to 5 per category")
+    print("   • Added specific data citation requirements to LLM prompt")
+
+if __name__ == '__main__':
+    main()
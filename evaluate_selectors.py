@@ -0,0 +1,499 @@
+#!/usr/bin/env python3
+"""
+Offline scraper selector evaluator
+
+Runs every selector in SELECTORS_TO_TEST (read straight from
+test-scrapers.js) against a saved corpus of article HTML, one worker
+process per fixture, and ranks the selectors per site by how much
+article text they extract (with their extraction time alongside). The
+ranking is written as JSON
+for update-scrapers.py, so selector tuning needs no live sites and gives
+the same answer every run.
+
+Corpus layout (one directory per site, any number of saved pages):
+
+    scraper-fixtures/common-dreams/snap-cuts.html
+    scraper-fixtures/propublica/...
+
+Usage:
+    python3 evaluate_selectors.py --fetch          # save TEST_URLS into the corpus (once, online)
+    python3 evaluate_selectors.py                  # evaluate offline -> /tmp/scraper-selectors.json
+    python3 update-scrapers.py
+
+Each site's pages are also fingerprinted: a hash of their structural
+skeleton (tag.class paths from the root, digits in class names folded,
+no text). The fingerprints are kept in scraper-fixtures/.fingerprints.json
+with the last ranking, and a site is only evaluated again when its
+fingerprint drifts or SELECTORS_TO_TEST changes (--full forces a sweep).
+
+Selectors are matched like cheerio does for the syntax the diagnostic
+uses: tag, .class, #id, [attr], [attr=|*=|^=|$=|~=value], joined by
+descendant (space) or child (>) combinators.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from html.parser import HTMLParser
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+TEST_SCRAPERS = os.path.join(SCRIPT_DIR, 'test-scrapers.js')
+CORPUS = os.path.join(SCRIPT_DIR, 'scraper-fixtures')
+RESULTS = '/tmp/scraper-selectors.json'
+FINGERPRINTS = '.fingerprints.json'
+
+# Site name -> scraper function in article-scraper.js
+SITES = {
+    'Common Dreams': 'scrapeCommonDreams',
+    'Democracy Now': 'scrapeDemocracyNow',
+    'Jacobin': 'scrapeJacobin',
+    'The Intercept': 'scrapeTheIntercept',
+    'ProPublica': 'scrapeProPublica',
+}
+
+# The same thresholds test-scrapers.js applies
+MIN_PARAGRAPH = 50
+MIN_TOTAL = 200
+
+
+def slug(site):
+    return re.sub(r'[^a-z0-9]+', '-', site.lower()).strip('-')
+
+
+def read_test_scrapers(path=TEST_SCRAPERS):
+    """(selectors, {site: url}) from test-scrapers.js; selectors keep
+    their order with duplicates removed"""
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    block = re.search(r'const SELECTORS_TO_TEST = \[(.*?)\];', text, re.S).group(1)
+    block = re.sub(r'//[^\n]*', '', block)
+    selectors = list(dict.fromkeys(re.findall(r"'([^']+)'", block)))
+    urls = dict(re.findall(r"'([^']+)':\s*'(https?://[^']+)'",
+                           re.search(r'const TEST_URLS = \{(.*?)\};', text, re.S).group(1)))
+    return selectors, urls
+
+
+# =============================================================================
+# HTML TREE
+# =============================================================================
+
+_VOID = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta',
+         'param', 'source', 'track', 'wbr'}
+# start tags that implicitly close an open <p>
+_CLOSES_P = {'address', 'article', 'aside', 'blockquote', 'div', 'dl', 'fieldset', 'figure',
+             'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr', 'main',
+             'nav', 'ol', 'p', 'pre', 'section', 'table', 'ul'}
+
+
+class Element:
+    __slots__ = ('tag', 'attrs', 'classes', 'parent', 'children')
+
+    def __init__(self, tag, attrs, parent):
+        self.tag = tag
+        self.attrs = attrs
+        self.classes = set(attrs.get('class', '').split())
+        self.parent = parent
+        self.children = []
+
+    def text(self):
+        parts = []
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, str):
+                parts.append(node)
+            else:
+                stack.extend(reversed(node.children))
+        return ''.join(parts)
+
+
+class _TreeBuilder(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = Element('#document', {}, None)
+        self.open = [self.root]
+        self.elements = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _CLOSES_P and any(element.tag == 'p' for element in self.open):
+            self._close('p')
+        element = Element(tag, {name: value or '' for name, value in attrs}, self.open[-1])
+        self.open[-1].children.append(element)
+        self.elements.append(element)
+        if tag not in _VOID:
+            self.open.append(element)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in _VOID:
+            self.open.pop()
+
+    def handle_endtag(self, tag):
+        self._close(tag)
+
+    def _close(self, tag):
+        for i in range(len(self.open) - 1, 0, -1):
+            if self.open[i].tag == tag:
+                del self.open[i:]
+                return
+
+    def handle_data(self, data):
+        self.open[-1].children.append(data)
+
+
+def parse_html(html):
+    """Every element of the document, in document order"""
+    builder = _TreeBuilder()
+    builder.feed(html)
+    builder.close()
+    return builder.elements
+
+
+# =============================================================================
+# FINGERPRINTS
+# =============================================================================
+
+_SKELETON = re.compile(r'<!--.*?-->|<(script|style)\b.*?</\1\s*>|<(/?)([a-zA-Z][\w-]*)((?:"[^"]*"|\'[^\']*\'|[^>"\'])*)>',
+                       re.S | re.I)
+_CLASS_ATTR = re.compile(r'''\bclass\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))''', re.I)
+
+
+def fingerprint(html):
+    """Hash of the page's distinct tag.class paths. A regex scan rather
+    than a full parse: it only has to be stable, and it runs on every
+    page of every site."""
+    stack = []
+    paths = set()
+    for match in _SKELETON.finditer(html):
+        closing, tag, attributes = match.group(2, 3, 4)
+        if tag is None:
+            continue
+        tag = tag.lower()
+        if closing:
+            for i in range(len(stack) - 1, -1, -1):
+                if stack[i][0] == tag:
+                    del stack[i:]
+                    break
+            continue
+        classes = _CLASS_ATTR.search(attributes)
+        label = tag
+        if classes:
+            names = (classes.group(1) or classes.group(2) or classes.group(3) or '').split()
+            label += ''.join('.' + name for name in sorted({re.sub(r'\d+', '0', n) for n in names}))
+        path = (stack[-1][1] + '/' if stack else '') + label
+        paths.add(path)
+        if tag not in _VOID and not attributes.rstrip().endswith('/'):
+            stack.append((tag, path))
+    return hashlib.sha256('\n'.join(sorted(paths)).encode('utf-8')).hexdigest()[:16]
+
+
+def fingerprint_file(path):
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        return fingerprint(f.read())
+
+
+def _digest(values):
+    return hashlib.sha256('\n'.join(sorted(set(values))).encode('utf-8')).hexdigest()[:16]
+
+
+def load_fingerprints(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+# =============================================================================
+# SELECTORS
+# =============================================================================
+
+_COMPOUND = re.compile(r'([a-zA-Z][\w-]*|\*)?((?:[.#][\w-]+|\[[^\]]+\])*)')
+_PART = re.compile(r'([.#])([\w-]+)|\[\s*([\w-]+)\s*(?:([*^$~|]?=)\s*["\']?([^"\'\]]*)["\']?)?\s*\]')
+
+
+def _attribute_test(name, op, value):
+    if not op:
+        return lambda e: name in e.attrs
+    tests = {
+        '=': lambda v: v == value,
+        '*=': lambda v: value in v,
+        '^=': lambda v: v.startswith(value),
+        '$=': lambda v: v.endswith(value),
+        '~=': lambda v: value in v.split(),
+        '|=': lambda v: v == value or v.startswith(value + '-'),
+    }
+    test = tests[op]
+    return lambda e: name in e.attrs and test(e.attrs[name])
+
+
+def _compile_compound(text):
+    match = _COMPOUND.fullmatch(text)
+    if not match or not text:
+        raise ValueError(f"unsupported selector part: {text!r}")
+    tag, rest = match.groups()
+    tag = None if tag in (None, '*') else tag.lower()
+    classes = set()
+    tests = []
+    for part in _PART.finditer(rest):
+        kind, name, attribute, op, value = part.groups()
+        if kind == '.':
+            classes.add(name)
+        elif kind == '#':
+            tests.append(lambda e, name=name: e.attrs.get('id') == name)
+        else:
+            tests.append(_attribute_test(attribute, op, value))
+    return tag, classes, tests
+
+
+class Selector:
+    """A compiled selector: compounds right to left with their combinators"""
+
+    def __init__(self, text):
+        self.text = text
+        tokens = re.findall(r'\[[^\]]*\]|>|[^\s>\[]+(?:\[[^\]]*\][^\s>\[]*)*', text)
+        compounds = []
+        combinator = ' '
+        for token in tokens:
+            if token == '>':
+                combinator = '>'
+                continue
+            compounds.append((token, combinator))
+            combinator = ' '
+        self.parts = [(_compile_compound(token), combinator) for token, combinator in reversed(compounds)]
+        self.tag = self.parts[0][0][0]
+        # CSS specificity: (ids, classes and attributes, tags)
+        ids = classes = tags = 0
+        for token, _ in compounds:
+            tag, rest = _COMPOUND.fullmatch(token).groups()
+            tags += tag not in (None, '*')
+            for part in _PART.finditer(rest):
+                if part.group(1) == '#':
+                    ids += 1
+                else:
+                    classes += 1
+        self.specificity = (ids, classes, tags)
+
+    @staticmethod
+    def _matches(element, compound):
+        tag, classes, tests = compound
+        return ((tag is None or element.tag == tag) and classes <= element.classes
+                and all(test(element) for test in tests))
+
+    def _match_from(self, element, index):
+        if index == len(self.parts):
+            return True
+        compound, _ = self.parts[index]
+        # the combinator that joins this part to the one on its right
+        combinator = self.parts[index - 1][1]
+        node = element.parent
+        while node is not None and node.tag != '#document':
+            if self._matches(node, compound):
+                if self._match_from(node, index + 1):
+                    return True
+            if combinator == '>':
+                return False
+            node = node.parent
+        return False
+
+    def select(self, elements, by_tag=None):
+        candidates = by_tag.get(self.tag, ()) if by_tag is not None and self.tag else elements
+        first = self.parts[0][0]
+        return [element for element in candidates
+                if self._matches(element, first) and self._match_from(element, 1)]
+
+
+# =============================================================================
+# EVALUATION
+# =============================================================================
+
+def evaluate_fixture(job):
+    """Worker: every selector against one saved page"""
+    site, path, selectors = job
+    started = time.perf_counter()
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        elements = parse_html(f.read())
+    parse_ms = (time.perf_counter() - started) * 1000
+    by_tag = {}
+    for element in elements:
+        by_tag.setdefault(element.tag, []).append(element)
+
+    results = []
+    for text in selectors:
+        started = time.perf_counter()
+        matched = Selector(text).select(elements, by_tag)
+        kept = [t for t in (element.text().strip() for element in matched) if len(t) > MIN_PARAGRAPH]
+        chars = sum(len(t) + 1 for t in kept)
+        ms = (time.perf_counter() - started) * 1000
+        results.append({
+            'selector': text,
+            'elements': len(matched),
+            'chars': chars,
+            'ms': ms,
+            'preview': ' '.join(kept)[:150],
+        })
+    return site, os.path.basename(path), parse_ms, results
+
+
+def find_fixtures(corpus):
+    fixtures = {}
+    for site in SITES:
+        directory = os.path.join(corpus, slug(site))
+        if os.path.isdir(directory):
+            fixtures[site] = sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                                    if name.endswith(('.html', '.htm')))
+    return fixtures
+
+
+def rank(runs):
+    """Per-selector totals across a site's fixtures, best first: pages
+    where the selector works, then text extracted. Ties (selectors that
+    pick the same paragraphs) go to the more specific selector - a
+    generic `article p` is the likeliest to pick up boilerplate on the
+    next page - then to the one listed first, so the winner doesn't
+    depend on timing noise."""
+    totals = {}
+    for _, results in runs:
+        for result in results:
+            total = totals.setdefault(result['selector'], {
+                'selector': result['selector'], 'fixtures_passed': 0, 'elements': 0,
+                'chars': 0, 'ms': 0.0, 'preview': ''})
+            total['elements'] += result['elements']
+            total['chars'] += result['chars']
+            total['ms'] += result['ms']
+            if result['chars'] > MIN_TOTAL:
+                total['fixtures_passed'] += 1
+                total['preview'] = total['preview'] or result['preview']
+    ranking = [total for total in totals.values() if total['fixtures_passed']]
+    for total in ranking:
+        total['ms'] = round(total['ms'] / len(runs), 3)
+    order = {selector: i for i, selector in enumerate(totals)}
+    specificity = {t['selector']: Selector(t['selector']).specificity for t in ranking}
+    ranking.sort(key=lambda t: (-t['fixtures_passed'], -t['chars'],
+                                tuple(-n for n in specificity[t['selector']]), order[t['selector']]))
+    return ranking
+
+
+def evaluate(corpus=CORPUS, selectors=None, workers=None, full=False):
+    """{site: {...}} rankings for every site with fixtures. Sites whose
+    fingerprint and selector list match the last run reuse its ranking."""
+    if selectors is None:
+        selectors, _ = read_test_scrapers()
+    fixtures = find_fixtures(corpus)
+    cache_path = os.path.join(corpus, FINGERPRINTS)
+    cache = load_fingerprints(cache_path)
+    selectors_key = _digest(selectors)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        paths = [path for site_paths in fixtures.values() for path in site_paths]
+        page_prints = dict(zip(paths, pool.map(fingerprint_file, paths, chunksize=8)))
+        site_prints = {site: _digest(page_prints[path] for path in site_paths)
+                       for site, site_paths in fixtures.items() if site_paths}
+        stale = [site for site, site_print in site_prints.items()
+                 if full or cache.get(site, {}).get('fingerprint') != site_print
+                 or cache[site].get('selectors') != selectors_key]
+
+        jobs = [(site, path, selectors) for site in stale for path in fixtures[site]]
+        runs = {site: [] for site in stale}
+        parse_ms = {site: 0.0 for site in stale}
+        for site, name, ms, results in pool.map(evaluate_fixture, jobs):
+            runs[site].append((name, results))
+            parse_ms[site] += ms
+
+    sites = {}
+    for site, site_print in site_prints.items():
+        if site not in runs:
+            sites[site] = dict(cache[site], cached=True)
+            continue
+        ranking = rank(runs[site])
+        previous = cache.get(site, {}).get('recommended')
+        sites[site] = {
+            'function': SITES[site],
+            'fixtures': [name for name, _ in runs[site]],
+            'fingerprint': site_print,
+            'selectors': selectors_key,
+            'evaluated': datetime.now().isoformat(timespec='seconds'),
+            'parse_ms': round(parse_ms[site] / len(runs[site]), 3),
+            'recommended': ranking[0]['selector'] if ranking else None,
+            'previous': previous,
+            'ranking': ranking,
+            'cached': False,
+        }
+    with open(cache_path, 'w', encoding='utf-8') as f:
+        json.dump({site: {k: v for k, v in result.items() if k != 'cached'}
+                   for site, result in sites.items()}, f, indent=2)
+    return sites
+
+
+def fetch(corpus=CORPUS):
+    """Saves each TEST_URLS page into the corpus (the only online step)"""
+    _, urls = read_test_scrapers()
+    for site, url in urls.items():
+        directory = os.path.join(corpus, slug(site))
+        os.makedirs(directory, exist_ok=True)
+        name = slug(url.rstrip('/').rsplit('/', 1)[-1]) or 'index'
+        path = os.path.join(directory, f'{name}.html')
+        request = urllib.request.Request(url, headers={
+            'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) '
+                          'Chrome/91.0.4472.124 Safari/537.36'})
+        try:
+            with urllib.request.urlopen(request, timeout=10) as response:
+                html = response.read().decode(response.headers.get_content_charset() or 'utf-8', 'replace')
+        except OSError as e:
+            print(f"❌ {site}: {e}")
+            continue
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(html)
+        print(f"💾 {site}: saved {len(html):,} bytes to {os.path.relpath(path)}")
+        time.sleep(2)  # respectful delay, as in test-scrapers.js
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rank scraper selectors against saved article HTML")
+    parser.add_argument('--corpus', default=CORPUS, help="fixture directory (default: %(default)s)")
+    parser.add_argument('--out', default=RESULTS, help="JSON results for update-scrapers.py (default: %(default)s)")
+    parser.add_argument('--workers', type=int, help="worker processes (default: one per CPU)")
+    parser.add_argument('--fetch', action='store_true', help="save the TEST_URLS pages into the corpus first")
+    parser.add_argument('--full', action='store_true', help="re-evaluate every site, even unchanged ones")
+    args = parser.parse_args()
+
+    if args.fetch:
+        fetch(args.corpus)
+
+    started = time.perf_counter()
+    sites = evaluate(args.corpus, workers=args.workers, full=args.full)
+    if not sites:
+        print(f"❌ No fixtures found under {args.corpus}/<site>/ - run with --fetch first")
+        sys.exit(1)
+
+    for site, result in sites.items():
+        if result['cached']:
+            print(f"\n♻️  {site}: layout unchanged ({result['fingerprint']}) - keeping \"{result['recommended']}\"")
+            continue
+        print(f"\n🧪 {site} ({len(result['fixtures'])} fixture(s), parse {result['parse_ms']:.1f} ms, "
+              f"fingerprint {result['fingerprint']})")
+        if not result['ranking']:
+            print("   ❌ NO WORKING SELECTORS FOUND")
+        for i, total in enumerate(result['ranking'][:5], 1):
+            print(f"   {i}. {total['selector']:<32} {total['fixtures_passed']}/{len(result['fixtures'])} pages"
+                  f"  {total['chars']:>8,} chars  {total['ms']:.2f} ms")
+        if result['recommended']:
+            print(f"   🏆 RECOMMENDED: \"{result['recommended']}\"")
+
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump({'generated': datetime.now().isoformat(timespec='seconds'),
+                   'corpus': os.path.abspath(args.corpus), 'sites': sites}, f, indent=2)
+    evaluated = sum(not result['cached'] for result in sites.values())
+    print(f"\n✅ Evaluated {evaluated}/{len(sites)} site(s) in {time.perf_counter() - started:.2f}s"
+          f" - results written to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
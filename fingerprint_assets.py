@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Content-hash fingerprinting for the static pages' CSS, JS, images and fonts
+
+The `?v=37.11.4-PHASE3C` query strings in index.html only change when
+someone remembers to bump them, so nothing the pages load can be cached
+for long. This build step:
+
+1. collects every local asset a page references (src/href attributes,
+   and url()/@import inside referenced CSS, recursively)
+2. copies each to a name carrying a hash of its content -
+   css/main.css -> css/main.3f2a9c1b7d.css - rewriting a stylesheet's
+   own references first, so its hash covers what it points to
+3. rewrites the references in the pages (dropping the ?v= strings)
+4. writes asset-manifest.json (original -> fingerprinted path) and a
+   generated block in _headers giving every fingerprinted file a
+   year-long immutable Cache-Control
+
+The originals stay where they are, so anything not rewritten here (JS
+importing other files, sw.js's precache list) keeps working. Pages can
+be rebuilt any number of times: references that already point at a
+fingerprinted copy are traced back to the original through the
+manifest, and an unchanged file gets the same name again.
+
+Usage:
+    python3 fingerprint_assets.py                         # index.html and civic-platform.html
+    python3 fingerprint_assets.py civic-platform-production.html --dry-run
+    python3 fingerprint_assets.py --prune                 # also delete superseded copies
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import posixpath
+import re
+import shutil
+import sys
+import urllib.parse
+
+from patch_engine import write_atomic
+
+PAGES = ['index.html', 'civic-platform.html']
+MANIFEST = 'asset-manifest.json'
+HEADERS = '_headers'
+HASH_LENGTH = 10
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+ASSET_EXTENSIONS = {'.css', '.js', '.mjs', '.svg', '.png', '.jpg', '.jpeg', '.gif', '.webp', '.avif', '.ico',
+                    '.woff', '.woff2', '.ttf', '.otf'}
+
+HEADERS_START = '# --- fingerprinted assets (generated by fingerprint_assets.py, do not edit)'
+HEADERS_END = '# --- end fingerprinted assets'
+
+_ATTRIBUTE = re.compile(r'''(\b(?:src|href)\s*=\s*)(["'])([^"']*)\2''', re.I)
+_CSS_URL = re.compile(r'''(url\(\s*)(["']?)([^"')\s]+)\2(\s*\))|(@import\s+)(["'])([^"']+)\6''', re.I)
+_FINGERPRINT = re.compile(r'\.[0-9a-f]{%d}(?=\.[^./]+$)' % HASH_LENGTH)
+
+
+class AssetError(Exception):
+    pass
+
+
+# =============================================================================
+# PATHS
+# =============================================================================
+
+def _local_path(url, base_dir):
+    """The site-relative path a reference points to, or None for external,
+    data: and in-page references"""
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme or parts.netloc or not parts.path:
+        return None
+    path = urllib.parse.unquote(parts.path)
+    if path.startswith('/'):
+        return posixpath.normpath(path.lstrip('/'))
+    return posixpath.normpath(posixpath.join(base_dir, path))
+
+
+def _replace_path(url, new_path):
+    """url pointing at new_path's file name instead; the query string
+    (the old ?v= cache-buster) goes, a #fragment stays"""
+    parts = urllib.parse.urlsplit(url)
+    directory = parts.path.rsplit('/', 1)[0] + '/' if '/' in parts.path else ''
+    name = urllib.parse.quote(posixpath.basename(new_path))
+    return directory + name + (f'#{parts.fragment}' if parts.fragment else '')
+
+
+def fingerprinted_name(path, content):
+    stem, extension = posixpath.splitext(path)
+    return f"{stem}.{hashlib.sha256(content).hexdigest()[:HASH_LENGTH]}{extension}"
+
+
+# =============================================================================
+# BUILD
+# =============================================================================
+
+class Build:
+    """Fingerprints assets under root on demand, each once"""
+
+    def __init__(self, root, previous=None, dry_run=False):
+        self.root = root
+        self.dry_run = dry_run
+        self.manifest = {}
+        self.sizes = {}
+        self.missing = set()
+        # fingerprinted copy -> original, to see through earlier builds
+        self.originals = {copy: original for original, copy in (previous or {}).items()}
+        self._visiting = set()
+
+    def original(self, path):
+        if path in self.originals:
+            return self.originals[path]
+        if _FINGERPRINT.search(path):
+            candidate = _FINGERPRINT.sub('', path)
+            if os.path.isfile(os.path.join(self.root, candidate)):
+                return candidate
+        return path
+
+    def asset(self, path):
+        """The fingerprinted path for the asset at path (site-relative),
+        or None if it isn't a fingerprintable file"""
+        path = self.original(path)
+        if posixpath.splitext(path)[1].lower() not in ASSET_EXTENSIONS:
+            return None
+        if path in self.manifest:
+            return self.manifest[path]
+        full = os.path.join(self.root, path)
+        if not os.path.isfile(full):
+            self.missing.add(path)
+            return None
+        if path in self._visiting:
+            raise AssetError(f"{path} imports itself (through {', '.join(sorted(self._visiting))})")
+        self._visiting.add(path)
+        try:
+            with open(full, 'rb') as f:
+                content = f.read()
+            if path.lower().endswith('.css'):
+                content = self.rewrite_css(content.decode('utf-8'), posixpath.dirname(path)).encode('utf-8')
+        finally:
+            self._visiting.discard(path)
+        copy = fingerprinted_name(path, content)
+        target = os.path.join(self.root, copy)
+        if not self.dry_run and not os.path.exists(target):
+            with open(target, 'wb') as f:
+                f.write(content)
+            shutil.copymode(full, target)
+        self.manifest[path] = copy
+        self.sizes[path] = len(content)
+        return copy
+
+    def _reference(self, url, base_dir):
+        path = _local_path(url, base_dir)
+        if path is None or path.startswith('..'):
+            return url
+        copy = self.asset(path)
+        return _replace_path(url, copy) if copy else url
+
+    def rewrite_css(self, text, base_dir):
+        def replace(match):
+            if match.group(1):
+                return match.group(1) + match.group(2) + self._reference(match.group(3), base_dir) \
+                    + match.group(2) + match.group(4)
+            return match.group(5) + match.group(6) + self._reference(match.group(7), base_dir) + match.group(6)
+        return _CSS_URL.sub(replace, text)
+
+    def rewrite_page(self, text, base_dir):
+        """The page with every asset reference fingerprinted; returns
+        (text, references rewritten)"""
+        count = 0
+
+        def replace(match):
+            nonlocal count
+            url = self._reference(match.group(3), base_dir)
+            if url != match.group(3):
+                count += 1
+            return match.group(1) + match.group(2) + url + match.group(2)
+        return _ATTRIBUTE.sub(replace, text), count
+
+
+# =============================================================================
+# OUTPUTS
+# =============================================================================
+
+def load_manifest(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def headers_block(manifest):
+    lines = [HEADERS_START]
+    for copy in sorted(manifest.values()):
+        lines.append(f"/{urllib.parse.quote(copy)}")
+        lines.append(f"  Cache-Control: {CACHE_CONTROL}")
+    lines.append(HEADERS_END)
+    return '\n'.join(lines) + '\n'
+
+
+def update_headers(text, manifest):
+    """text (a Netlify _headers file) with the generated block replaced,
+    or appended if it isn't there yet"""
+    block = headers_block(manifest)
+    start = text.find(HEADERS_START)
+    if start != -1:
+        end = text.find(HEADERS_END, start)
+        if end == -1:
+            raise AssetError(f"{HEADERS_START!r} without {HEADERS_END!r}")
+        end = text.find('\n', end)
+        return text[:start] + block + (text[end + 1:] if end != -1 else '')
+    return text + ('' if not text or text.endswith('\n') else '\n') + '\n' + block
+
+
+def build(root, pages, dry_run=False, prune=False):
+    """Fingerprints what pages reference and rewrites them. Returns
+    ({page: references rewritten}, Build, superseded copies)."""
+    manifest_path = os.path.join(root, MANIFEST)
+    previous = load_manifest(manifest_path)
+    state = Build(root, previous, dry_run)
+    rewritten = {}
+    texts = {}
+    for page in pages:
+        with open(os.path.join(root, page), 'r', encoding='utf-8') as f:
+            text = f.read()
+        texts[page], rewritten[page] = state.rewrite_page(text, posixpath.dirname(page))
+
+    # earlier builds' assets that no page referenced this time (another
+    # page was built then) are kept as they were
+    for original, copy in previous.items():
+        state.manifest.setdefault(original, copy)
+    superseded = sorted(set(previous.values()) - set(state.manifest.values()))
+
+    if not dry_run:
+        for page, text in texts.items():
+            write_atomic(os.path.join(root, page), text)
+        write_atomic(manifest_path, json.dumps(dict(sorted(state.manifest.items())), indent=2) + '\n')
+        headers_path = os.path.join(root, HEADERS)
+        headers = ''
+        if os.path.exists(headers_path):
+            with open(headers_path, 'r', encoding='utf-8') as f:
+                headers = f.read()
+        write_atomic(headers_path, update_headers(headers, state.manifest))
+        if prune:
+            for copy in superseded:
+                full = os.path.join(root, copy)
+                if os.path.exists(full):
+                    os.unlink(full)
+    return rewritten, state, superseded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fingerprint the assets the static pages reference")
+    parser.add_argument('pages', nargs='*', help=f"pages to rewrite (default: {', '.join(PAGES)})")
+    parser.add_argument('--root', default='.', help="site root the pages and assets are in (default: %(default)s)")
+    parser.add_argument('--dry-run', action='store_true', help="report, but write nothing")
+    parser.add_argument('--prune', action='store_true', help="delete copies no longer in the manifest")
+    args = parser.parse_args()
+
+    pages = args.pages or [page for page in PAGES if os.path.exists(os.path.join(args.root, page))]
+    for page in args.pages:
+        if not os.path.exists(os.path.join(args.root, page)):
+            print(f"❌ {page} not found under {args.root}")
+            sys.exit(1)
+    if not pages:
+        print(f"❌ None of {', '.join(PAGES)} found under {args.root}")
+        sys.exit(1)
+
+    try:
+        rewritten, state, superseded = build(args.root, [posixpath.normpath(p) for p in pages],
+                                             args.dry_run, args.prune)
+    except (AssetError, OSError, UnicodeDecodeError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    for page, count in rewritten.items():
+        print(f"📄 {page}: {count} references rewritten")
+    total = sum(state.sizes.values())
+    print(f"🔒 {len(state.sizes)} assets fingerprinted ({total / 1024:.0f} KB), cacheable for a year")
+    for path in sorted(state.missing):
+        print(f"⚠️  {path} is referenced but doesn't exist")
+    if superseded:
+        print(f"🧹 {len(superseded)} superseded copies " + ('deleted' if args.prune and not args.dry_run
+                                                           else 'kept (delete them with --prune)'))
+    if args.dry_run:
+        print("Dry run - nothing written")
+    else:
+        print(f"💾 {MANIFEST} and {HEADERS} updated")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,308 @@
+"""
+Compiles analyzeSourceGaps' category table into one keyword matcher
+
+The hand-written analyzeSourceGaps ran one case-insensitive regex per
+policy category (SNAP, healthcare, tax, ...) against every chat query, so
+each new category made every query slower. Here the categories are a
+declarative table:
+
+    CATEGORIES = [
+        ('SNAP/welfare', ['snap', 'food stamp', 'welfare', 'benefit'], [
+            'SNAP benefits cuts 2025 statistics dollar amounts',
+            ...
+        ]),
+        ...
+    ]
+
+and source_gap_block() turns every keyword of every category into ONE
+regex, factored into a trie (`fo(?:od stamp|ssil fuel)|...`). It is run
+over the query once, restarting one character after each match so
+overlapping keywords are all seen. A Map from the matched keyword to its
+categories (including the categories of any shorter keyword inside it)
+gives the same answer as testing the categories one by one, at a cost
+set by the query length instead of the number of categories.
+
+    python3 enhance-prompting.py --benchmark    # per-query cost, 6 -> 100+ categories (needs node)
+"""
+
+import json
+import os
+import random
+import re
+import subprocess
+import tempfile
+
+BLOCK_START = '// --- analyzeSourceGaps keyword matcher'
+BLOCK_END = '// --- end analyzeSourceGaps keyword matcher'
+
+THRESHOLD = 12
+MAX_FOLLOW_UPS = 5
+BENCHMARK_SIZES = (6, 12, 25, 50, 100, 200)
+
+
+# =============================================================================
+# REGEX
+# =============================================================================
+
+def _escape(text):
+    # JS and Python regex syntax agree on these
+    return re.sub(r'[\\^$.*+?()[\]{}|/]', r'\\\g<0>', text)
+
+
+def _trie_pattern(node):
+    """Regex for the keywords below a trie node; longer keywords win
+    because the optional tail of a shorter one is greedy."""
+    branches = []
+    for char in sorted(node):
+        if char == '':
+            continue
+        text = char
+        child = node[char]
+        # collapse single-child chains into a literal
+        while len(child) == 1 and '' not in child:
+            (char, child), = child.items()
+            text += char
+        branches.append(_escape(text) + _trie_pattern(child))
+    if not branches:
+        return ''
+    pattern = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+    if '' in node:
+        if len(branches) == 1 and not pattern.startswith('(?:'):
+            pattern = '(?:' + pattern + ')'
+        pattern += '?'
+    return pattern
+
+
+def keyword_pattern(keywords):
+    """One trie-factored alternation matching any of keywords"""
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[''] = {}
+    pattern = _trie_pattern(trie)
+    if pattern.startswith('(?:') and pattern.endswith(')') and '' not in trie:
+        pattern = pattern[3:-1]
+    return pattern
+
+
+def keyword_categories(categories):
+    """{keyword: [category indexes]} - a keyword also stands for the
+    categories of every keyword it contains, since at any position the
+    matcher only reports the longest keyword starting there"""
+    own = {}
+    for index, (_, keywords, _) in enumerate(categories):
+        for keyword in keywords:
+            own.setdefault(keyword.lower(), []).append(index)
+    return {keyword: sorted({index for other, indexes in own.items() if other in keyword
+                             for index in indexes})
+            for keyword in own}
+
+
+# =============================================================================
+# JAVASCRIPT
+# =============================================================================
+
+def _js_template(text):
+    """A JS template literal for a follow-up query, {query} standing for
+    the user's original query"""
+    text = text.replace('\\', '\\\\').replace('`', '\\`').replace('${', '\\${')
+    return '`' + text.replace('{query}', '${originalQuery}') + '`'
+
+
+def source_gap_block(categories, source):
+    """The generated top-level constants analyzeSourceGaps reads, between
+    BLOCK_START and BLOCK_END; source names the generating script"""
+    mapping = keyword_categories(categories)
+    lines = [
+        f"{BLOCK_START} (generated by {source} - edit its CATEGORIES",
+        f"// table, not this block). Every category's keywords in one trie-shaped regex",
+        f"const SOURCE_GAP_KEYWORDS = /{keyword_pattern(mapping)}/g;",
+        "const SOURCE_GAP_CATEGORIES = new Map([",
+    ]
+    for name, keywords, _ in categories:
+        entries = ', '.join(f"[{json.dumps(keyword.lower())}, {mapping.pop(keyword.lower())}]"
+                            for keyword in keywords if keyword.lower() in mapping)
+        if entries:
+            lines.append(f"    {entries}, // {name}")
+    lines.append("]);")
+    lines.append("const SOURCE_GAP_FOLLOW_UPS = [")
+    for name, _, queries in categories:
+        lines.append(f"    [ // {name}")
+        lines.extend(f"        {json.dumps(query)}," for query in queries)
+        lines.append("    ],")
+    lines.append("];")
+    lines.append(BLOCK_END)
+    return '\n'.join(lines)
+
+
+def analyze_source_gaps(fallback, threshold=THRESHOLD, limit=MAX_FOLLOW_UPS, name='analyzeSourceGaps'):
+    """analyzeSourceGaps over the generated block. fallback is (keywords,
+    queries) tried when no category matched."""
+    keywords, queries = fallback
+    pushes = '\n'.join(f"            followUpQueries.push({_js_template(query)});" for query in queries)
+    return f'''function {name}(sources, originalQuery) {{
+    if (!originalQuery || typeof originalQuery !== 'string') {{
+        return {{ needsMoreData: false, followUpQueries: [] }};
+    }}
+
+    const queryLower = originalQuery.toLowerCase();
+    const followUpQueries = [];
+
+    if (sources.length < {threshold}) {{
+        // One pass over the query finds every matching category at once
+        const matched = [];
+        let match;
+        SOURCE_GAP_KEYWORDS.lastIndex = 0;
+        while ((match = SOURCE_GAP_KEYWORDS.exec(queryLower)) !== null) {{
+            for (const category of SOURCE_GAP_CATEGORIES.get(match[0])) {{
+                if (!matched.includes(category)) matched.push(category);
+            }}
+            // keywords may overlap: look again from the next character
+            SOURCE_GAP_KEYWORDS.lastIndex = match.index + 1;
+        }}
+        // Follow-ups in table order, like the categories were checked before
+        matched.sort((a, b) => a - b);
+        for (const category of matched) {{
+            followUpQueries.push(...SOURCE_GAP_FOLLOW_UPS[category]);
+            if (followUpQueries.length >= {limit}) break;
+        }}
+
+        // Generic fallback - analyze for key policy terms
+        if (followUpQueries.length === 0 && /{'|'.join(_escape(k.lower()) for k in keywords)}/.test(queryLower)) {{
+{pushes}
+        }}
+    }}
+
+    return {{
+        needsMoreData: followUpQueries.length > 0,
+        followUpQueries: followUpQueries.slice(0, {limit}) // Max {limit} follow-up queries
+    }};
+}}'''
+
+
+def legacy_analyze_source_gaps(categories, fallback, threshold=THRESHOLD, limit=MAX_FOLLOW_UPS,
+                               name='analyzeSourceGaps'):
+    """The hand-written shape: one regex test per category. Only used as
+    the benchmark's baseline and to check the compiled matcher agrees."""
+    lines = [
+        f"function {name}(sources, originalQuery) {{",
+        "    if (!originalQuery || typeof originalQuery !== 'string') {",
+        "        return { needsMoreData: false, followUpQueries: [] };",
+        "    }",
+        "    const queryLower = originalQuery.toLowerCase();",
+        "    const followUpQueries = [];",
+    ]
+    for _, keywords, queries in categories:
+        lines.append(f"    if (queryLower.match(/{'|'.join(_escape(k.lower()) for k in keywords)}/i)) {{")
+        lines.append(f"        if (sources.length < {threshold}) {{")
+        lines.extend(f"            followUpQueries.push({json.dumps(query)});" for query in queries)
+        lines.append("        }")
+        lines.append("    }")
+    keywords, queries = fallback
+    lines.append(f"    if (followUpQueries.length === 0 && sources.length < {threshold}) {{")
+    lines.append(f"        if (queryLower.match(/{'|'.join(_escape(k.lower()) for k in keywords)}/i)) {{")
+    lines.extend(f"            followUpQueries.push({_js_template(query)});" for query in queries)
+    lines.append("        }")
+    lines.append("    }")
+    lines.append(f"    return {{ needsMoreData: followUpQueries.length > 0, "
+                 f"followUpQueries: followUpQueries.slice(0, {limit}) }};")
+    lines.append("}")
+    return '\n'.join(lines)
+
+
+# =============================================================================
+# BENCHMARK
+# =============================================================================
+
+_SYLLABLES = ['ba', 'cor', 'den', 'fi', 'gal', 'hu', 'ket', 'lo', 'mar', 'nes', 'pra', 'qui',
+              'ros', 'sul', 'tev', 'ur', 'vin', 'wex', 'yo', 'zan']
+
+_QUERIES = [
+    "What happened with the SNAP benefit cuts this week?",
+    "How will Medicaid changes affect my state?",
+    "Is the corporate tax cut making the deficit worse?",
+    "Which unions are on strike right now and why?",
+    "What is Congress doing about fossil fuel subsidies?",
+    "Latest news on asylum and deportation policy",
+    "Explain the new budget bill",
+    "Who is my representative?",
+    "Tell me about worker cooperatives in Spain",
+    "Can you summarize the Supreme Court ruling on the ACA?",
+    "What are the best vegetarian recipes for a vacation?",
+    "How do I register to vote?",
+]
+
+
+def _synthetic(categories, size, rng):
+    """categories padded with made-up ones (4-6 keywords each) to size"""
+    categories = list(categories[:size])
+    while len(categories) < size:
+        n = len(categories)
+        keywords = [''.join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 4)))
+                    for _ in range(rng.randint(4, 6))]
+        categories.append((f"synthetic {n}", keywords, [f"{keyword} statistics" for keyword in keywords]))
+    return categories
+
+
+def _queries(categories, rng):
+    """The fixed queries plus ones hitting random keywords from the table"""
+    queries = list(_QUERIES)
+    for _ in range(len(_QUERIES)):
+        _, keywords, _ = rng.choice(categories)
+        queries.append(f"what does the {rng.choice(keywords)} proposal mean for families")
+    return queries
+
+
+_HARNESS = '''
+const queries = %(queries)s;
+const sources = new Array(5).fill({});
+function time(fn) {
+    for (let i = 0; i < 2000; i++) fn(sources, queries[i %% queries.length]);
+    const rounds = %(rounds)d;
+    const start = process.hrtime.bigint();
+    let sink = 0;
+    for (let r = 0; r < rounds; r++) {
+        for (const query of queries) sink += fn(sources, query).followUpQueries.length;
+    }
+    const ns = Number(process.hrtime.bigint() - start) / (rounds * queries.length);
+    return sink >= 0 ? ns : -1;
+}
+const mismatches = queries.filter(q =>
+    JSON.stringify(legacyGaps(sources, q)) !== JSON.stringify(compiledGaps(sources, q)));
+console.log(JSON.stringify({ legacy: time(legacyGaps), compiled: time(compiledGaps), mismatches }));
+'''
+
+
+def benchmark(categories, fallback, sizes=BENCHMARK_SIZES, rounds=2000, seed=17):
+    """[(categories, legacy ns/query, compiled ns/query, mismatched
+    queries)] for the table padded to each size, timed under node"""
+    rng = random.Random(seed)
+    results = []
+    for size in sizes:
+        table = _synthetic(categories, size, rng)
+        script = '\n\n'.join([
+            source_gap_block(table, 'benchmark'),
+            analyze_source_gaps(fallback, name='compiledGaps'),
+            legacy_analyze_source_gaps(table, fallback, name='legacyGaps'),
+            _HARNESS % {'queries': json.dumps(_queries(table, rng)), 'rounds': rounds},
+        ])
+        fd, path = tempfile.mkstemp(prefix='source-gaps-', suffix='.js')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(script)
+            result = subprocess.run(['node', path], capture_output=True, text=True, check=True)
+        finally:
+            os.unlink(path)
+        timing = json.loads(result.stdout)
+        results.append((size, timing['legacy'], timing['compiled'], timing['mismatches']))
+    return results
+
+
+def print_benchmark(results):
+    print(f"{'categories':>10}  {'per-category regexes':>21}  {'compiled matcher':>17}")
+    for size, legacy, compiled, mismatches in results:
+        note = f"  ❌ {len(mismatches)} queries differ" if mismatches else ''
+        print(f"{size:>10}  {legacy:>18.0f} ns  {compiled:>14.0f} ns{note}")
+
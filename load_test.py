@@ -0,0 +1,616 @@
+#!/usr/bin/env python3
+"""
+Asyncio load generator for the chat pipeline, with stand-in upstreams
+
+Since v37.5.0 every chat request searches for sources BEFORE the LLM
+call, strictly in sequence. This drives POST /api/chat/query at set
+concurrency levels and reports, per level, the latency histogram,
+throughput and error rate - and how each request's time splits into
+the phases around the LLM call:
+
+    before LLM   pre-search, iterative follow-up searches, DB lookups
+    LLM          the chat-completions call itself
+    after LLM    citation checks, caching, response
+
+Nothing goes to the real providers. The backend is started with a
+small --require preload that sends every outbound non-local HTTP(S)
+request to one of two local stand-in servers run by this script:
+
+- an LLM stand-in answering chat-completions (OpenAI/Groq and Qwen
+  response shapes) for the LLM hosts
+- a search stand-in answering DuckDuckGo HTML, Wikipedia JSON, RSS and
+  plain article pages for everything else
+
+both with configurable latency distributions and error rates. Every
+query gets a unique tag, which keeps the response cache out of the way
+and lets the LLM stand-in time the phases of each request.
+
+Usage:
+    python3 load_test.py --backend-dir /var/www/workforce-democracy/backend --concurrency 1,4,16 --duration 30
+    python3 load_test.py --backend-dir backend --llm-latency lognormal:1500,0.4 --search-latency uniform:200,1500
+
+Latency: fixed:MS | uniform:LOW,HIGH | lognormal:MEDIAN,SIGMA | exp:MEAN (milliseconds)
+
+To load a backend that is already running (e.g. under PM2), pass --url
+and start that backend with the NODE_OPTIONS and LOADTEST_* environment
+this script prints.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+import urllib.parse
+
+from pm2_reload import ReloadError, check_health
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CORPUS = os.path.join(SCRIPT_DIR, 'query-corpus.jsonl')
+CHAT_PATH = '/api/chat/query'
+PORT = 3101
+LLM_HOSTS = ('api.groq.com', 'dashscope.aliyuncs.com', 'dashscope-intl.aliyuncs.com', 'api.openai.com')
+TIMEOUT = 120
+
+# Histogram bucket upper bounds, seconds
+BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100)
+
+# Digits without 2, so a tag can never spell 2024/2025 for needsCurrentInfo
+_TAG_DIGITS = '013456789'
+_TAG = re.compile(r'\(lt([013456789]+)\)')
+
+
+# =============================================================================
+# LATENCY
+# =============================================================================
+
+class Latency:
+    """A latency distribution, parsed from fixed:MS, uniform:LOW,HIGH,
+    lognormal:MEDIAN,SIGMA or exp:MEAN (all milliseconds)"""
+
+    def __init__(self, spec):
+        kind, _, args = spec.partition(':')
+        try:
+            self.values = [float(value) for value in args.split(',')]
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"bad latency {spec!r}")
+        arity = {'fixed': 1, 'uniform': 2, 'lognormal': 2, 'exp': 1}.get(kind)
+        if arity is None or len(self.values) != arity:
+            raise argparse.ArgumentTypeError(f"bad latency {spec!r} (fixed:MS, uniform:LOW,HIGH, "
+                                             f"lognormal:MEDIAN,SIGMA or exp:MEAN)")
+        self.kind = kind
+        self.spec = spec
+
+    def sample(self, rng):
+        """One latency, seconds"""
+        if self.kind == 'fixed':
+            ms = self.values[0]
+        elif self.kind == 'uniform':
+            ms = rng.uniform(*self.values)
+        elif self.kind == 'lognormal':
+            ms = rng.lognormvariate(math.log(self.values[0]), self.values[1])
+        else:
+            ms = rng.expovariate(1 / self.values[0])
+        return ms / 1000
+
+
+# =============================================================================
+# HTTP (stdlib asyncio, both ends)
+# =============================================================================
+
+async def _read_message(reader):
+    """(start line, {header: value}, body) of one HTTP message, or None
+    at EOF"""
+    line = await reader.readline()
+    if not line:
+        return None
+    headers = {}
+    while True:
+        header = await reader.readline()
+        if header in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = header.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        body = b''
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                await reader.readline()
+                break
+            body += await reader.readexactly(size)
+            await reader.readline()
+    else:
+        body = await reader.readexactly(int(headers.get('content-length', 0)))
+    return line.decode('latin-1').strip(), headers, body
+
+
+async def serve(handler):
+    """A keep-alive HTTP/1.1 server on a free local port; handler(method,
+    path, headers, body) returns (status, content type, body)"""
+    async def connection(reader, writer):
+        try:
+            while True:
+                message = await _read_message(reader)
+                if message is None:
+                    break
+                start, headers, body = message
+                method, path, _ = start.split(' ', 2)
+                status, content_type, payload = await handler(method, path, headers, body)
+                writer.write(f"HTTP/1.1 {status} {'OK' if status < 400 else 'Error'}\r\n"
+                             f"Content-Type: {content_type}\r\nContent-Length: {len(payload)}\r\n\r\n"
+                             .encode() + payload)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(connection, '127.0.0.1', 0)
+
+
+def _port(server):
+    return server.sockets[0].getsockname()[1]
+
+
+async def post_json(host, port, path, data, timeout=TIMEOUT):
+    """(status, parsed JSON body or None) of a POST. A connection closed
+    without an answer raises ConnectionError, a body cut short
+    asyncio.IncompleteReadError and a garbled status line ValueError."""
+    body = json.dumps(data).encode()
+
+    async def exchange():
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            writer.write(f"POST {path} HTTP/1.1\r\nHost: {host}:{port}\r\nContent-Type: application/json\r\n"
+                         f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+            await writer.drain()
+            return await _read_message(reader)
+        finally:
+            writer.close()
+
+    message = await asyncio.wait_for(exchange(), timeout)
+    if message is None:
+        raise ConnectionError("connection closed without a response")
+    start, _, payload = message
+    parts = start.split(' ')
+    if len(parts) < 2 or not parts[1].isdigit():
+        raise ValueError(f"bad status line {start!r}")
+    try:
+        return int(parts[1]), json.loads(payload)
+    except ValueError:
+        return int(parts[1]), None
+
+
+# =============================================================================
+# STAND-IN UPSTREAMS
+# =============================================================================
+
+class StandIn:
+    """Latency, error rate and request counts shared by both stand-ins"""
+
+    def __init__(self, latency, error_rate, seed):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self.errors = 0
+
+    async def delay(self):
+        """Waits out one sampled latency; True when this request should fail"""
+        self.requests += 1
+        await asyncio.sleep(self.latency.sample(self.rng))
+        if self.rng.random() < self.error_rate:
+            self.errors += 1
+            return True
+        return False
+
+
+class LLMStandIn(StandIn):
+    """Chat completions, answered in a shape both the Groq (OpenAI) and
+    the Qwen (DashScope) clients read. Records when each tagged request
+    reached it and when it was answered."""
+
+    def __init__(self, latency, error_rate, seed):
+        super().__init__(latency, error_rate, seed)
+        self.calls = {}     # tag -> [(started, finished, failed)]
+
+    async def handle(self, method, path, headers, body):
+        started = time.monotonic()
+        tag = _TAG.search(body.decode('utf-8', 'replace'))
+        failed = await self.delay()
+        if tag:
+            self.calls.setdefault(tag.group(1), []).append((started, time.monotonic(), failed))
+        if failed:
+            return 503, 'application/json', b'{"error": {"message": "stand-in overloaded"}}'
+        text = ("Here is what the sources say [1]. Recent reporting covers the policy's effects "
+                "in detail [2], with figures from the latest analysis.")
+        message = {'role': 'assistant', 'content': text}
+        return 200, 'application/json', json.dumps({
+            'id': 'loadtest', 'object': 'chat.completion', 'model': 'stand-in',
+            'choices': [{'index': 0, 'message': message, 'finish_reason': 'stop'}],
+            'output': {'text': text, 'choices': [{'message': message, 'finish_reason': 'stop'}],
+                       'finish_reason': 'stop'},
+            'usage': {'prompt_tokens': 800, 'completion_tokens': 60, 'total_tokens': 860,
+                      'input_tokens': 800, 'output_tokens': 60},
+        }).encode()
+
+
+class SearchStandIn(StandIn):
+    """Whatever the backend's search code asks for, keyed on the original
+    URL the preload puts in X-Stand-In-Original"""
+
+    def __init__(self, latency, error_rate, seed):
+        super().__init__(latency, error_rate, seed)
+        self.hosts = {}
+
+    async def handle(self, method, path, headers, body):
+        original = urllib.parse.urlparse(headers.get('x-stand-in-original', 'http://unknown' + path))
+        host = original.hostname or 'unknown'
+        self.hosts[host] = self.hosts.get(host, 0) + 1
+        if await self.delay():
+            return 503, 'text/plain', b'stand-in unavailable'
+        query = urllib.parse.parse_qs(original.query).get('q', ['policy'])[0]
+        n = self.requests
+        if 'duckduckgo' in host:
+            site = re.search(r'site:(\S+)', query)
+            domain = site.group(1) if site else 'example.org'
+            return 200, 'text/html', (
+                f'<div class="result"><h2 class="result__title"><a href="https://{domain}/news/{n}">'
+                f'{query} - what changed</a></h2><a class="result__url" href="https://{domain}/news/{n}">'
+                f'{domain}/news/{n}</a><a class="result__snippet">Reporting on {query}.</a></div>'
+            ).encode()
+        if host.endswith('wikipedia.org'):
+            title = urllib.parse.unquote(original.path.rsplit('/', 1)[-1]).replace('_', ' ')
+            return 200, 'application/json', json.dumps({
+                'title': title, 'extract': f"{title} is a stand-in summary used for load testing.",
+                'content_urls': {'desktop': {'page': f"https://en.wikipedia.org/wiki/{n}"}},
+            }).encode()
+        if 'guardianapis' in host:
+            return 200, 'application/json', json.dumps({'response': {'status': 'ok', 'results': []}}).encode()
+        if re.search(r'rss|feed|\.xml', original.path + original.query, re.I):
+            items = ''.join(f'<item><title>Policy update {n}-{i}</title><link>https://{host}/{n}/{i}</link>'
+                            f'<description>Workers, budgets and legislation.</description>'
+                            f'<pubDate>{time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime())}</pubDate></item>'
+                            for i in range(5))
+            return 200, 'application/rss+xml', (
+                f'<?xml version="1.0"?><rss version="2.0"><channel><title>{host}</title>{items}</channel></rss>'
+            ).encode()
+        paragraphs = ''.join(f'<p>Paragraph {i} about {query}: the figures, the people affected and what '
+                             f'comes next for the policy.</p>' for i in range(6))
+        return 200, 'text/html', (f'<html><body><article><h1>{query}</h1>{paragraphs}</article>'
+                                  f'</body></html>').encode()
+
+
+# Loaded into the backend with `node --require`: every outbound request to
+# a non-local host goes to a stand-in instead, with the original URL in a
+# header. LLM hosts go to the LLM stand-in, the rest to the search one.
+_PRELOAD = r'''
+const http = require('http');
+const https = require('https');
+const LLM = new URL(process.env.LOADTEST_LLM);
+const SEARCH = new URL(process.env.LOADTEST_SEARCH);
+const LLM_HOSTS = new Set(process.env.LOADTEST_LLM_HOSTS.split(','));
+const LOCAL = new Set(['127.0.0.1', 'localhost', '::1', '']);
+const httpRequest = http.request;
+
+function redirect(defaultProtocol, original) {
+    return function (input, options, callback) {
+        let url = null;
+        if (typeof input === 'string' || input instanceof URL) {
+            url = new URL(input);
+            if (typeof options === 'function') { callback = options; options = {}; }
+            options = Object.assign({}, options);
+        } else {
+            callback = options;
+            options = Object.assign({}, input);
+        }
+        const protocol = url ? url.protocol : (options.protocol || defaultProtocol);
+        const host = url ? url.hostname : String(options.hostname || options.host || '').replace(/:\d+$/, '');
+        if (LOCAL.has(host)) return original.apply(this, arguments);
+        const path = url ? url.pathname + url.search : (options.path || '/');
+        const target = LLM_HOSTS.has(host) ? LLM : SEARCH;
+        const headers = Object.assign({}, options.headers, { 'x-stand-in-original': `${protocol}//${host}${path}` });
+        return httpRequest({ method: options.method || 'GET', host: target.hostname, port: target.port, path,
+                             headers, timeout: options.timeout, signal: options.signal }, callback);
+    };
+}
+
+for (const [module, protocol] of [[http, 'http:'], [https, 'https:']]) {
+    const request = redirect(protocol, module.request);
+    module.request = request;
+    module.get = function (...args) { const req = request(...args); req.end(); return req; };
+}
+'''
+
+
+# =============================================================================
+# LOAD
+# =============================================================================
+
+def _tag(n):
+    digits = ''
+    while True:
+        n, digit = divmod(n, len(_TAG_DIGITS))
+        digits = _TAG_DIGITS[digit] + digits
+        if not n:
+            return digits
+
+
+def load_queries(path):
+    queries = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip() and not line.lstrip().startswith('#'):
+                queries.append(json.loads(line)['query'])
+    return queries
+
+
+class Level:
+    """One concurrency level's requests"""
+
+    def __init__(self, concurrency):
+        self.concurrency = concurrency
+        self.results = []       # dicts: tag, started, finished, status, ok, source, error
+        self.elapsed = 0
+
+
+async def run_level(host, port, queries, concurrency, duration, counter, tagged=True, chat_type='general'):
+    """concurrency closed-loop users sending chat queries for duration
+    seconds"""
+    level = Level(concurrency)
+    stop = time.monotonic() + duration
+
+    async def user(number):
+        while time.monotonic() < stop:
+            n = next(counter)
+            tag = _tag(n)
+            query = queries[n % len(queries)] + (f" (lt{tag})" if tagged else '')
+            result = {'tag': tag, 'started': time.monotonic(), 'status': None, 'ok': False, 'source': None,
+                      'error': None}
+            try:
+                status, body = await post_json(host, port, CHAT_PATH, {
+                    'chat_type': chat_type, 'user_id': f"loadtest-{number}", 'query': query})
+                result['status'] = status
+                body = body if isinstance(body, dict) else None
+                result['ok'] = status == 200 and bool(body) and body.get('success', True) is not False
+                result['source'] = (body or {}).get('source')
+                if not result['ok']:
+                    result['error'] = f"HTTP {status}" if status != 200 else 'success: false'
+            except asyncio.TimeoutError:
+                result['error'] = 'timeout'
+            except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+                # a backend falling over is what is being measured: note it and carry on
+                result['error'] = type(e).__name__
+            result['finished'] = time.monotonic()
+            level.results.append(result)
+
+    started = time.monotonic()
+    await asyncio.gather(*(user(i) for i in range(concurrency)))
+    level.elapsed = time.monotonic() - started
+    return level
+
+
+# =============================================================================
+# REPORT
+# =============================================================================
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1)] if ordered else 0
+
+
+def phases(level, llm_calls):
+    """({phase: [seconds]} for the level's successful tagged requests
+    that reached the LLM, {phase: failed requests}) - a failed request
+    is put on the phase it failed in: it never reached the LLM, the LLM
+    call failed, or it failed after a good LLM answer"""
+    split = {'before LLM': [], 'LLM': [], 'after LLM': []}
+    failed = dict.fromkeys(split, 0)
+    for result in level.results:
+        calls = llm_calls.get(result['tag'])
+        if not result['ok']:
+            if not calls:
+                failed['before LLM'] += 1
+            elif any(call[2] for call in calls):
+                failed['LLM'] += 1
+            else:
+                failed['after LLM'] += 1
+            continue
+        if not calls:
+            continue
+        first = min(call[0] for call in calls)
+        last = max(call[1] for call in calls)
+        split['before LLM'].append(first - result['started'])
+        split['LLM'].append(last - first)
+        split['after LLM'].append(result['finished'] - last)
+    return split, failed
+
+
+def summarize(level, llm_calls):
+    latencies = [result['finished'] - result['started'] for result in level.results if result['ok']]
+    errors = {}
+    for result in level.results:
+        if not result['ok']:
+            errors[result['error']] = errors.get(result['error'], 0) + 1
+    sources = {}
+    for result in level.results:
+        if result['ok']:
+            sources[result['source']] = sources.get(result['source'], 0) + 1
+    split, failed = phases(level, llm_calls)
+    return {
+        'concurrency': level.concurrency,
+        'requests': len(level.results),
+        'ok': len(latencies),
+        'error_rate': (len(level.results) - len(latencies)) / len(level.results) if level.results else 0,
+        'errors': errors,
+        'throughput': len(latencies) / level.elapsed if level.elapsed else 0,
+        'p50': _percentile(latencies, 0.5),
+        'p90': _percentile(latencies, 0.9),
+        'p99': _percentile(latencies, 0.99),
+        'max': max(latencies, default=0),
+        'histogram': [sum(1 for value in latencies if low <= value < high)
+                      for low, high in zip((0,) + BUCKETS, BUCKETS + (math.inf,))],
+        'phases': {name: {'p50': _percentile(values, 0.5), 'p99': _percentile(values, 0.99),
+                          'mean': statistics.mean(values) if values else 0, 'n': len(values),
+                          'errors': failed[name]}
+                   for name, values in split.items()},
+        'sources': sources,
+    }
+
+
+def print_level(summary):
+    print(f"\n👥 Concurrency {summary['concurrency']}: {summary['requests']} requests, "
+          f"{summary['throughput']:.2f} req/s, {summary['error_rate'] * 100:.1f}% errors"
+          + (f" ({', '.join(f'{k}: {v}' for k, v in summary['errors'].items())})" if summary['errors'] else ''))
+    print(f"   latency  p50 {summary['p50']:.2f}s  p90 {summary['p90']:.2f}s  p99 {summary['p99']:.2f}s  "
+          f"max {summary['max']:.2f}s")
+    peak = max(summary['histogram'], default=0)
+    labels = [f"< {high:g}s" for high in BUCKETS] + [f">= {BUCKETS[-1]:g}s"]
+    for label, count in zip(labels, summary['histogram']):
+        if count:
+            print(f"   {label:>8} {'█' * max(1, round(30 * count / peak))} {count}")
+    for name, phase in summary['phases'].items():
+        if phase['n'] or phase['errors']:
+            errors = f"  {phase['errors']} failed here" if phase['errors'] else ''
+            print(f"   {name:<11} p50 {phase['p50']:.2f}s  p99 {phase['p99']:.2f}s  mean {phase['mean']:.2f}s{errors}")
+    if summary['sources']:
+        print(f"   answered from: {', '.join(f'{k}: {v}' for k, v in summary['sources'].items())}")
+
+
+# =============================================================================
+# MAIN
+# =============================================================================
+
+async def _start_backend(directory, port, env, log, deadline=60):
+    """Starts server.js and waits for /health; fails as soon as it exits"""
+    process = await asyncio.create_subprocess_exec(
+        'node', 'server.js', cwd=directory, env=env, stdout=log, stderr=asyncio.subprocess.STDOUT)
+    loop = asyncio.get_running_loop()
+    url = f"http://127.0.0.1:{port}/health"
+    stop = time.monotonic() + deadline
+    while await loop.run_in_executor(None, check_health, url) is None:
+        if process.returncode is not None:
+            raise ReloadError(f"server.js exited with code {process.returncode}")
+        if time.monotonic() >= stop:
+            process.terminate()
+            raise ReloadError(f"{url}: no healthy answer after {deadline}s")
+        await asyncio.sleep(0.5)
+    return process
+
+
+async def run(args):
+    llm = LLMStandIn(args.llm_latency, args.llm_errors, args.seed)
+    search = SearchStandIn(args.search_latency, args.search_errors, args.seed + 1)
+    llm_server = await serve(llm.handle)
+    search_server = await serve(search.handle)
+
+    preload = tempfile.NamedTemporaryFile('w', prefix='loadtest-preload-', suffix='.js', delete=False)
+    preload.write(_PRELOAD)
+    preload.close()
+    env = {
+        'NODE_OPTIONS': f"--require {preload.name}",
+        'LOADTEST_LLM': f"http://127.0.0.1:{_port(llm_server)}",
+        'LOADTEST_SEARCH': f"http://127.0.0.1:{_port(search_server)}",
+        'LOADTEST_LLM_HOSTS': ','.join(args.llm_host),
+    }
+    process = None
+    log = None
+    try:
+        if args.url:
+            target = urllib.parse.urlparse(args.url)
+            host, port = target.hostname, target.port or 80
+            print("🔌 Start the backend under test with:")
+            for name, value in env.items():
+                print(f"     {name}={value}")
+            # keep the stand-ins serving while the backend starts
+            await asyncio.get_running_loop().run_in_executor(None, input, "   then press Enter... ")
+        else:
+            host, port = '127.0.0.1', args.port
+            backend_env = dict(os.environ, PORT=str(port), **env)
+            for key in ('GROQ_API_KEY', 'QWEN_API_KEY'):
+                backend_env.setdefault(key, 'loadtest')
+            log = open(args.log, 'w')
+            print(f"🚀 Starting {os.path.join(args.backend_dir, 'server.js')} on port {port} "
+                  f"(output: {args.log})...")
+            process = await _start_backend(args.backend_dir, port, backend_env, log)
+
+        queries = load_queries(args.corpus)
+        counter = iter(range(sys.maxsize))
+        print(f"📨 {len(queries)} queries from {args.corpus}; LLM {args.llm_latency.spec}, "
+              f"search {args.search_latency.spec}")
+        summaries = []
+        for concurrency in args.concurrency:
+            level = await run_level(host, port, queries, concurrency, args.duration, counter,
+                                    not args.allow_cache, args.chat_type)
+            summary = summarize(level, llm.calls)
+            summaries.append(summary)
+            print_level(summary)
+        print(f"\n🔧 Stand-ins: {llm.requests} LLM calls ({llm.errors} failed), "
+              f"{search.requests} search requests ({search.errors} failed)")
+        busiest = sorted(search.hosts.items(), key=lambda item: -item[1])[:5]
+        if busiest:
+            print(f"   busiest search hosts: {', '.join(f'{h} ({n})' for h, n in busiest)}")
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump({'levels': summaries, 'llm_calls': llm.requests, 'search_requests': search.requests,
+                           'search_hosts': search.hosts}, f, indent=2)
+            print(f"💾 Report: {args.json}")
+    finally:
+        if process and process.returncode is None:
+            process.terminate()
+            await process.wait()
+        if log:
+            log.close()
+        llm_server.close()
+        search_server.close()
+        os.unlink(preload.name)
+
+
+def _levels(text):
+    return [int(value) for value in text.split(',') if value.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load the chat endpoint against stand-in LLM and search servers")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--backend-dir', help="start server.js from this directory")
+    target.add_argument('--url', help="load an already running backend (started with the printed env)")
+    parser.add_argument('--port', type=int, default=PORT, help="port for the started backend (default: %(default)s)")
+    parser.add_argument('--concurrency', type=_levels, default=[1, 4, 16])
+    parser.add_argument('--duration', type=float, default=30, help="seconds per level (default: %(default)s)")
+    parser.add_argument('--corpus', default=CORPUS, help="queries, JSON lines (default: %(default)s)")
+    parser.add_argument('--chat-type', default='general')
+    parser.add_argument('--llm-latency', type=Latency, default=Latency('lognormal:1200,0.4'))
+    parser.add_argument('--search-latency', type=Latency, default=Latency('lognormal:600,0.8'))
+    parser.add_argument('--llm-errors', type=float, default=0, help="share of LLM calls that fail")
+    parser.add_argument('--search-errors', type=float, default=0, help="share of search requests that fail")
+    parser.add_argument('--llm-host', action='append', default=list(LLM_HOSTS),
+                        help="extra host to treat as the LLM API")
+    parser.add_argument('--allow-cache', action='store_true', help="send queries untagged (cache hits allowed, "
+                                                                   "no phase split)")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--log', default='/tmp/loadtest-backend.log')
+    parser.add_argument('--json', help="also write the report here")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(run(args))
+    except ReloadError as e:
+        print(f"❌ Backend never became healthy: {e} (see {args.log})")
+        sys.exit(1)
+    except OSError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    except KeyboardInterrupt:
+        sys.exit(130)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+"""
+Incremental analyzer for the chat pipeline's PM2 log lines
+
+Since v37.5.0 every chat request leaves a trail in the backend's PM2 out
+log:
+
+    📥 Query from general: "..."                              server.js
+    🔍 Pre-searching sources before LLM call...                ai-service.js
+       (or: ℹ️  Query doesn't need current sources, ...)
+    📚 Found N sources to provide to LLM
+    ✅ Providing N validated sources to LLM
+    🤖 AI Query: "..." (context: X, sources: N)
+    ✅ AI response: "..."
+    🤖 AI response! Response time: Nms                         server.js
+    📚 Sources included: N
+       (or: ✅ Cachehit! / ✅ Database hit! Response time: Nms)
+
+This reads the log files from the byte offset it stopped at last time
+(memory-mapped, so a multi-GB file is never read into memory; one C-level
+regex scan skips every unrelated line), correlates the lines above into
+one record per request, and adds them to hourly buckets kept in a state
+file. The report covers the last --window hours: requests, how often the
+pre-search ran and found anything, and histograms of source counts and
+phase durations.
+
+The lines carry no request id. Lines quoting the query are matched on
+it; the others go to the oldest open request still missing that step,
+which is right as long as requests finish roughly in order. Phase
+durations need PM2 to timestamp the lines (log_date_format, set in
+backend/ecosystem.config.js); without that only the total from the
+"Response time" line is known, and requests are bucketed by the time
+they were read.
+
+Usage:
+    python3 log_analyzer.py                          # ~/.pm2/logs/backend-out*.log
+    python3 log_analyzer.py /var/log/backend-out.log --window 6 --records requests.jsonl
+    python3 log_analyzer.py --follow 30              # re-read the new lines every 30s
+"""
+
+import argparse
+import datetime
+import glob
+import json
+import mmap
+import os
+import re
+import sys
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE = os.path.join(SCRIPT_DIR, 'log-analyzer-state.json')
+LOGS = '~/.pm2/logs/backend-out*.log'
+BUCKET = 3600
+KEEP = 24 * 7           # buckets kept in the state file
+WINDOW = 24
+STALE = 300             # seconds before an unfinished request is given up on
+MAX_OPEN = 64           # ... or this many newer ones, when lines have no time
+
+SOURCE_BINS = (0, 1, 3, 6, 11, 21)                          # lower bounds
+DURATION_BINS = (0, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000)    # ms
+PHASES = ('pre-search', 'LLM', 'total')
+
+_LINE = re.compile(''.join([
+    r'^(?:(?P<ts>\d{4}-\d\d-\d\d[T ]\d\d:\d\d:\d\d(?:\.\d+)?(?:Z|[+-]\d\d:?\d\d)?): )?[ \t]*(?:',
+    r'📥 Query from (?P<chat>[^:\n]*): "(?P<query>[^\n]*)"[ \t]*\r?$',
+    r'|(?P<presearch>🔍 Pre-searching sources)',
+    "|(?P<nosearch>ℹ(?:\ufe0f)?  ?Query doesn't need current sources)",
+    r'|📚 Found (?P<found>\d+) sources to provide',
+    r'|✅ Providing (?P<provided>\d+) validated sources',
+    r'|🤖 AI Query: "(?P<prefix>[^\n]*?)\.\.\." \(context: [^,\n]*, sources: (?P<llm_sources>\d+)\)',
+    r'|(?P<answered>✅ AI response: ")',
+    r'|🤖 AI response! Response time: (?P<ms>\d+)ms',
+    r'|📚 Sources included: (?P<included>\d+)',
+    r'|✅ Cache ?hit! Response time: (?P<cache_ms>\d+)ms',
+    r'|✅ Database hit! Response time: (?P<db_ms>\d+)ms',
+    r')',
+]).encode(), re.MULTILINE)
+
+
+def _timestamp(text):
+    if not text:
+        return None
+    try:
+        return datetime.datetime.fromisoformat(text.decode().replace(' ', 'T', 1)).timestamp()
+    except ValueError:
+        return None
+
+
+# =============================================================================
+# CORRELATION
+# =============================================================================
+
+class Correlator:
+    """Turns one log file's lines into request records. Unfinished
+    requests carry over between runs in .open."""
+
+    def __init__(self, open_records=None):
+        self.open = open_records or []
+        self.done = []
+        self.dropped = 0
+
+    def _first(self, wanted):
+        for record in self.open:
+            if wanted(record):
+                return record
+        return None
+
+    def _finish(self, record):
+        self.open.remove(record)
+        self.done.append(record)
+
+    def _expire(self, now):
+        if now is not None:
+            stale = [r for r in self.open if r['at'] is not None and now - r['at'] > STALE]
+        else:
+            stale = self.open[:-MAX_OPEN] if len(self.open) > MAX_OPEN else []
+        for record in stale:
+            self.open.remove(record)
+            self.dropped += 1
+
+    def line(self, match, read_at):
+        ts = _timestamp(match.group('ts'))
+        kind = match.lastgroup
+        at = ts
+
+        # the Sources included line directly follows its Response time line
+        if kind != 'included':
+            pending = self._first(lambda r: r['outcome'] == 'ai')
+            if pending:
+                self._finish(pending)
+
+        if kind == 'query':
+            self._expire(ts)
+            self.open.append({
+                'at': at, 'read_at': read_at, 'chat': match.group('chat').decode(errors='replace'),
+                'query': match.group('query').decode(errors='replace'),
+                'presearch': None, 'found': None, 'provided': None, 'llm_sources': None,
+                'included': None, 'outcome': None, 'ms': None, 'times': {},
+            })
+            return
+        if kind in ('presearch', 'nosearch'):
+            record = self._first(lambda r: r['presearch'] is None)
+            if record:
+                record['presearch'] = kind == 'presearch'
+                record['times']['presearch'] = at
+        elif kind == 'found':
+            record = self._first(lambda r: r['presearch'] and r['found'] is None)
+            if record:
+                record['found'] = int(match.group('found'))
+                record['times']['found'] = at
+        elif kind == 'provided':
+            record = self._first(lambda r: r['presearch'] is not None and r['provided'] is None)
+            if record:
+                record['provided'] = int(match.group('provided'))
+        elif kind == 'llm_sources':
+            prefix = match.group('prefix').decode(errors='replace')
+            record = (self._first(lambda r: r['llm_sources'] is None and r['query'].startswith(prefix))
+                      or self._first(lambda r: r['llm_sources'] is None))
+            if record:
+                record['llm_sources'] = int(match.group('llm_sources'))
+                record['times']['llm'] = at
+        elif kind == 'answered':
+            record = self._first(lambda r: r['llm_sources'] is not None and 'answered' not in r['times'])
+            if record:
+                record['times']['answered'] = at
+        elif kind == 'ms':
+            record = (self._first(lambda r: 'answered' in r['times'] and r['outcome'] is None)
+                      or self._first(lambda r: r['outcome'] is None))
+            if record:
+                record['outcome'], record['ms'] = 'ai', int(match.group('ms'))
+        elif kind == 'included':
+            record = self._first(lambda r: r['outcome'] == 'ai')
+            if record:
+                record['included'] = int(match.group('included'))
+                self._finish(record)
+        elif kind in ('cache_ms', 'db_ms'):
+            # cache and database answers come straight after the query line
+            record = self._first(lambda r: r['presearch'] is None and r['outcome'] is None)
+            if record:
+                record['outcome'] = 'cache' if kind == 'cache_ms' else 'database'
+                record['ms'] = int(match.group(kind))
+                self._finish(record)
+
+
+def phase_durations(record):
+    """{phase: ms} for what this record's timestamps allow"""
+    times = record['times']
+    durations = {}
+    if times.get('presearch') is not None and times.get('found') is not None:
+        durations['pre-search'] = (times['found'] - times['presearch']) * 1000
+    if times.get('llm') is not None and times.get('answered') is not None:
+        durations['LLM'] = (times['answered'] - times['llm']) * 1000
+    if record['ms'] is not None:
+        durations['total'] = record['ms']
+    return durations
+
+
+# =============================================================================
+# READING
+# =============================================================================
+
+def read_new(path, file_state, read_at=None):
+    """Correlates the complete lines added to path since file_state's
+    offset. Returns (new file state, finished records, dropped count)."""
+    read_at = read_at if read_at is not None else time.time()
+    info = os.stat(path)
+    offset = file_state.get('offset', 0)
+    open_records = file_state.get('open', [])
+    if file_state.get('inode') != info.st_ino or info.st_size < offset:
+        # rotated or flushed: start over on the new file
+        offset, open_records = 0, []
+    correlator = Correlator(open_records)
+    if info.st_size > offset:
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            end = data.rfind(b'\n', offset) + 1     # a partly written last line waits
+            if end > offset:
+                for match in _LINE.finditer(data, offset, end):
+                    correlator.line(match, read_at)
+                offset = end
+    state = {'inode': info.st_ino, 'offset': offset, 'open': correlator.open}
+    return state, correlator.done, correlator.dropped
+
+
+# =============================================================================
+# BUCKETS
+# =============================================================================
+
+def _bin(value, bounds):
+    index = 0
+    for i, bound in enumerate(bounds):
+        if value >= bound:
+            index = i
+    return index
+
+
+def _empty_bucket():
+    return {
+        'requests': 0, 'outcomes': {}, 'presearch': 0, 'skipped': 0, 'presearch_found': 0,
+        'sources': [0] * len(SOURCE_BINS),
+        'phases': {phase: [0] * len(DURATION_BINS) for phase in PHASES},
+    }
+
+
+def add_records(buckets, records, size=BUCKET):
+    for record in records:
+        at = record['at'] if record['at'] is not None else record['read_at']
+        key = str(int(at // size * size))
+        bucket = buckets.setdefault(key, _empty_bucket())
+        bucket['requests'] += 1
+        bucket['outcomes'][record['outcome']] = bucket['outcomes'].get(record['outcome'], 0) + 1
+        if record['presearch'] is True:
+            bucket['presearch'] += 1
+            if record['found']:
+                bucket['presearch_found'] += 1
+        elif record['presearch'] is False:
+            bucket['skipped'] += 1
+        if record['llm_sources'] is not None:
+            bucket['sources'][_bin(record['llm_sources'], SOURCE_BINS)] += 1
+        for phase, ms in phase_durations(record).items():
+            bucket['phases'][phase][_bin(ms, DURATION_BINS)] += 1
+
+
+def prune(buckets, keep=KEEP, size=BUCKET):
+    if buckets:
+        newest = max(int(key) for key in buckets)
+        for key in [key for key in buckets if int(key) <= newest - keep * size]:
+            del buckets[key]
+
+
+def window(buckets, hours, size=BUCKET, now=None):
+    """The buckets of the last hours, oldest first, and their sum"""
+    now = now if now is not None else time.time()
+    start = (now // size - hours + 1) * size
+    chosen = sorted((int(key), bucket) for key, bucket in buckets.items() if int(key) >= start)
+    total = _empty_bucket()
+    for _, bucket in chosen:
+        for field in ('requests', 'presearch', 'skipped', 'presearch_found'):
+            total[field] += bucket[field]
+        for outcome, count in bucket['outcomes'].items():
+            total['outcomes'][outcome] = total['outcomes'].get(outcome, 0) + count
+        total['sources'] = [a + b for a, b in zip(total['sources'], bucket['sources'])]
+        for phase in PHASES:
+            total['phases'][phase] = [a + b for a, b in zip(total['phases'][phase], bucket['phases'][phase])]
+    return chosen, total
+
+
+def median_bin(counts, bounds, unit=''):
+    """Label of the bin holding the median"""
+    total = sum(counts)
+    if not total:
+        return '-'
+    seen = 0
+    for i, count in enumerate(counts):
+        seen += count
+        if seen * 2 >= total:
+            return _label(i, bounds, unit)
+
+
+def _label(i, bounds, unit=''):
+    if unit:
+        if i == 0:
+            return f"<{_ms(bounds[1])}"
+        return f"{_ms(bounds[i])}-{_ms(bounds[i + 1])}" if i + 1 < len(bounds) else f"{_ms(bounds[i])}+"
+    if i + 1 == len(bounds):
+        return f"{bounds[i]}+"
+    high = bounds[i + 1] - 1
+    return str(bounds[i]) if bounds[i] == high else f"{bounds[i]}-{high}"
+
+
+def _ms(value):
+    return f"{value / 1000:g}s" if value >= 1000 else f"{value}ms"
+
+
+# =============================================================================
+# REPORT
+# =============================================================================
+
+def _rate(part, whole):
+    return f"{part / whole:.0%}" if whole else '-'
+
+
+def _histogram(title, counts, bounds, unit=''):
+    total = sum(counts)
+    print(f"\n   {title}")
+    if not total:
+        print("     (none)")
+        return
+    for i, count in enumerate(counts):
+        bar = '█' * round(40 * count / total)
+        print(f"     {_label(i, bounds, unit):>12} {count:>7}  {bar}")
+
+
+def print_report(chosen, total, hours, dropped, open_count):
+    print(f"\n📊 Last {hours}h: {total['requests']} requests"
+          + (f" ({', '.join(f'{n} {o}' for o, n in sorted(total['outcomes'].items()))})" if total['requests'] else ''))
+    searched = total['presearch'] + total['skipped']
+    print(f"   pre-search ran for {_rate(total['presearch'], searched)} of LLM requests, "
+          f"found sources {_rate(total['presearch_found'], total['presearch'])} of the time")
+    if dropped or open_count:
+        print(f"   {open_count} requests still open, {dropped} given up on (never finished)")
+    _histogram("sources given to the LLM", total['sources'], SOURCE_BINS)
+    for phase in PHASES:
+        _histogram(f"{phase} duration", total['phases'][phase], DURATION_BINS, 'ms')
+    if len(chosen) > 1:
+        print(f"\n   {'hour':<17} {'requests':>8} {'pre-search':>10} {'found':>6} {'sources p50':>11} {'total p50':>10}")
+        for start, bucket in chosen:
+            hour = datetime.datetime.fromtimestamp(start).strftime('%Y-%m-%d %H:%M')
+            print(f"   {hour:<17} {bucket['requests']:>8} "
+                  f"{_rate(bucket['presearch'], bucket['presearch'] + bucket['skipped']):>10} "
+                  f"{_rate(bucket['presearch_found'], bucket['presearch']):>6} "
+                  f"{median_bin(bucket['sources'], SOURCE_BINS):>11} "
+                  f"{median_bin(bucket['phases']['total'], DURATION_BINS, 'ms'):>10}")
+
+
+# =============================================================================
+# COMMAND LINE
+# =============================================================================
+
+def load_state(path):
+    if not os.path.exists(path):
+        return {'files': {}, 'buckets': {}, 'dropped': 0}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_state(path, state):
+    temp = path + '.tmp'
+    with open(temp, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(temp, path)
+
+
+def update(state, paths, records_out=None):
+    """Reads every file's new lines into state; returns (records, bytes read)"""
+    finished = []
+    read = 0
+    for path in paths:
+        before = state['files'].get(path, {})
+        file_state, records, dropped = read_new(path, before)
+        read += file_state['offset'] - (before.get('offset', 0) if before.get('inode') == file_state['inode'] else 0)
+        state['files'][path] = file_state
+        state['dropped'] = state.get('dropped', 0) + dropped
+        finished.extend(records)
+    add_records(state['buckets'], finished)
+    prune(state['buckets'])
+    if records_out and finished:
+        with open(records_out, 'a', encoding='utf-8') as f:
+            for record in finished:
+                f.write(json.dumps(dict(record, phases=phase_durations(record))) + '\n')
+    return finished, read
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Correlate and summarize the chat pipeline's PM2 log lines")
+    parser.add_argument('logs', nargs='*', default=[LOGS], help="log files or globs (default: %(default)s)")
+    parser.add_argument('--state', default=STATE, help="offsets and buckets (default: %(default)s)")
+    parser.add_argument('--window', type=int, default=WINDOW, help="hours to report (default: %(default)s)")
+    parser.add_argument('--records', help="append each finished request as a JSON line here")
+    parser.add_argument('--json', action='store_true', help="print the window's totals as JSON")
+    parser.add_argument('--follow', type=float, metavar='SECONDS', help="keep reading new lines")
+    parser.add_argument('--reset', action='store_true', help="forget offsets and buckets, read from the start")
+    args = parser.parse_args()
+
+    paths = sorted({path for pattern in args.logs for path in glob.glob(os.path.expanduser(pattern))})
+    if not paths:
+        print(f"❌ No log files match {' '.join(args.logs)}")
+        sys.exit(1)
+    try:
+        state = {'files': {}, 'buckets': {}, 'dropped': 0} if args.reset else load_state(args.state)
+    except (OSError, ValueError) as e:
+        print(f"❌ {args.state}: {e}")
+        sys.exit(1)
+
+    while True:
+        started = time.monotonic()
+        try:
+            records, read = update(state, paths, args.records)
+            save_state(args.state, state)
+        except OSError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        elapsed = time.monotonic() - started
+        open_count = sum(len(f['open']) for f in state['files'].values())
+        chosen, total = window(state['buckets'], args.window)
+        if args.json:
+            print(json.dumps(dict(total, open=open_count, dropped=state['dropped'])))
+        else:
+            print(f"📖 {len(paths)} files: {read / 1e6:.1f} MB new, {len(records)} requests "
+                  f"in {elapsed:.2f}s")
+            print_report(chosen, total, args.window, state['dropped'], open_count)
+        if not args.follow:
+            break
+        try:
+            time.sleep(args.follow)
+        except KeyboardInterrupt:
+            break
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,533 @@
+#!/usr/bin/env python3
+"""
+Streaming build optimizer for index.html (and the other static pages)
+
+One pass over the page, line by line, that can:
+- strip a section: the element with id="NAME", or everything between
+  <!-- build:section NAME --> and <!-- /build:section -->, wherever the
+  markup has moved to (no more hardcoded line numbers)
+- extract a section into fragments/NAME.html, leaving the empty element
+  behind with a data-fragment attribute; a small loader fetches it when
+  it scrolls near the viewport (or its #NAME is linked to) and fires a
+  `fragmentloaded` event for scripts that set it up
+- minify inline <style> and <script> (JS, JSON-LD) and drop HTML comments
+  and indentation outside <pre>/<textarea>
+- report bytes in/out for every <section>, marker block and inline
+  style or script
+
+Usage:
+    python3 optimize_html.py index.html -o dist/index.html --minify \\
+        --strip civic --extract jobs
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+
+# Tags the pass cares about; anything else is plain markup
+_TAG = re.compile(r'<!--|<(/?)([a-zA-Z][\w-]*)\b((?:"[^"]*"|\'[^\']*\'|[^>"\'])*)>')
+# One attribute at a time, a quoted value as a unit, so id=... inside
+# another attribute's value (title="see id=civic") is never an id
+_ATTRIBUTE = re.compile(r'''([^\s"'>/=]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+)))?''')
+_MARKER = re.compile(r'<!--\s*(/?)build:section\b\s*([\w-]*)\s*-->')
+
+_JS_TYPES = {'', 'text/javascript', 'application/javascript', 'module'}
+_VERBATIM = {'pre', 'textarea'}
+
+FRAGMENT_DIR = 'fragments'
+
+FRAGMENT_LOADER = """<script>
+(function () {
+    function load(el) {
+        if (el.dataset.fragmentLoaded) return;
+        el.dataset.fragmentLoaded = '1';
+        fetch(el.dataset.fragment).then(function (r) { return r.text(); }).then(function (html) {
+            var t = document.createElement('template');
+            t.innerHTML = html;
+            t.content.querySelectorAll('script').forEach(function (old) {
+                var s = document.createElement('script');
+                [].forEach.call(old.attributes, function (a) { s.setAttribute(a.name, a.value); });
+                s.text = old.text;
+                old.replaceWith(s);
+            });
+            el.replaceChildren(t.content);
+            el.dispatchEvent(new CustomEvent('fragmentloaded', { bubbles: true }));
+        });
+    }
+    var els = document.querySelectorAll('[data-fragment]');
+    function byHash() {
+        els.forEach(function (el) { if (location.hash === '#' + el.id) load(el); });
+    }
+    if ('IntersectionObserver' in window) {
+        var io = new IntersectionObserver(function (entries) {
+            entries.forEach(function (e) { if (e.isIntersecting) { io.unobserve(e.target); load(e.target); } });
+        }, { rootMargin: '600px' });
+        els.forEach(function (el) { io.observe(el); });
+    } else {
+        els.forEach(load);
+    }
+    window.addEventListener('hashchange', byHash);
+    byHash();
+})();
+</script>
+"""
+
+
+# =============================================================================
+# MINIFIERS
+# =============================================================================
+
+_JS_TOKEN = re.compile(r"""//[^\n]*|/\*.*?(?:\*/|\Z)|'(?:\\.|[^'\\\n])*'?|"(?:\\.|[^"\\\n])*"?|`|/""", re.S)
+_JS_STRING = {quote: re.compile(quote + r'(?:\\.|[^' + quote + r'\\\n])*' + quote + '?') for quote in '\'"'}
+_JS_REGEX = re.compile(r'/(?:\\.|\[(?:\\.|[^\]\\\n])*\]|[^/\\\n\[])+/[a-z]*')
+# after one of these a '/' starts a regex literal rather than a division
+_REGEX_PRECEDERS = set('(,=:[!&|?{};+-*%<>~^')
+_REGEX_KEYWORDS = re.compile(r'(?:^|[^\w$])(?:return|typeof|case|do|else|in|of|void|yield|await)$')
+
+
+def _collapse(code):
+    # whitespace runs with a newline become one newline (ASI), others one space
+    code = re.sub(r'[ \t]*\n\s*', '\n', code)
+    return re.sub(r'[ \t]+', ' ', code)
+
+
+def _template_end(text, pos):
+    """End of the template literal whose opening backtick is just before
+    pos; ${} expressions are skipped along with their own strings and
+    nested templates."""
+    length = len(text)
+    while pos < length:
+        char = text[pos]
+        if char == '\\':
+            pos += 2
+        elif char == '`':
+            return pos + 1
+        elif text.startswith('${', pos):
+            pos += 2
+            depth = 1
+            while pos < length and depth:
+                char = text[pos]
+                if char in _JS_STRING:
+                    pos = _JS_STRING[char].match(text, pos).end()
+                    continue
+                if char == '`':
+                    pos = _template_end(text, pos + 1)
+                    continue
+                if char == '{':
+                    depth += 1
+                elif char == '}':
+                    depth -= 1
+                pos += 1
+        else:
+            pos += 1
+    return length
+
+
+def _tail(out, size=8):
+    # the last few non-blank characters written so far
+    tail = ''
+    for piece in reversed(out):
+        tail = piece + tail
+        if len(tail.rstrip()) >= size:
+            break
+    return tail.rstrip()[-size:]
+
+
+def minify_js(text):
+    """Drops comments and indentation and collapses whitespace. Strings,
+    template literals and regex literals are kept byte for byte, and one
+    newline is kept wherever there was one, so ASI still works."""
+    out = []
+    pos = 0
+    while True:
+        match = _JS_TOKEN.search(text, pos)
+        if not match:
+            out.append(_collapse(text[pos:]))
+            break
+        out.append(_collapse(text[pos:match.start()]))
+        token = match.group()
+        pos = match.end()
+        if token.startswith('//'):
+            continue
+        if token.startswith('/*'):
+            out.append('\n' if '\n' in token else ' ')
+        elif token == '`':
+            end = _template_end(text, pos)
+            out.append(text[match.start():end])
+            pos = end
+        elif token == '/':
+            before = _tail(out)
+            regex = None
+            if not before or before[-1] in _REGEX_PRECEDERS or _REGEX_KEYWORDS.search(before):
+                regex = _JS_REGEX.match(text, match.start())
+            if regex:
+                out.append(regex.group())
+                pos = regex.end()
+            else:
+                out.append(token)
+        else:
+            out.append(token)
+    return re.sub(r'\n[ \t\n]*', '\n', ''.join(out)).strip()
+
+
+_CSS_TOKEN = re.compile(r"""/\*.*?(?:\*/|\Z)|'(?:\\.|[^'\\\n])*'?|"(?:\\.|[^"\\\n])*"?""", re.S)
+
+
+def _collapse_css(code):
+    code = re.sub(r'\s+', ' ', code)
+    code = re.sub(r' ?([{};,]) ?', r'\1', code)
+    return code.replace(': ', ':').replace(';}', '}')
+
+
+def minify_css(text):
+    """Drops comments and collapses whitespace around { } ; , and after :,
+    keeping strings as they are."""
+    out = []
+    code = []
+    pos = 0
+    for match in _CSS_TOKEN.finditer(text):
+        code.append(text[pos:match.start()])
+        token = match.group()
+        pos = match.end()
+        if token.startswith('/*'):
+            code.append(' ')
+            continue
+        out.append(_collapse_css(''.join(code)))
+        out.append(token)
+        code = []
+    code.append(text[pos:])
+    out.append(_collapse_css(''.join(code)))
+    return ''.join(out).strip()
+
+
+def minify_json(text):
+    try:
+        return json.dumps(json.loads(text), separators=(',', ':'), ensure_ascii=False)
+    except ValueError:
+        return text.strip()
+
+
+# =============================================================================
+# STREAMING PASS
+# =============================================================================
+
+class Section:
+    """One row of the byte report"""
+
+    def __init__(self, name, action):
+        self.name = name
+        self.action = action
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.fragment = 0
+
+
+class _Block:
+    # a stripped or extracted element (tag set) or marker block (tag None)
+    def __init__(self, name, action, tag, sink):
+        self.name = name
+        self.action = action
+        self.tag = tag
+        self.depth = 1
+        self.sink = sink
+
+
+def _attribute(attributes, name):
+    """The first whitespace-separated word of an attribute's value, or
+    None when the tag doesn't have it (or it is empty)"""
+    for match in _ATTRIBUTE.finditer(attributes):
+        if match.group(1).lower() == name:
+            value = next((group for group in match.groups()[1:] if group is not None), '').split()
+            return value[0] if value else None
+    return None
+
+
+def _size(text):
+    return len(text.encode('utf-8'))
+
+
+class _Pass:
+    """The state of one streaming pass over a page"""
+
+    def __init__(self, out, out_dir, strip, extract, minify, fragment_dir, notes):
+        self.out = out
+        self.out_dir = out_dir
+        self.strip = strip
+        self.extract = extract
+        self.minify = minify
+        self.fragment_dir = fragment_dir
+        self.notes = notes
+        self.rows = {}
+        self.fragments = {}
+        self.block = None       # _Block being stripped or extracted
+        self.raw = None         # [tag, type, content, label] of an open <style>/<script>
+        self.comment = None     # True inside a comment being kept, False when dropping it
+        self.section = None     # label of the <section> being passed through
+        self.section_depth = 0
+        self.verbatim = 0       # open <pre>/<textarea>
+        self.head = True
+        self.pending = []       # (text, label) of the current output line
+
+    def row(self, name, action='kept'):
+        if name not in self.rows:
+            self.rows[name] = Section(name, action)
+        return self.rows[name]
+
+    def label(self):
+        if self.block is not None:
+            return self.block.name
+        if self.section:
+            return self.section
+        return 'head' if self.head else 'body (outside sections)'
+
+    def count(self, text, label=None):
+        self.row(label or self.label()).bytes_in += _size(text)
+
+    def emit(self, text, label=None):
+        if not text:
+            return
+        if self.block is None:
+            self.pending.append((text, label or self.label()))
+        elif self.block.sink is not None:
+            self.block.sink.write(text)
+            self.rows[self.block.name].fragment += _size(text)
+
+    def end_line(self):
+        # minification leaves lines that held only indentation or comments
+        pending = self.pending
+        self.pending = []
+        if self.minify and not self.verbatim and not ''.join(text for text, _ in pending).strip():
+            return
+        for text, label in pending:
+            self.out.write(text)
+            self.row(label).bytes_out += _size(text)
+
+    def open_block(self, name, action, tag):
+        sink = None
+        if action == 'extract':
+            os.makedirs(self.fragment_dir, exist_ok=True)
+            path = os.path.join(self.fragment_dir, f'{name}.html')
+            sink = self.fragments[name] = open(path, 'w', encoding='utf-8')
+        self.row(name).action = action
+        self.block = _Block(name, action, tag, sink)
+
+    def close_block(self):
+        block = self.block
+        self.block = None
+        if block.sink is not None:
+            block.sink.close()
+        if block.action == 'strip' and block.name in self.notes:
+            self.emit(f'<!-- {self.notes[block.name]} -->', block.name)
+        return block
+
+    def finish_raw(self):
+        tag, kind, content, label = self.raw
+        self.raw = None
+        text = ''.join(content)
+        if self.minify:
+            if tag == 'style':
+                text = minify_css(text)
+            elif kind in _JS_TYPES:
+                text = minify_js(text)
+            elif kind == 'application/ld+json':
+                text = minify_json(text)
+        self.emit(text, label)
+
+    def feed(self, line, lineno):
+        pos = 0
+        length = len(line)
+        lower = line.lower()
+        if self.minify and self.raw is None and self.comment is None and not self.verbatim:
+            pos = length - len(line.lstrip(' \t'))
+            self.count(line[:pos])
+
+        while pos < length:
+            if self.raw is not None:
+                label = self.raw[3]
+                close = lower.find(f'</{self.raw[0]}', pos)
+                if close < 0:
+                    self.raw[2].append(line[pos:])
+                    self.count(line[pos:], label)
+                    break
+                self.raw[2].append(line[pos:close])
+                self.count(line[pos:close], label)
+                self.finish_raw()
+                pos = close
+                continue
+
+            if self.comment is not None:
+                end = line.find('-->', pos)
+                stop = length if end < 0 else end + 3
+                self.count(line[pos:stop])
+                if self.comment:
+                    self.emit(line[pos:stop])
+                if end >= 0:
+                    self.comment = None
+                pos = stop
+                continue
+
+            match = _TAG.search(line, pos)
+            if not match:
+                self.count(line[pos:])
+                self.emit(line[pos:])
+                break
+            self.count(line[pos:match.start()])
+            self.emit(line[pos:match.start()])
+            pos = match.start()
+            token = match.group()
+
+            if token == '<!--':
+                marker = _MARKER.match(line, pos)
+                if marker:
+                    pos = marker.end()
+                    self.marker(marker, lineno)
+                else:
+                    self.comment = not self.minify or line.startswith('<!--[if', pos)
+                continue
+
+            pos = match.end()
+            self.tag(token, *match.groups(), lineno=lineno)
+        self.end_line()
+
+    def marker(self, marker, lineno):
+        closing, name = marker.groups()
+        self.count(marker.group())
+        if closing and self.block is not None and self.block.tag is None:
+            self.close_block()
+        elif not closing and self.block is None and (name in self.strip or name in self.extract):
+            self.open_block(name, 'strip' if name in self.strip else 'extract', None)
+        elif not self.minify:
+            self.emit(marker.group())
+
+    def tag(self, token, closing, tag, attributes, lineno):
+        tag = tag.lower()
+        block = self.block
+
+        if block is None and not closing:
+            name = _attribute(attributes, 'id')
+            if name in self.strip:
+                self.count(token, name)
+                self.open_block(name, 'strip', tag)
+                return
+            if name in self.extract:
+                self.count(token, name)
+                url = f'{os.path.relpath(self.fragment_dir, self.out_dir)}/{name}.html'
+                self.emit(f'<{tag}{attributes.rstrip()} data-fragment="{url}">', name)
+                self.open_block(name, 'extract', tag)
+                return
+
+        self.count(token)
+        if block is not None and block.tag == tag:
+            if closing:
+                block.depth -= 1
+                if block.depth == 0:
+                    self.close_block()
+                    if block.action == 'extract':
+                        self.emit(token, block.name)
+                    return
+            elif not attributes.rstrip().endswith('/'):
+                block.depth += 1
+
+        if tag == 'body':
+            self.head = False
+            if closing and self.fragments:
+                loader = minify_js(FRAGMENT_LOADER) + '\n' if self.minify else FRAGMENT_LOADER
+                self.row('fragment loader')
+                self.emit(loader, 'fragment loader')
+        elif tag == 'section' and self.block is None:
+            if not closing:
+                if self.section_depth == 0:
+                    ident = _attribute(attributes, 'id') or _attribute(attributes, 'class')
+                    self.section = f'section#{ident}' if ident else f'section@{lineno}'
+                    if self.section in self.rows:
+                        self.section += f'@{lineno}'
+                self.section_depth += 1
+            elif self.section_depth:
+                self.section_depth -= 1
+                if self.section_depth == 0:
+                    self.emit(token)
+                    self.section = None
+                    return
+        elif tag in _VERBATIM:
+            self.verbatim = max(0, self.verbatim + (-1 if closing else 1))
+        self.emit(token)
+
+        if tag in ('style', 'script') and not closing:
+            kind = _attribute(attributes, 'type')
+            label = f'<{tag}>@{lineno}'
+            self.row(label, 'minified' if self.minify else 'kept')
+            self.raw = [tag, kind.lower() if kind else '', [], label]
+
+
+def optimize(src, dst, strip=(), extract=(), minify=False, fragment_dir=None, notes=None):
+    """Streams src to dst (which may be the same file). Returns the report
+    rows (Sections) and the names that were asked for but not found.
+    notes: {name: text} left as an HTML comment where a section was stripped."""
+    out_dir = os.path.dirname(os.path.abspath(dst))
+    fd, temp = tempfile.mkstemp(prefix=f'.{os.path.basename(dst)}.', suffix='.tmp', dir=out_dir)
+    with os.fdopen(fd, 'w', encoding='utf-8') as out:
+        state = _Pass(out, out_dir, set(strip), set(extract), minify,
+                      fragment_dir or os.path.join(out_dir, FRAGMENT_DIR), notes or {})
+        try:
+            with open(src, 'r', encoding='utf-8') as f:
+                for lineno, line in enumerate(f, 1):
+                    state.feed(line, lineno)
+            if state.raw is not None:
+                state.finish_raw()
+                state.end_line()
+        except BaseException:
+            for fragment in state.fragments.values():
+                fragment.close()
+            out.close()
+            os.unlink(temp)
+            raise
+    if os.path.exists(dst):
+        os.chmod(temp, os.stat(dst).st_mode & 0o7777)
+    os.replace(temp, dst)
+    missing = sorted((state.strip | state.extract) - set(state.rows))
+    return list(state.rows.values()), missing
+
+
+def print_report(rows, missing=()):
+    total_in = sum(r.bytes_in for r in rows)
+    total_out = sum(r.bytes_out for r in rows)
+    width = max([len(r.name) for r in rows] + [10])
+    print(f"{'section':<{width}}  {'action':<9} {'in':>10} {'out':>10} {'saved':>10} {'fragment':>10}")
+    for r in rows:
+        if not (r.bytes_in or r.bytes_out or r.fragment):
+            continue
+        fragment = f"{r.fragment:>10,}" if r.action == 'extract' else ''
+        print(f"{r.name:<{width}}  {r.action:<9} {r.bytes_in:>10,} {r.bytes_out:>10,} "
+              f"{r.bytes_in - r.bytes_out:>10,} {fragment}")
+    print(f"{'TOTAL':<{width}}  {'':<9} {total_in:>10,} {total_out:>10,} {total_in - total_out:>10,}")
+    if total_in:
+        print(f"\n📉 First-load HTML: {total_in:,} → {total_out:,} bytes "
+              f"({100 * (total_in - total_out) / total_in:.1f}% smaller)")
+    for name in missing:
+        print(f"⚠️  No section named {name!r} found")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Strip, extract and minify sections of an HTML page in one pass")
+    parser.add_argument('src')
+    parser.add_argument('-o', '--output', help="output file (default: overwrite src)")
+    parser.add_argument('--strip', action='append', default=[], metavar='NAME',
+                        help="remove the element with this id (or build:section marker)")
+    parser.add_argument('--extract', action='append', default=[], metavar='NAME',
+                        help="move the element with this id into a lazily loaded fragment")
+    parser.add_argument('--minify', action='store_true', help="minify inline CSS/JS and drop comments")
+    parser.add_argument('--fragments', help=f"fragment directory (default: {FRAGMENT_DIR}/ next to the output)")
+    args = parser.parse_args()
+
+    rows, missing = optimize(args.src, args.output or args.src, args.strip, args.extract,
+                             args.minify, args.fragments)
+    print_report(rows, missing)
+    if missing:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,390 @@
+"""
+Patch set deployment to several backend checkouts at once
+
+The patch scripts each hardcode one backend root, so staging, canary and
+production used to be patched one at a time. This applies a patch set
+(the PATCH of each script, as apply-patch-set.py does for one file) to a
+list of backend directories through a worker pool:
+
+1. the canary targets first - by default the first one given
+2. if every canary succeeded (and stays healthy for --soak seconds), all
+   the other targets concurrently
+
+Each target is its own transaction: compose in memory, `node --check`,
+one backup in the target's own backup store, one atomic write, one PM2
+reload of that target's app, rolled back if any step fails. A failing
+canary stops the rollout; a failing later target doesn't stop the
+others. The results and step timings of every target are reported at
+the end.
+
+    python3 patch_deploy.py --target /srv/staging/backend:backend-staging:http://127.0.0.1:3002/health \
+                            --target /var/www/workforce-democracy/backend
+    python3 patch_deploy.py --targets deploy-targets.json --workers 4 --soak 60
+
+A --target is DIR[:APP[:HEALTH_URL]]. In deploy-targets.json, as on the
+command line, app and health_url default to backend and :3001:
+
+    [{"dir": "/srv/canary/backend", "app": "backend-canary",
+      "health_url": "http://127.0.0.1:3002/health", "canary": true},
+     {"dir": "/var/www/workforce-democracy/backend"}]
+
+Two targets reloading the same app and health URL would be reloading
+and checking one backend twice, so that's refused unless --no-restart
+is given, which writes the files but leaves PM2 alone (or --dry-run).
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from backup_store import BackupStore
+from patch_engine import APPLIED, PatchError, Source, apply_edits, write_atomic
+from pm2_reload import HEALTH_URL, PM2_APP, ReloadError, reload, wait_for_health
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+TARGET_FILE = 'ai-service.js'
+WORKERS = 4
+
+# The order these were originally run in by hand
+DEFAULT_PATCHES = [
+    'fix-policy-keywords.py',
+    'increase-threshold.py',
+    'enhance-prompting.py',
+    'apply-v37.5.0-citation-fix.py',
+]
+
+# Target outcomes
+PATCHED = 'patched'
+UNCHANGED = 'unchanged'
+VERIFIED = 'verified'
+FAILED = 'failed'
+ROLLED_BACK = 'rolled back'
+SKIPPED = 'skipped'
+
+
+class TransactionError(Exception):
+    """A step failed; the file on disk has not been left half-patched."""
+
+
+def _quiet(level, message):
+    pass
+
+
+# =============================================================================
+# ONE FILE
+# =============================================================================
+
+def load_patch(script):
+    """The PATCH defined by a patch script (file names have dashes, so
+    they're loaded by path rather than imported)"""
+    path = script if os.path.isabs(script) else os.path.join(SCRIPT_DIR, script)
+    name = os.path.splitext(os.path.basename(path))[0].replace('-', '_').replace('.', '_')
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    if not hasattr(module, 'PATCH'):
+        raise TransactionError(f"{script} does not define PATCH")
+    return module.PATCH
+
+
+def compose(text, patches, log=_quiet):
+    """Applies each patch to the previous one's output. Returns the new
+    text; raises TransactionError if any edit or check fails. log(level,
+    message) hears about each patch, level being 'success' or 'warning'."""
+    for patch in patches:
+        if patch.applied(text):
+            log('warning', f"{patch.name}: already applied, skipping")
+            continue
+        try:
+            text, report = apply_edits(Source(text), patch.edits)
+        except PatchError as e:
+            raise TransactionError(f"{patch.name}: {e}")
+        for name, status in report:
+            if status != APPLIED:
+                log('warning', f"{patch.name}: {name}: {status}")
+        failed = patch.failed_checks(text)
+        if failed:
+            raise TransactionError(f"{patch.name}: checks failed: {', '.join(failed)}")
+        log('success', f"{patch.name} ({len(patch.checks)} checks passed)")
+    return text
+
+
+def check_syntax(text, log=_quiet):
+    """node --check on a temporary copy; skipped when node isn't installed"""
+    if shutil.which('node') is None:
+        log('warning', "node not found - skipping syntax check")
+        return
+    fd, temp = tempfile.mkstemp(suffix='.js')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        result = subprocess.run(['node', '--check', temp], capture_output=True, text=True)
+    finally:
+        os.unlink(temp)
+    if result.returncode != 0:
+        raise TransactionError(f"node --check failed:\n{result.stderr.strip()}")
+    log('success', "node --check passed")
+
+
+# =============================================================================
+# ONE TARGET
+# =============================================================================
+
+class Target:
+    """A backend checkout to patch, and what happened to it"""
+
+    def __init__(self, directory, app=PM2_APP, health_url=HEALTH_URL, canary=False, file=TARGET_FILE):
+        self.directory = directory
+        self.app = app
+        self.health_url = health_url
+        self.canary = canary
+        self.path = os.path.join(directory, file)
+        self.status = None
+        self.error = None
+        self.backup = None
+        self.timings = {}       # step -> seconds
+        self.log = []           # (level, message)
+
+    def note(self, level, message):
+        self.log.append((level, message))
+
+    def timed(self, step, function, *args):
+        started = time.monotonic()
+        try:
+            return function(*args)
+        finally:
+            self.timings[step] = self.timings.get(step, 0) + time.monotonic() - started
+
+    @property
+    def elapsed(self):
+        return sum(self.timings.values())
+
+
+def deploy_target(target, patches, dry_run=False, restart=True):
+    """Runs the patch transaction on one target, recording its status,
+    timings and log on it. Returns the target; failures (including a
+    rollback that couldn't restore the file) are recorded, not raised."""
+    try:
+        with open(target.path, 'r', encoding='utf-8') as f:
+            original = f.read()
+        updated = target.timed('compose', compose, original, patches, target.note)
+        if updated == original:
+            target.status = UNCHANGED
+            return target
+        target.timed('check', check_syntax, updated, target.note)
+    except (TransactionError, OSError) as e:
+        target.status, target.error = FAILED, str(e)
+        return target
+    if dry_run:
+        target.status = VERIFIED
+        return target
+
+    store = BackupStore.for_file(target.path)
+    try:
+        target.backup = target.timed('write', _backup_and_write, store, target, updated)
+    except OSError as e:
+        target.status, target.error = FAILED, str(e)
+        return target
+    try:
+        if restart:
+            data = target.timed('reload', reload, target.app, os.path.join(target.directory, 'ecosystem.config.js'),
+                                target.health_url)
+            target.note('success', f"{target.app} healthy" + (f" (pid {data['pid']})" if data.get('pid') else ''))
+    except (ReloadError, OSError) as e:
+        target.error = str(e)
+        target.status = ROLLED_BACK
+        try:
+            target.timed('rollback', _rollback, store, target, restart)
+        except OSError as rollback_error:
+            target.status = FAILED
+            target.error += f"; rollback failed, {target.path} still has the new code: {rollback_error}"
+        return target
+    target.status = PATCHED
+    return target
+
+
+def _backup_and_write(store, target, updated):
+    backup = store.backup(target.path, 'pre-patch-set')
+    target.note('success', f"Backup created: {backup['hash'][:12]} in {store.root}")
+    write_atomic(target.path, updated)
+    target.note('success', f"{target.path} updated")
+    return backup
+
+
+def _rollback(store, target, restart):
+    store.restore(target.path, target.backup['hash'])
+    target.note('warning', f"Restored {target.path} from backup {target.backup['hash'][:12]}")
+    if restart:
+        try:
+            reload(target.app, os.path.join(target.directory, 'ecosystem.config.js'), target.health_url)
+            target.note('warning', "Backend reloaded on the previous code")
+        except (ReloadError, OSError) as e:
+            target.note('error', f"Reload after rollback failed too: {e}")
+
+
+# =============================================================================
+# ALL TARGETS
+# =============================================================================
+
+def deploy(targets, patches, workers=WORKERS, dry_run=False, restart=True, soak=0, on_done=None):
+    """Canary targets first, then the rest, each batch through a pool of
+    workers. The rest are skipped when a canary fails or doesn't stay
+    healthy for soak seconds. on_done(target) is called (one at a time)
+    as each target finishes. Returns the targets."""
+    lock = threading.Lock()
+
+    def run(target):
+        deploy_target(target, patches, dry_run, restart)
+        if on_done:
+            with lock:
+                on_done(target)
+        return target
+
+    canaries = [target for target in targets if target.canary]
+    rest = [target for target in targets if not target.canary]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        list(pool.map(run, canaries))
+        if any(target.status in (FAILED, ROLLED_BACK) for target in canaries):
+            for target in rest:
+                target.status, target.error = SKIPPED, "a canary failed"
+            return targets
+        if soak and restart and not dry_run:
+            for target in canaries:
+                try:
+                    _soak(target, soak)
+                except ReloadError as e:
+                    target.status, target.error = FAILED, f"unhealthy during soak: {e}"
+                    for other in rest:
+                        other.status, other.error = SKIPPED, "a canary failed its soak"
+                    return targets
+        list(pool.map(run, rest))
+    return targets
+
+
+def _soak(target, seconds, interval=5):
+    """Keeps polling the canary's health for seconds; ReloadError as soon
+    as it stops answering"""
+    stop = time.monotonic() + seconds
+    while time.monotonic() < stop:
+        wait_for_health(target.health_url, deadline=interval)
+        time.sleep(min(interval, max(0, stop - time.monotonic())))
+
+
+def parse_target(text, file=TARGET_FILE):
+    """A Target from DIR[:APP[:HEALTH_URL]]"""
+    directory, _, rest = text.partition(':')
+    app, _, health_url = rest.partition(':')
+    return Target(directory.rstrip('/'), app or PM2_APP, health_url or HEALTH_URL, file=file)
+
+
+def shared_backends(targets):
+    """[(app, health_url)] given to more than one target"""
+    seen = set()
+    shared = []
+    for target in targets:
+        key = (target.app, target.health_url)
+        if key in seen and key not in shared:
+            shared.append(key)
+        seen.add(key)
+    return shared
+
+
+def load_targets(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        entries = json.load(f)
+    return [Target(entry['dir'], entry.get('app', PM2_APP), entry.get('health_url', HEALTH_URL),
+                   entry.get('canary', False), entry.get('file', TARGET_FILE)) for entry in entries]
+
+
+# =============================================================================
+# COMMAND LINE
+# =============================================================================
+
+_ICONS = {'success': '✅', 'warning': '⚠️ ', 'error': '❌'}
+_STATUS_ICONS = {PATCHED: '✅', UNCHANGED: '➖', VERIFIED: '🔍', FAILED: '❌', ROLLED_BACK: '↩️ ', SKIPPED: '⏭️ '}
+
+
+def print_target(target):
+    role = ' (canary)' if target.canary else ''
+    print(f"{_STATUS_ICONS[target.status]} {target.directory}{role}: {target.status} in {target.elapsed:.2f}s")
+    for level, message in target.log:
+        print(f"     {_ICONS[level]} {message}")
+    if target.error:
+        print(f"     ❌ {target.error}")
+
+
+def print_summary(targets):
+    steps = ['compose', 'check', 'write', 'reload', 'rollback']
+    shown = [step for step in steps if any(step in target.timings for target in targets)]
+    print(f"\n{'target':<44} {'status':<12}" + ''.join(f"{step:>9}" for step in shown) + f"{'total':>9}")
+    for target in targets:
+        name = target.directory if len(target.directory) <= 43 else '…' + target.directory[-42:]
+        cells = ''.join(f"{target.timings[step]:>8.2f}s" if step in target.timings else f"{'-':>9}"
+                        for step in shown)
+        print(f"{name:<44} {target.status:<12}{cells}{target.elapsed:>8.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply a patch set to several backend checkouts")
+    parser.add_argument('patches', nargs='*', default=DEFAULT_PATCHES,
+                        help="patch scripts to apply, in order (default: all four)")
+    parser.add_argument('--target', action='append', default=[], metavar='DIR[:APP[:HEALTH_URL]]',
+                        help="backend directory, with its PM2 app and health URL (repeatable)")
+    parser.add_argument('--targets', metavar='JSON', help="targets file with per-target app/health_url/canary")
+    parser.add_argument('--file', default=TARGET_FILE, help="file to patch in each directory (default: %(default)s)")
+    parser.add_argument('--canary', type=int, default=None,
+                        help="deploy the first N targets first (default: 1, or the targets file's canary flags)")
+    parser.add_argument('--soak', type=float, default=0, help="seconds the canaries must stay healthy")
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    parser.add_argument('--dry-run', action='store_true', help="verify only, don't write or restart")
+    parser.add_argument('--no-restart', action='store_true', help="write the files but don't reload PM2")
+    args = parser.parse_args()
+
+    targets = load_targets(args.targets) if args.targets else []
+    targets += [parse_target(text, args.file) for text in args.target]
+    if not targets:
+        parser.error("give at least one --target or a --targets file")
+    if not (args.no_restart or args.dry_run):
+        for app, health_url in shared_backends(targets):
+            parser.error(f"more than one target reloads {app} at {health_url}: give each its own "
+                         f"DIR:APP:HEALTH_URL, or use --no-restart")
+    if args.canary is not None or not any(target.canary for target in targets):
+        count = 1 if args.canary is None else args.canary
+        for i, target in enumerate(targets):
+            target.canary = i < count and len(targets) > 1
+
+    try:
+        patches = [load_patch(script) for script in args.patches]
+    except TransactionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    canaries = sum(target.canary for target in targets)
+    print(f"🚀 {len(patches)} patches -> {len(targets)} targets"
+          + (f" ({canaries} canary first)" if canaries else '') + f", {args.workers} workers\n")
+    started = time.monotonic()
+    deploy(targets, patches, args.workers, args.dry_run, not args.no_restart, args.soak, print_target)
+    for target in targets:
+        if target.status == SKIPPED:
+            print_target(target)
+    print_summary(targets)
+    print(f"\n⏱️  {time.monotonic() - started:.2f}s wall clock, "
+          f"{sum(target.elapsed for target in targets):.2f}s of target work")
+
+    failed = [target for target in targets if target.status in (FAILED, ROLLED_BACK, SKIPPED)]
+    if failed:
+        print(f"❌ {len(failed)} of {len(targets)} targets not patched")
+        sys.exit(1)
+    print(f"✅ All {len(targets)} targets done")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,472 @@
+"""
+Shared patch engine for the backend's JavaScript files (ai-service.js etc.)
+
+Reads a file once and indexes it:
+- top-level functions (function declarations and const/let/var arrow or
+  function expressions) to their line spans, found with one tokenizing
+  pass that skips strings, template literals, comments and regex literals
+- anchor strings (or compiled regexes) to every line they occur on,
+  built the first time an edit asks for them
+
+Edits are declarative and are all resolved against the original line
+numbers, so one edit never shifts the lines another edit was aimed at.
+They are then applied in a single pass and written once:
+
+    from patch_engine import InsertAfter, ReplaceLine, patch_file
+
+    patch_file('ai-service.js', [
+        ReplaceLine('signature', 'function buildContextualPrompt(query, context, chatType) {',
+                    'function buildContextualPrompt(query, context, chatType, preFetchedSources = []) {'),
+        InsertAfter('marker', '*/', "console.log('AI-SERVICE.JS LOADED');"),
+    ])
+"""
+
+import abc
+import bisect
+import os
+import re
+import tempfile
+
+
+class PatchError(Exception):
+    """An edit could not be resolved, or two edits touch the same lines."""
+
+
+# =============================================================================
+# SOURCE INDEX
+# =============================================================================
+
+# Code-mode tokens the function indexer cares about; everything between
+# them is skipped by the regex engine rather than char by char in Python
+_TOKEN = re.compile(r"""//[^\n]*|/\*.*?(?:\*/|\Z)|'(?:\\.|[^'\\\n])*'?|"(?:\\.|[^"\\\n])*"?|[`{}/]""", re.S)
+_TEMPLATE = re.compile(r'(?:\\.|[^`\\$]|\$(?!\{))*(`|\$\{|\Z)', re.S)
+_REGEX = re.compile(r'/(?:\\.|\[(?:\\.|[^\]\\\n])*\]|[^/\\\n\[])+/[a-z]*')
+# after one of these a '/' starts a regex literal rather than a division
+_REGEX_PRECEDERS = set('(,=:[!&|?{};+-*%<>~^')
+_REGEX_KEYWORDS = re.compile(r'(?:^|[^\w$])(?:return|typeof|case|do|else|in|of|void|yield|await)$')
+
+_FUNCTION = re.compile(
+    r'^(?:export\s+)?(?:async\s+)?function\s*\*?\s*([\w$]+)\s*(?=\()'
+    r'|^(?:export\s+)?(?:const|let|var)\s+([\w$]+)\s*=\s*(?:async\s+)?(?:function\b[^(]*(?=\()|(?=\()|[\w$]+\s*(?==>))',
+    re.M)
+_ARROW = re.compile(r'\s*(?:=>\s*)?')
+
+
+def _top_level_blocks(text):
+    """(open, close) offsets of every brace block at depth 0, and the spans
+    of strings, template literals and comments outside of any block."""
+    blocks = []
+    ignored = []
+    # one entry per open brace: True when it opened a template's ${
+    braces = []
+    pos = 0
+    length = len(text)
+    while pos < length:
+        match = _TOKEN.search(text, pos)
+        if not match:
+            break
+        token = match.group()
+        start = match.start()
+        pos = match.end()
+
+        if token == '{':
+            braces.append(False)
+            if len(braces) == 1:
+                open_at = start
+        elif token == '}':
+            if not braces:
+                continue
+            if braces.pop():
+                # back inside the template literal the ${ belonged to
+                pos = _skip_template(text, pos, braces)
+            elif not braces:
+                blocks.append((open_at, start))
+        elif token == '`':
+            pos = _skip_template(text, pos, braces)
+            if not braces:
+                ignored.append((start, pos))
+        elif token == '/':
+            before = start - 1
+            while before >= 0 and text[before] in ' \t\r\n':
+                before -= 1
+            if (before < 0 or text[before] in _REGEX_PRECEDERS
+                    or _REGEX_KEYWORDS.search(text, max(0, before - 7), before + 1)):
+                regex = _REGEX.match(text, start)
+                if regex:
+                    pos = regex.end()
+        elif not braces:
+            ignored.append((start, pos))
+    return blocks, ignored
+
+
+def _skip_template(text, pos, braces):
+    # from inside a template literal to its closing backtick, or into the
+    # code of a ${ which is then tracked as a brace of its own
+    match = _TEMPLATE.match(text, pos)
+    if match.group(1) == '${':
+        braces.append(True)
+    return match.end()
+
+
+def _body_start(text, pos):
+    # from the parameter list (or a lone arrow parameter's =>) to where
+    # the function's opening brace should be
+    if text.startswith('(', pos):
+        depth = 0
+        while pos < len(text):
+            char = text[pos]
+            pos += 1
+            if char == '(':
+                depth += 1
+            elif char == ')':
+                depth -= 1
+                if not depth:
+                    break
+    return _ARROW.match(text, pos).end()
+
+
+class Source:
+    """A file's text split into lines, with its function and anchor index."""
+
+    def __init__(self, text):
+        self.text = text
+        self.lines = text.splitlines(keepends=True)
+        self.offsets = [0]
+        for line in self.lines:
+            self.offsets.append(self.offsets[-1] + len(line))
+        self._anchors = {}
+        self.functions = self._index_functions()
+
+    @classmethod
+    def read(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(f.read())
+
+    def line_of(self, offset):
+        return bisect.bisect_right(self.offsets, offset) - 1
+
+    def _index_functions(self):
+        blocks, ignored = _top_level_blocks(self.text)
+        opens = [start for start, _ in blocks]
+        ignored_starts = [start for start, _ in ignored]
+        functions = {}
+        for match in _FUNCTION.finditer(self.text):
+            start = match.start()
+            # skip matches inside a block, a comment or a template literal
+            i = bisect.bisect_right(opens, start) - 1
+            if i >= 0 and blocks[i][1] > start:
+                continue
+            j = bisect.bisect_right(ignored_starts, start) - 1
+            if j >= 0 and ignored[j][1] > start:
+                continue
+            body = _body_start(self.text, match.end())
+            k = bisect.bisect_left(opens, body)
+            if k == len(blocks) or opens[k] != body:
+                # an arrow function without a block body
+                continue
+            name = match.group(1) or match.group(2)
+            functions.setdefault(name, (self.line_of(start), self.line_of(blocks[k][1]) + 1))
+        return functions
+
+    def function(self, name):
+        """(first line, line after the closing brace) of a top-level function."""
+        try:
+            return self.functions[name]
+        except KeyError:
+            raise PatchError(f"function {name}() not found") from None
+
+    def occurrences(self, anchor):
+        """Every line an anchor string, or compiled regex, occurs on."""
+        lines = self._anchors.get(anchor)
+        if lines is None:
+            lines = []
+            if isinstance(anchor, str):
+                offset = self.text.find(anchor)
+                while offset != -1:
+                    line = self.line_of(offset)
+                    lines.append(line)
+                    # one entry per line is enough: continue on the next one
+                    offset = self.text.find(anchor, self.offsets[line + 1])
+            else:
+                for match in anchor.finditer(self.text):
+                    line = self.line_of(match.start())
+                    if not lines or lines[-1] != line:
+                        lines.append(line)
+            self._anchors[anchor] = lines
+        return lines
+
+    def find(self, anchor, start=0, end=None):
+        """First line in [start, end) holding anchor, or None."""
+        lines = self.occurrences(anchor)
+        i = bisect.bisect_left(lines, start)
+        if i < len(lines) and (end is None or lines[i] < end):
+            return lines[i]
+        return None
+
+    def contains(self, text, start=0, end=None):
+        end = len(self.lines) if end is None else end
+        return self.find(text, start, end) is not None
+
+
+# =============================================================================
+# EDITS
+# =============================================================================
+
+def _as_lines(lines):
+    if isinstance(lines, str):
+        lines = lines.split('\n')
+    return [line if line.endswith('\n') else line + '\n' for line in lines]
+
+
+class Edit(abc.ABC):
+    """Base edit: finds its anchor line inside an optional function, after
+    an optional preceding anchor, then shifted by offset lines.
+
+    window: the anchor must be within this many lines of the preceding
+            anchor's line (or of the start of the scope)
+    unless: skip the edit when this text is already in scope (idempotency)
+    required: fail the whole patch when the anchor is missing
+    """
+
+    def __init__(self, name, anchor, within=None, after=None, offset=0, window=None, unless=None,
+                 required=True):
+        self.name = name
+        self.anchor = anchor
+        self.within = within
+        self.after = after
+        self.offset = offset
+        self.window = window
+        self.unless = unless
+        self.required = required
+
+    def scope(self, source):
+        if self.within is None:
+            return 0, len(source.lines)
+        return source.function(self.within)
+
+    def locate(self, source):
+        """The anchor's line (before offset), or None."""
+        start, end = self.scope(source)
+        base = start
+        if self.after is not None:
+            after = source.find(self.after, start, end)
+            if after is None:
+                return None
+            base, start = after, after + 1
+        if self.window is not None:
+            end = min(end, base + self.window)
+        return source.find(self.anchor, start, end)
+
+    def resolve(self, source):
+        """[(start, end, new lines)] over the original lines, [] to skip,
+        None when the anchor isn't there."""
+        if self.unless is not None and source.contains(self.unless, *self.scope(source)):
+            return []
+        located = self.locate(source)
+        if located is None:
+            return None
+        return self.operations(source, located)
+
+    @abc.abstractmethod
+    def operations(self, source, line):
+        """[(start, end, new lines)] for the anchor found at line."""
+
+
+class InsertBefore(Edit):
+    def __init__(self, name, anchor, lines, **options):
+        super().__init__(name, anchor, **options)
+        self.lines = _as_lines(lines)
+
+    def operations(self, source, line):
+        line += self.offset
+        return [(line, line, self.lines)]
+
+
+class InsertAfter(InsertBefore):
+    def operations(self, source, line):
+        line += self.offset + 1
+        return [(line, line, self.lines)]
+
+
+class ReplaceLine(InsertBefore):
+    def operations(self, source, line):
+        line += self.offset
+        return [(line, line + 1, self.lines)]
+
+
+class ReplaceText(Edit):
+    """Replaces old (the anchor itself by default) on the anchor's line."""
+
+    def __init__(self, name, anchor, new, old=None, **options):
+        super().__init__(name, anchor, **options)
+        self.new = new
+        self.old = anchor if old is None else old
+
+    def operations(self, source, line):
+        line += self.offset
+        return [(line, line + 1, [source.lines[line].replace(self.old, self.new, 1)])]
+
+
+class ReplaceBetween(InsertBefore):
+    """Replaces the lines from offset lines after the anchor's line up to,
+    not including, the first line holding end that follows the anchor
+    (within limit lines of it, when given)."""
+
+    def __init__(self, name, anchor, end, lines, limit=None, **options):
+        super().__init__(name, anchor, lines, **options)
+        self.end = end
+        self.limit = limit
+
+    def operations(self, source, line):
+        stop = None if self.limit is None else line + 1 + self.limit
+        end = source.find(self.end, line + 1, stop)
+        if end is None:
+            raise PatchError(f"{self.name}: {self.end!r} not found after line {line + 1}")
+        return [(line + 1 + self.offset, end, self.lines)]
+
+
+class ReplaceFunction(Edit):
+    """Replaces a whole top-level function with new text."""
+
+    def __init__(self, name, function, text, **options):
+        super().__init__(name, None, within=function, **options)
+        self.text = text
+
+    def locate(self, source):
+        if self.within not in source.functions:
+            return None
+        return source.function(self.within)
+
+    def operations(self, source, span):
+        return [(span[0], span[1], _as_lines(self.text))]
+
+
+class Substitute(Edit):
+    """re.sub over the text of a function (or the whole file), for changes
+    that don't line up with whole lines. Fails when nothing matches."""
+
+    def __init__(self, name, pattern, repl, count=0, flags=0, **options):
+        super().__init__(name, None, **options)
+        self.pattern = re.compile(pattern, flags) if isinstance(pattern, str) else pattern
+        self.repl = repl
+        self.count = count
+
+    def locate(self, source):
+        if self.within is not None and self.within not in source.functions:
+            return None
+        start, end = self.scope(source)
+        text = ''.join(source.lines[start:end])
+        text, count = self.pattern.subn(self.repl, text, count=self.count)
+        if not count:
+            return None
+        return start, end, text
+
+    def operations(self, source, located):
+        start, end, text = located
+        return [(start, end, text.splitlines(keepends=True))]
+
+
+# =============================================================================
+# APPLYING
+# =============================================================================
+
+APPLIED = 'applied'
+SKIPPED = 'skipped'
+MISSING = 'missing'
+
+
+def apply_edits(source, edits):
+    """New text and [(edit name, status)] for edits applied to a Source.
+
+    Raises PatchError, before anything is produced, when a required anchor
+    is missing or when two edits overlap.
+    """
+    report = []
+    operations = []
+    missing = []
+    for order, edit in enumerate(edits):
+        result = edit.resolve(source)
+        if result is None:
+            report.append((edit.name, MISSING))
+            if edit.required:
+                missing.append(edit.name)
+        elif not result:
+            report.append((edit.name, SKIPPED))
+        else:
+            report.append((edit.name, APPLIED))
+            for start, end, lines in result:
+                operations.append((start, end, order, edit.name, lines))
+    if missing:
+        raise PatchError(f"anchor not found for: {', '.join(missing)}")
+
+    # inserts at a line sort before a replacement starting there, and
+    # edits at the same place keep the order they were given in
+    operations.sort(key=lambda operation: operation[:3])
+    for previous, operation in zip(operations, operations[1:]):
+        if operation[0] < previous[1]:
+            raise PatchError(f"edits {previous[3]!r} and {operation[3]!r} overlap "
+                             f"at line {operation[0] + 1}")
+
+    output = []
+    pos = 0
+    for start, end, _, _, lines in operations:
+        output.extend(source.lines[pos:start])
+        if output and not output[-1].endswith('\n'):
+            output[-1] += '\n'
+        output.extend(lines)
+        pos = max(pos, end)
+    output.extend(source.lines[pos:])
+    return ''.join(output), report
+
+
+def write_atomic(path, text):
+    """Writes text (or bytes) to a temporary file next to path and renames
+    it over path, so readers see either the old file or the new one."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp = tempfile.mkstemp(prefix=f'.{os.path.basename(path)}.', suffix='.tmp', dir=directory)
+    try:
+        with (os.fdopen(fd, 'wb') if isinstance(text, bytes) else os.fdopen(fd, 'w', encoding='utf-8')) as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            os.chmod(temp, os.stat(path).st_mode & 0o7777)
+        os.replace(temp, path)
+    except BaseException:
+        if os.path.exists(temp):
+            os.unlink(temp)
+        raise
+
+
+def patch_file(path, edits, write=True):
+    """Reads path once, applies every edit and writes it back once.
+
+    Returns (new text, report). Nothing is written when an edit fails or
+    when the text didn't change.
+    """
+    source = Source.read(path)
+    text, report = apply_edits(source, edits)
+    if write and text != source.text:
+        write_atomic(path, text)
+    return text, report
+
+
+# =============================================================================
+# PATCH SETS
+# =============================================================================
+
+class Patch:
+    """One deployable change: its edits and the (description, text) checks
+    the patched file must pass. A file that already passes every check
+    counts as patched."""
+
+    def __init__(self, name, edits, checks=()):
+        self.name = name
+        self.edits = edits
+        self.checks = list(checks)
+
+    def failed_checks(self, text):
+        return [name for name, expected in self.checks if expected not in text]
+
+    def applied(self, text):
+        return bool(self.checks) and not self.failed_checks(text)
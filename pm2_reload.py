@@ -0,0 +1,181 @@
+"""
+Zero-downtime PM2 reload for the deploy scripts
+
+Instead of `pm2 stop` / `pm2 delete` / `pm2 start` followed by a sleep,
+reload() runs `pm2 startOrReload ecosystem.config.js --only backend`.
+Under the cluster setup in ecosystem.config.js, PM2 starts each new
+worker before it stops the old one. reload() then polls the backend's
+/health endpoint until it answers from one of the NEW worker pids (the
+endpoint reports process.pid), or the deadline passes.
+
+startOrReload doesn't change the exec_mode of an app PM2 is already
+running: a backend first started in fork mode keeps being stopped before
+its replacement starts, whatever ecosystem.config.js says. reload()
+checks `pm2 jlist` and refuses such an app; switch it over once with
+
+    pm2 delete backend && pm2 start ecosystem.config.js --only backend && pm2 save
+
+    from pm2_reload import ReloadError, reload
+
+    try:
+        reload(ecosystem='/var/www/workforce-democracy/backend/ecosystem.config.js')
+    except ReloadError as e:
+        ...  # roll back
+
+The health polling can be tried against any stand-in HTTP server, e.g.
+`python3 -m http.server 8000` in a directory with a `health` file:
+
+    python3 pm2_reload.py --poll-only --url http://127.0.0.1:8000/health
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+PM2_APP = 'backend'
+HEALTH_URL = 'http://127.0.0.1:3001/health'
+DEADLINE = 30
+INTERVAL = 0.5
+EXEC_MODE = 'cluster_mode'      # as pm2 jlist reports ecosystem.config.js's exec_mode: 'cluster'
+
+
+class ReloadError(Exception):
+    """The reload failed, or the new workers never answered in time."""
+
+
+def _pm2_processes(app):
+    """The app's entries in `pm2 jlist`; None when PM2 can't be asked"""
+    try:
+        result = subprocess.run(['pm2', 'jlist'], capture_output=True, text=True)
+    except OSError:
+        return None
+    if result.returncode != 0:
+        return None
+    try:
+        processes = json.loads(result.stdout)
+    except ValueError:
+        return None
+    return [process for process in processes if process.get('name') == app]
+
+
+def pm2_pids(app=PM2_APP):
+    """pids of the app's online PM2 workers; None when PM2 can't be asked"""
+    processes = _pm2_processes(app)
+    if processes is None:
+        return None
+    return {process['pid'] for process in processes
+            if process.get('pid') and process.get('pm2_env', {}).get('status') == 'online'}
+
+
+def pm2_exec_modes(app=PM2_APP):
+    """exec_modes the app is running in (empty when it isn't running);
+    None when PM2 can't be asked"""
+    processes = _pm2_processes(app)
+    if processes is None:
+        return None
+    return {process.get('pm2_env', {}).get('exec_mode') for process in processes}
+
+
+def check_health(url, timeout=2):
+    """The health endpoint's JSON body if it answered 200 with status ok
+    (or with a body that isn't JSON), else None"""
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            if response.status != 200:
+                return None
+            body = response.read()
+    except (urllib.error.URLError, OSError):
+        return None
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    if data.get('status', 'ok') != 'ok':
+        return None
+    return data
+
+
+def wait_for_health(url=HEALTH_URL, deadline=DEADLINE, interval=INTERVAL, pids=None):
+    """Polls url until it is healthy - and, when pids is given, answered
+    by one of them (an answer without a pid doesn't count). Returns the
+    body and raises ReloadError once deadline seconds have passed."""
+    stop = time.monotonic() + deadline
+    last = None
+    while True:
+        data = check_health(url)
+        if data is not None:
+            pid = data.get('pid')
+            if not pids or pid in pids:
+                return data
+            last = "answered without a pid" if pid is None else f"still answered by old pid {pid}"
+        else:
+            last = "no healthy answer"
+        if time.monotonic() >= stop:
+            raise ReloadError(f"{url}: {last} after {deadline:.1f}s")
+        time.sleep(interval)
+
+
+def reload(app=PM2_APP, ecosystem='ecosystem.config.js', url=HEALTH_URL, deadline=DEADLINE,
+           interval=INTERVAL):
+    """Gracefully reloads app and waits until its new workers pass the
+    health check. Returns the health body, raises ReloadError - also,
+    before touching it, when app is running in another exec_mode than
+    cluster (see the module docstring)."""
+    started = time.monotonic()
+    modes = pm2_exec_modes(app)
+    if modes and modes != {EXEC_MODE}:
+        running = ', '.join(sorted(str(mode) for mode in modes))
+        raise ReloadError(f"{app} is running in {running}, and a reload won't switch it to {EXEC_MODE} "
+                          f"(no zero-downtime reload); restart it from the ecosystem file once: "
+                          f"pm2 delete {app} && pm2 start {ecosystem} --only {app} && pm2 save")
+    old = pm2_pids(app) or set()
+    try:
+        result = subprocess.run(['pm2', 'startOrReload', ecosystem, '--only', app, '--update-env'],
+                                capture_output=True, text=True,
+                                timeout=max(0.1, deadline - (time.monotonic() - started)))
+    except subprocess.TimeoutExpired:
+        raise ReloadError(f"pm2 reload of {app} didn't finish within {deadline:.1f}s")
+    except OSError as e:
+        raise ReloadError(f"could not run pm2: {e}")
+    if result.returncode != 0:
+        raise ReloadError(f"pm2 reload failed:\n{(result.stderr or result.stdout).strip()}")
+    # PM2 reports the new workers once they're listening
+    new = pm2_pids(app)
+    if new is not None:
+        new -= old
+        if not new:
+            raise ReloadError(f"pm2 reload left no new online worker for {app}")
+    remaining = max(0, deadline - (time.monotonic() - started))
+    return wait_for_health(url, remaining, interval, new)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reload the PM2 backend and wait until it is healthy")
+    parser.add_argument('--app', default=PM2_APP)
+    parser.add_argument('--ecosystem', default='ecosystem.config.js')
+    parser.add_argument('--url', default=HEALTH_URL)
+    parser.add_argument('--deadline', type=float, default=DEADLINE, help="seconds (default: %(default)s)")
+    parser.add_argument('--poll-only', action='store_true', help="only wait for the health check")
+    args = parser.parse_args()
+
+    started = time.monotonic()
+    try:
+        if args.poll_only:
+            data = wait_for_health(args.url, args.deadline)
+        else:
+            data = reload(args.app, args.ecosystem, args.url, args.deadline)
+    except ReloadError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    pid = f" (pid {data['pid']})" if data.get('pid') else ''
+    print(f"✅ Healthy{pid} after {time.monotonic() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
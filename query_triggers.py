@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""
+Trigger-rate and precision report for needsCurrentInfo()
+
+needsCurrentInfo() in ai-service.js decides whether a chat message pays
+for the multi-second searchAdditionalSources pre-search. Its clauses are
+bare substring matches, so "said" triggers `aid`, "know" triggers `now`
+and "pollution" triggers `poll`. This tool pulls the clauses straight out
+of the function (with fix-policy-keywords.py's isPolicyQuery added in
+memory when the file doesn't have it yet), replays a labelled corpus
+through them and reports, per clause and per keyword:
+
+- how often it fires, and how often it is the ONLY clause that fires
+- its precision: the share of its hits labelled as needing a search
+
+It then proposes a word-boundary version of every keyword (the tightest
+of `\\bkw\\b`, `\\bkw(?:s|es)?\\b` and `\\bkw` that still catches every
+labelled hit it caught before) and replays the corpus through the
+proposal. A labelled query the current rules only catch by accident -
+`cut` inside "executive" - doesn't keep a keyword a bare substring: it
+is reported as a miss of the proposal instead.
+
+The corpus is JSON lines, one labelled message each (response is the
+LLM's first answer, optional):
+
+    {"query": "What did the Senate vote on today?", "search": true}
+    {"query": "Thanks, that's all I needed", "search": false}
+
+Usage:
+    python3 query_triggers.py                               # query-corpus.jsonl vs the live ai-service.js
+    python3 query_triggers.py --file ai-service.js --corpus chats.jsonl --json /tmp/triggers.json
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import re
+import sys
+
+from patch_engine import PatchError, Source, apply_edits
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+AI_SERVICE = '/var/www/workforce-democracy/backend/ai-service.js'
+CORPUS = os.path.join(SCRIPT_DIR, 'query-corpus.jsonl')
+FIX_POLICY_KEYWORDS = os.path.join(SCRIPT_DIR, 'fix-policy-keywords.py')
+
+# Typical searchAdditionalSources cost, for the latency estimate
+SEARCH_SECONDS = 3.0
+
+# Tightest first: (before, after, label) around the keyword's regex source,
+# joined by concatenation since a keyword may hold braces (\d{4})
+VARIANTS = [
+    (r'\b', r'\b', 'whole word'),
+    (r'\b', r'(?:s|es)?\b', 'word + plural'),
+    (r'\b', '', 'word start'),
+]
+
+_MATCH = re.compile(r'const (\w+) = (messageLower|responseLower)\.match\(\s*/((?:\\.|[^/\\\n])+)/([a-z]*)\s*\)')
+_WORD_LIST = re.compile(r'const (\w+) = \[([^\]]*)\];')
+_SOME = re.compile(r'const (\w+) = (\w+)\.some\(\s*(\w+)\s*=>([^;]*)\);')
+_RETURN = re.compile(r'return ([\w\s|]+);')
+
+
+# =============================================================================
+# RULES
+# =============================================================================
+
+def _alternatives(pattern):
+    """Top-level alternatives of a regex source"""
+    parts = []
+    depth = 0
+    in_class = False
+    current = ''
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == '\\':
+            current += pattern[i:i + 2]
+            i += 2
+            continue
+        if in_class:
+            in_class = char != ']'
+        elif char == '[':
+            in_class = True
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == '|' and depth == 0:
+            parts.append(current)
+            current = ''
+            i += 1
+            continue
+        current += char
+        i += 1
+    parts.append(current)
+    return parts
+
+
+class Clause:
+    """One `const name = ...` test of needsCurrentInfo: a keyword list
+    tested against the message and/or the LLM's response"""
+
+    def __init__(self, name, keywords, targets, kind='regex'):
+        self.name = name
+        self.keywords = keywords        # regex sources
+        self.targets = targets          # ('message',), ('response',) or both
+        self.kind = kind                # 'regex' (.match) or 'words' (.some/includes)
+        self._compiled = [re.compile(keyword) for keyword in keywords]
+
+    def hits(self, message, response):
+        """The keywords that match, in clause order"""
+        texts = [message if target == 'message' else response for target in self.targets]
+        return [keyword for keyword, regex in zip(self.keywords, self._compiled)
+                if any(regex.search(text) for text in texts)]
+
+    def pattern(self):
+        """The keywords as one regex, whole-word ones folded into a
+        single \\b(?:...)\\b group"""
+        whole = [keyword for keyword in self.keywords
+                 if keyword.startswith(r'\b') and keyword.endswith(r'\b') and '\\b' not in keyword[2:-2]
+                 and '(' not in keyword]
+        if len(whole) < 2:
+            return '|'.join(self.keywords)
+        words = [keyword[2:-2] for keyword in whole]
+        rest = [keyword for keyword in self.keywords if keyword not in whole]
+        return '|'.join([r'\b(?:' + '|'.join(words) + r')\b'] + rest)
+
+
+def _escape(word):
+    return re.sub(r'[\\^$.*+?()[\]{}|/]', r'\\\g<0>', word)
+
+
+def _targets(text):
+    return tuple(target for target, variable in (('message', 'messageLower'), ('response', 'responseLower'))
+                 if variable in text)
+
+
+def extract_rules(text):
+    """[Clause] in the order needsCurrentInfo's return statement ORs
+    them, from the text of the function"""
+    clauses = {}
+    for name, variable, pattern, _ in _MATCH.findall(text):
+        target = 'message' if variable == 'messageLower' else 'response'
+        clauses[name] = Clause(name, _alternatives(pattern), (target,))
+    words = {name: re.findall(r"'([^']*)'", body) for name, body in _WORD_LIST.findall(text)}
+    for name, array, _, body in _SOME.findall(text):
+        if array in words:
+            clauses[name] = Clause(name, [_escape(word) for word in words[array]], _targets(body), 'words')
+    returned = _RETURN.findall(text)
+    if not returned:
+        raise PatchError("needsCurrentInfo has no `return a || b || ...;` statement")
+    order = [name.strip() for name in returned[-1].split('||')]
+    missing = [name for name in order if name not in clauses]
+    if missing:
+        raise PatchError(f"can't read needsCurrentInfo clauses: {', '.join(missing)}")
+    return [clauses[name] for name in order]
+
+
+def _policy_patch():
+    spec = importlib.util.spec_from_file_location('fix_policy_keywords', FIX_POLICY_KEYWORDS)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.PATCH
+
+
+def load_rules(path, with_policy_patch=True):
+    """(clauses, note) for needsCurrentInfo in path, after applying
+    fix-policy-keywords.py in memory when it isn't applied yet"""
+    source = Source.read(path)
+    note = None
+    if with_policy_patch and os.path.exists(FIX_POLICY_KEYWORDS):
+        patch = _policy_patch()
+        if not patch.applied(source.text):
+            try:
+                text, _ = apply_edits(source, patch.edits)
+            except PatchError:
+                note = "fix-policy-keywords.py doesn't apply to this file - rules as they are"
+            else:
+                source = Source(text)
+                note = "with fix-policy-keywords.py's isPolicyQuery applied in memory"
+    start, end = source.function('needsCurrentInfo')
+    return extract_rules(''.join(source.lines[start:end])), note
+
+
+def load_corpus(path):
+    corpus = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip() or line.lstrip().startswith('#'):
+                continue
+            entry = json.loads(line)
+            if 'query' not in entry or not isinstance(entry.get('search'), bool):
+                raise ValueError(f"{path}:{number}: needs \"query\" and a true/false \"search\" label")
+            corpus.append(entry)
+    return corpus
+
+
+# =============================================================================
+# REPORT
+# =============================================================================
+
+def _ratio(part, whole):
+    return part / whole if whole else None
+
+
+def replay(clauses, corpus):
+    """Per-clause and per-keyword counts plus the overall confusion
+    counts of the clauses over the corpus"""
+    stats = {clause.name: {'fired': 0, 'true': 0, 'only': 0, 'only_false': 0,
+                           'keywords': {keyword: {'fired': 0, 'true': 0, 'examples': []}
+                                        for keyword in clause.keywords}}
+             for clause in clauses}
+    totals = {'queries': len(corpus), 'labelled': 0, 'fired': 0, 'true_positive': 0, 'false_positive': 0,
+              'false_negative': 0}
+    misses = []
+    for entry in corpus:
+        message = entry['query'].lower()
+        response = entry.get('response', '').lower()
+        label = entry['search']
+        fired = []
+        for clause in clauses:
+            hits = clause.hits(message, response)
+            if not hits:
+                continue
+            fired.append(clause.name)
+            clause_stats = stats[clause.name]
+            clause_stats['fired'] += 1
+            clause_stats['true'] += label
+            for keyword in hits:
+                keyword_stats = clause_stats['keywords'][keyword]
+                keyword_stats['fired'] += 1
+                keyword_stats['true'] += label
+                if not label and len(keyword_stats['examples']) < 3:
+                    keyword_stats['examples'].append(entry['query'])
+        if len(fired) == 1:
+            stats[fired[0]]['only'] += 1
+            stats[fired[0]]['only_false'] += not label
+        totals['labelled'] += label
+        totals['fired'] += bool(fired)
+        totals['true_positive'] += bool(fired) and label
+        totals['false_positive'] += bool(fired) and not label
+        if label and not fired:
+            totals['false_negative'] += 1
+            misses.append(entry['query'])
+    totals['trigger_rate'] = _ratio(totals['fired'], totals['queries'])
+    totals['precision'] = _ratio(totals['true_positive'], totals['fired'])
+    totals['recall'] = _ratio(totals['true_positive'], totals['labelled'])
+    totals['misses'] = misses
+    return stats, totals
+
+
+def propose(clauses, corpus):
+    """Clauses with every keyword at its tightest variant, loosened only
+    where a labelled query the current rules catch would otherwise stop
+    triggering - and then on the keyword that needs the least loosening.
+    Never looser than word start: queries only caught by a keyword inside
+    another word are left to miss. Returns (clauses, [(clause, keyword,
+    variant label, queries that kept it loose)], [(query, keywords that
+    caught it by accident)])."""
+    variants = {(clause.name, keyword): [Clause(clause.name, [before + keyword + after], clause.targets)
+                                         for before, after, _ in VARIANTS]
+                for clause in clauses for keyword in clause.keywords}
+    levels = dict.fromkeys(variants, 0)
+    reasons = {key: [] for key in variants}
+    accidental = []
+    for entry in corpus:
+        if not entry['search']:
+            continue
+        message = entry['query'].lower()
+        response = entry.get('response', '').lower()
+        candidates = [((clause.name, keyword), clause) for clause in clauses
+                      for keyword in clause.hits(message, response)]
+        if not candidates:
+            continue
+        needed = []
+        for key, clause in candidates:
+            level = next((i for i, variant in enumerate(variants[key]) if variant.hits(message, response)), None)
+            if level is None:
+                continue
+            if level <= levels[key]:
+                break
+            needed.append((level, key))
+        else:
+            if not needed:
+                accidental.append((entry['query'], [keyword for (_, keyword), _ in candidates]))
+                continue
+            level, key = min(needed)
+            levels[key] = level
+            reasons[key].append(entry['query'])
+
+    proposed = [Clause(clause.name, [variants[clause.name, keyword][levels[clause.name, keyword]].keywords[0]
+                                     for keyword in clause.keywords], clause.targets, clause.kind)
+                for clause in clauses]
+    choices = [(name, keyword, VARIANTS[level][2], reasons[name, keyword])
+               for (name, keyword), level in levels.items()]
+    return proposed, choices, accidental
+
+
+def report(clauses, corpus):
+    """Everything the tool prints, as one JSON-able dict"""
+    stats, totals = replay(clauses, corpus)
+    proposed, choices, accidental = propose(clauses, corpus)
+    _, proposed_totals = replay(proposed, corpus)
+    return {
+        'current': {'totals': totals, 'clauses': stats},
+        'proposed': {'totals': proposed_totals,
+                     'clauses': {clause.name: clause.pattern() for clause in proposed}},
+        'changes': [{'clause': name, 'keyword': keyword, 'variant': label, 'loose_for': queries,
+                     'false_examples': stats[name]['keywords'][keyword]['examples']}
+                    for name, keyword, label, queries in choices],
+        'accidental': [{'query': query, 'keywords': keywords} for query, keywords in accidental],
+    }
+
+
+def _percent(value):
+    return '   -' if value is None else f"{value * 100:3.0f}%"
+
+
+def print_report(result, clauses, search_seconds=SEARCH_SECONDS):
+    totals = result['current']['totals']
+    stats = result['current']['clauses']
+    print(f"📊 {totals['queries']} queries, {totals['labelled']} labelled as needing a search\n")
+    print(f"{'clause':<22} {'fires':>6} {'rate':>5} {'precision':>9} {'only':>5} {'only false':>10}")
+    for clause in clauses:
+        row = stats[clause.name]
+        print(f"{clause.name:<22} {row['fired']:>6} {_percent(_ratio(row['fired'], totals['queries'])):>5} "
+              f"{_percent(_ratio(row['true'], row['fired'])):>9} {row['only']:>5} {row['only_false']:>10}")
+
+    noisy = sorted(((clause.name, keyword, row) for clause in clauses
+                    for keyword, row in stats[clause.name]['keywords'].items()
+                    if row['fired'] > row['true']),
+                   key=lambda item: item[2]['true'] - item[2]['fired'])
+    if noisy:
+        print("\n🔎 Keywords firing on queries that don't need a search:")
+        for name, keyword, row in noisy[:15]:
+            example = row['examples'][0] if row['examples'] else ''
+            print(f"   {keyword:<18} {name:<20} {row['fired'] - row['true']:>3} false / {row['fired']:<3}  "
+                  f"e.g. {example!r}")
+
+    proposed = result['proposed']['totals']
+    loosened = [change for change in result['changes'] if change['variant'] != 'whole word']
+    print("\n💡 Proposed: every keyword as a whole word, except")
+    for change in loosened:
+        print(f"   {change['keyword']:<18} {change['variant']:<14} {change['clause']:<20} "
+              f"for {change['loose_for'][0]!r}")
+    if not loosened:
+        print("   (none)")
+    print(f"\n{'':<10} {'trigger rate':>12} {'precision':>10} {'recall':>7}")
+    for label, row in (('current', totals), ('proposed', proposed)):
+        print(f"{label:<10} {_percent(row['trigger_rate']):>12} {_percent(row['precision']):>10} "
+              f"{_percent(row['recall']):>7}")
+    avoided = totals['false_positive'] - proposed['false_positive']
+    if totals['queries']:
+        per_thousand = avoided / totals['queries'] * 1000 * search_seconds
+        print(f"\n⏱️  {avoided} needless pre-searches avoided in this corpus "
+              f"(~{per_thousand / 60:.0f} min of search latency per 1,000 chats at {search_seconds:.0f}s each)")
+    accidental = result['accidental']
+    if accidental:
+        print(f"🎲 {len(accidental)} labelled queries only trigger now by a keyword inside another word "
+              f"and miss under the proposal:")
+        for entry in accidental[:5]:
+            print(f"   {entry['query']!r} ({', '.join(entry['keywords'])})")
+    lost = proposed['false_negative'] - totals['false_negative'] - len(accidental)
+    if lost:
+        print(f"⚠️  {lost} labelled queries no longer trigger - check the proposal")
+    if proposed['misses']:
+        print(f"⚠️  {len(proposed['misses'])} labelled queries trigger no clause at all, "
+              f"e.g. {proposed['misses'][0]!r}")
+
+    print("\n📋 Proposed patterns:")
+    for clause in clauses:
+        pattern = result['proposed']['clauses'][clause.name]
+        if pattern != clause.pattern():
+            print(f"   {clause.name}: /{pattern}/")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay labelled queries through needsCurrentInfo's rules")
+    parser.add_argument('--file', default=AI_SERVICE, help="ai-service.js (default: %(default)s)")
+    parser.add_argument('--corpus', default=CORPUS, help="labelled JSON lines (default: %(default)s)")
+    parser.add_argument('--json', help="also write the full report here")
+    parser.add_argument('--as-is', action='store_true', help="don't apply fix-policy-keywords.py in memory")
+    parser.add_argument('--search-seconds', type=float, default=SEARCH_SECONDS,
+                        help="cost of one pre-search, for the estimate (default: %(default)s)")
+    args = parser.parse_args()
+
+    try:
+        clauses, note = load_rules(args.file, not args.as_is)
+        corpus = load_corpus(args.corpus)
+    except (OSError, ValueError, PatchError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    print(f"🔧 needsCurrentInfo() in {args.file}: {len(clauses)} clauses"
+          + (f" ({note})" if note else ''))
+    result = report(clauses, corpus)
+    print_report(result, clauses, args.search_seconds)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+        print(f"\n💾 Full report: {args.json}")
+
+
+if __name__ == '__main__':
+    main()
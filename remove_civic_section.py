@@ -1,48 +1,48 @@
 #!/usr/bin/env python3
 """
 Remove the entire civic engagement section from index.html
-Lines 853-1550 (695 lines total)
+Finds <section id="civic"> by its id (not by line number), so it still
+removes the right block after the markup around it moves
 """
 
-# Read the file
-with open('index.html', 'r', encoding='utf-8') as f:
-    lines = f.readlines()
+import os
+import shutil
+import sys
 
-print(f"📖 Original file: {len(lines)} lines")
+from backup_store import BackupStore
+from optimize_html import optimize, print_report
 
-# Keep lines before civic section (1-852)
-# Skip civic section (853-1550) 
-# Keep lines after civic section (1551+)
+# Strip the section in one streaming pass, leaving a replacement comment;
+# written next to index.html first, so it's only replaced (and backed up)
+# when there was a section to remove
+stripped = '.index.html.civic-removal.tmp'
+rows, missing = optimize('index.html', stripped, strip=['civic'], notes={
+    'civic': 'CIVIC SECTION REMOVED - Visit civic-platform.html for advanced civic features '
+             '(replaced with Civic Platform v37.0.0)',
+})
 
-new_lines = []
-new_lines.extend(lines[:852])  # Lines 1-852 (index 0-851)
-
-# Add replacement comment
-new_lines.append('\n')
-new_lines.append('        <!-- CIVIC SECTION REMOVED - Visit civic-platform.html for advanced civic features -->\n')
-new_lines.append('        <!-- Old civic engagement interface replaced with Civic Platform v37.0.0 -->\n')
-new_lines.append('\n')
-
-new_lines.extend(lines[1550:])  # Lines 1551+ (index 1550+)
-
-print(f"📝 New file: {len(new_lines)} lines")
-print(f"✂️  Removed: {len(lines) - len(new_lines)} lines")
+if missing:
+    os.unlink(stripped)
+    print("⚠️ No <section id=\"civic\"> found - index.html is unchanged")
+    sys.exit(1)
 
 # Create backup
-with open('index.html.backup-civic-removal', 'w', encoding='utf-8') as f:
-    f.writelines(lines)
-print(f"💾 Backup saved: index.html.backup-civic-removal")
-
-# Write new file
-with open('index.html', 'w', encoding='utf-8') as f:
-    f.writelines(new_lines)
+backup = BackupStore.for_file('index.html').backup('index.html', 'civic-removal')
+print(f"💾 Backup saved: {backup['hash'][:12]} "
+      f"(restore with: python3 backup_store.py restore index.html {backup['hash'][:12]})")
+shutil.copymode('index.html', stripped)
+os.replace(stripped, 'index.html')
+
+civic = next(row for row in rows if row.name == 'civic')
+print_report(rows)
 print(f"✅ Civic section removed successfully!")
 
 print("\n🎯 Summary:")
-print(f"   • Removed lines 853-1550 (695 lines)")
+print(f"   • Removed <section id=\"civic\"> ({civic.bytes_in:,} bytes)")
 print(f"   • Added replacement comment")
 print(f"   • Navigation links already removed")
 print("\n📦 Next steps:")
 print("   1. Download index.html from this project")
 print("   2. Upload to Netlify with civic-platform.html + civic/ folder")
 print("   3. Test at workforcedemocracyproject.netlify.app")
+print("   4. For a smaller first load, also try: python3 optimize_html.py index.html -o dist/index.html --minify")
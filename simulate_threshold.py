@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+Threshold-vs-latency simulator for the iterative source search
+
+analyzeWithAI() keeps calling analyzeSourceGaps() and searching its
+follow-up queries while `sources.length < threshold` (up to
+MAX_SEARCH_ITERATIONS rounds), and each follow-up is another sequential
+searchAdditionalSources() call. increase-threshold.py moved that
+threshold from 8 to 12 without any numbers; this tool produces them.
+
+It replays RECORDED search responses: a local stub search service serves
+them over HTTP, and a node harness runs the file's own analyzeSourceGaps
+(threshold made a parameter) inside a copy of the PHASE 1.25 loop against
+that stub. For every threshold x follow-up cap (queries kept per round)
+it reports the unique sources gathered, the follow-up calls made and
+the latency they add, as a curve to pick the threshold from. Latency is
+the recorded one, summed on a virtual clock, so a sweep takes seconds.
+
+Recordings are JSON lines, one search each (root marks the user's own
+query, searched first like the pre-search does):
+
+    {"query": "snap cuts", "root": true, "latency_ms": 2140, "sources": [{"url": ..., "title": ...}]}
+    {"query": "SNAP benefits cuts 2025 statistics dollar amounts", "latency_ms": 1780, "sources": [...]}
+
+Usage:
+    # once, on the server: search the queries (and every follow-up they lead to) for real
+    python3 simulate_threshold.py --record queries.txt --file /var/www/workforce-democracy/backend/ai-service.js
+    # anywhere, offline
+    python3 simulate_threshold.py --thresholds 6,8,10,12,15,20,25 --caps 1,3,5 --csv /tmp/threshold-curve.csv
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from keyword_matcher import BLOCK_END, BLOCK_START
+from patch_engine import PatchError, Source
+
+AI_SERVICE = '/var/www/workforce-democracy/backend/ai-service.js'
+RECORDINGS = 'search-recordings.jsonl'
+THRESHOLDS = (4, 6, 8, 10, 12, 15, 20, 25)
+CAPS = (1, 3, 5)
+MAX_SEARCH_ITERATIONS = 5
+
+_THRESHOLD_TEST = re.compile(r'sources\.length < (\d+|SOURCE_THRESHOLD)\b')
+_CONSTANT = re.compile(r'^const (SOURCE_THRESHOLD|MAX_SEARCH_ITERATIONS) = (\d+);', re.M)
+
+
+# =============================================================================
+# GAP ANALYSIS FROM ai-service.js
+# =============================================================================
+
+def extract_gap_analysis(path):
+    """(JS defining analyzeSourceGaps with its threshold read from
+    SIM.threshold, the file's threshold, its follow-up cap and its
+    MAX_SEARCH_ITERATIONS)"""
+    source = Source.read(path)
+    start, end = source.function('analyzeSourceGaps')
+    function = ''.join(source.lines[start:end])
+    tests = _THRESHOLD_TEST.findall(function)
+    if not tests:
+        raise PatchError("analyzeSourceGaps has no `sources.length < N` test to sweep")
+    constants = dict((name, int(value)) for name, value in _CONSTANT.findall(source.text))
+    current = constants.get('SOURCE_THRESHOLD') if tests[0] == 'SOURCE_THRESHOLD' else int(tests[0])
+    cap = re.search(r'followUpQueries\.slice\(0, (\d+)\)', function)
+    parts = []
+    block_start = source.find(BLOCK_START)
+    if block_start is not None:
+        block_end = source.find(BLOCK_END, block_start)
+        parts.append(''.join(source.lines[block_start:block_end + 1]))
+    parts.append(_THRESHOLD_TEST.sub('sources.length < SIM.threshold', function))
+    return ('\n'.join(parts), current, int(cap.group(1)) if cap else None,
+            constants.get('MAX_SEARCH_ITERATIONS', MAX_SEARCH_ITERATIONS))
+
+
+# =============================================================================
+# STUB SEARCH SERVICE
+# =============================================================================
+
+def load_recordings(path):
+    recordings = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                recordings[entry['query']] = entry
+    return recordings
+
+
+class StubSearch(ThreadingHTTPServer):
+    """GET /search?q=... answers with the recorded sources and latency;
+    queries that were never recorded get no sources and the median
+    latency, and are counted"""
+
+    daemon_threads = True
+
+    def __init__(self, recordings):
+        self.recordings = recordings
+        latencies = [entry['latency_ms'] for entry in recordings.values()]
+        self.default_latency = statistics.median(latencies) if latencies else 0
+        self.unrecorded = set()
+        super().__init__(('127.0.0.1', 0), _StubHandler)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and body go out as separate writes; don't let them wait on
+    # the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query).get('q', [''])[0]
+        entry = self.server.recordings.get(query)
+        if entry is None:
+            self.server.unrecorded.add(query)
+            entry = {'sources': [], 'latency_ms': self.server.default_latency}
+        body = json.dumps({'sources': entry['sources'], 'latency_ms': entry['latency_ms']}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+# =============================================================================
+# SIMULATION
+# =============================================================================
+
+# The PHASE 1.25 loop of analyzeWithAI(), with the follow-up searches
+# going to the stub and their recorded latency added up instead of waited
+_HARNESS = r'''
+const SIM = { threshold: 0 };
+console.log = () => {};
+
+%(gap_analysis)s
+
+let calls = 0;
+let latency = 0;
+async function searchAdditionalSources(query) {
+    const response = await fetch(`${STUB}/search?q=${encodeURIComponent(query)}`);
+    const data = await response.json();
+    calls++;
+    latency += data.latency_ms;
+    return data.sources;
+}
+
+async function gather(query, cap, maxIterations) {
+    let sources = await searchAdditionalSources(query);
+    const presearch = latency;
+    calls = 0;
+    latency = 0;
+    let iteration = 0;
+    while (sources.length < SIM.threshold && iteration < maxIterations) {
+        iteration++;
+        const gaps = analyzeSourceGaps(sources, query);
+        if (!gaps.needsMoreData || gaps.followUpQueries.length === 0) break;
+        const followUpSources = [];
+        for (const followUpQuery of gaps.followUpQueries.slice(0, cap)) {
+            followUpSources.push(...await searchAdditionalSources(followUpQuery));
+        }
+        const existingUrls = new Set(sources.map(s => s.url));
+        const newSources = followUpSources.filter(s => !existingUrls.has(s.url));
+        if (newSources.length === 0) break;
+        sources.push(...newSources);
+    }
+    return { sources: new Set(sources.map(s => s.url)).size, calls, added_ms: latency, presearch_ms: presearch,
+             iterations: iteration };
+}
+
+let STUB;
+(async () => {
+    let input = '';
+    for await (const chunk of process.stdin) input += chunk;
+    const config = JSON.parse(input);
+    STUB = config.stub;
+    const results = [];
+    for (const threshold of config.thresholds) {
+        SIM.threshold = threshold;
+        for (const cap of config.caps) {
+            for (const query of config.queries) {
+                latency = 0;
+                calls = 0;
+                results.push({ threshold, cap, query, ...await gather(query, cap, config.iterations) });
+            }
+        }
+    }
+    process.stdout.write(JSON.stringify(results));
+})().catch(error => { process.stderr.write(String(error.stack || error)); process.exit(1); });
+'''
+
+
+def _run_node(script, config):
+    fd, path = tempfile.mkstemp(prefix='threshold-sim-', suffix='.js')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(script)
+        result = subprocess.run(['node', path], input=json.dumps(config), capture_output=True, text=True)
+    finally:
+        os.unlink(path)
+    if result.returncode != 0:
+        raise RuntimeError(f"node harness failed:\n{result.stderr.strip()}")
+    return json.loads(result.stdout)
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1)] if ordered else 0
+
+
+def simulate(gap_analysis, recordings, thresholds=THRESHOLDS, caps=CAPS, iterations=MAX_SEARCH_ITERATIONS):
+    """(one row per threshold x cap, queries the stub had no recording
+    for). Rows average over the recorded root queries."""
+    queries = [query for query, entry in recordings.items() if entry.get('root')]
+    if not queries:
+        raise ValueError("no root queries in the recordings")
+    stub = StubSearch(recordings)
+    thread = threading.Thread(target=stub.serve_forever, daemon=True)
+    thread.start()
+    try:
+        runs = _run_node(_HARNESS % {'gap_analysis': gap_analysis}, {
+            'stub': stub.url, 'queries': queries, 'thresholds': list(thresholds), 'caps': list(caps),
+            'iterations': iterations,
+        })
+    finally:
+        stub.shutdown()
+        stub.server_close()
+
+    rows = []
+    for threshold in thresholds:
+        for cap in caps:
+            group = [run for run in runs if run['threshold'] == threshold and run['cap'] == cap]
+            rows.append({
+                'threshold': threshold,
+                'cap': cap,
+                'sources': statistics.mean(run['sources'] for run in group),
+                'reached': sum(run['sources'] >= threshold for run in group) / len(group),
+                'calls': statistics.mean(run['calls'] for run in group),
+                'added_ms': statistics.mean(run['added_ms'] for run in group),
+                'p95_added_ms': _percentile([run['added_ms'] for run in group], 0.95),
+                'iterations': statistics.mean(run['iterations'] for run in group),
+            })
+    return rows, sorted(stub.unrecorded)
+
+
+def print_curve(rows, current=None, current_cap=None):
+    print(f"{'threshold':>9} {'cap':>4} {'sources':>8} {'reached':>8} {'calls':>6} "
+          f"{'added latency':>14} {'p95':>8} {'rounds':>7}")
+    for row in rows:
+        marker = '  ◀ current' if (row['threshold'], row['cap']) == (current, current_cap) else ''
+        print(f"{row['threshold']:>9} {row['cap']:>4} {row['sources']:>8.1f} {row['reached'] * 100:>7.0f}% "
+              f"{row['calls']:>6.1f} {row['added_ms'] / 1000:>12.2f} s {row['p95_added_ms'] / 1000:>6.2f} s "
+              f"{row['iterations']:>7.1f}{marker}")
+
+
+# =============================================================================
+# RECORDING
+# =============================================================================
+
+# Searches each query with the live searchAdditionalSources(), then every
+# follow-up analyzeSourceGaps could ask for (threshold out of the way),
+# timing each call. The recordings go to their own file (argv[3]): the
+# service logs to stdout, starting with its load banner
+_RECORDER = r'''
+const fs = require('fs');
+const path = require('path');
+const out = fs.openSync(process.argv[3], 'w');
+const service = require(path.resolve(process.argv[2]));
+const SIM = { threshold: Infinity };
+%(gap_analysis)s
+
+(async () => {
+    let input = '';
+    for await (const chunk of process.stdin) input += chunk;
+    const queries = JSON.parse(input);
+    const seen = new Set();
+    async function record(query, root) {
+        if (seen.has(query)) return;
+        seen.add(query);
+        const started = Date.now();
+        let sources = [];
+        try {
+            sources = await service.searchAdditionalSources(query, root ? query : '');
+        } catch (error) {
+            process.stderr.write(`search failed for ${JSON.stringify(query)}: ${error.message}\n`);
+        }
+        fs.writeSync(out, JSON.stringify({
+            query, root, latency_ms: Date.now() - started,
+            sources: sources.map(s => ({ url: s.url, title: s.title, source: s.source })),
+        }) + '\n');
+    }
+    for (const query of queries) {
+        await record(query, true);
+        for (const followUp of analyzeSourceGaps([], query).followUpQueries) await record(followUp, false);
+    }
+    fs.closeSync(out);
+    process.exit(0);
+})();
+'''
+
+
+def record(path, queries, out):
+    """Writes recordings for queries (and their follow-ups) made with
+    the live searchAdditionalSources() in path"""
+    gap_analysis, _, _, _ = extract_gap_analysis(path)
+    # every follow-up, not just the first five
+    gap_analysis = re.sub(r'followUpQueries\.slice\(0, \d+\)', 'followUpQueries', gap_analysis)
+    fd, script = tempfile.mkstemp(prefix='threshold-record-', suffix='.js', dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(_RECORDER % {'gap_analysis': gap_analysis})
+        result = subprocess.run(['node', script, path, os.path.abspath(out)], input=json.dumps(queries),
+                                stdout=subprocess.DEVNULL, text=True)
+    finally:
+        os.unlink(script)
+    if result.returncode != 0:
+        raise RuntimeError("recording failed")
+
+
+def _numbers(text):
+    return [int(value) for value in text.split(',') if value.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep the source threshold against recorded searches")
+    parser.add_argument('--file', default=AI_SERVICE, help="ai-service.js to take analyzeSourceGaps from "
+                                                           "(default: %(default)s)")
+    parser.add_argument('--recordings', default=RECORDINGS, help="JSON lines (default: %(default)s)")
+    parser.add_argument('--record', metavar='QUERIES', help="record a file of queries (one per line) first")
+    parser.add_argument('--thresholds', type=_numbers, default=THRESHOLDS)
+    parser.add_argument('--caps', type=_numbers, default=CAPS, help="follow-up queries kept per round")
+    parser.add_argument('--iterations', type=int, help="rounds (default: the file's MAX_SEARCH_ITERATIONS)")
+    parser.add_argument('--csv', help="also write the curve as CSV")
+    args = parser.parse_args()
+
+    try:
+        gap_analysis, current, cap, iterations = extract_gap_analysis(args.file)
+        if args.record:
+            with open(args.record, 'r', encoding='utf-8') as f:
+                queries = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+            print(f"🎙️  Recording {len(queries)} queries and their follow-ups with {args.file}...")
+            record(args.file, queries, args.recordings)
+        recordings = load_recordings(args.recordings)
+        print(f"🔁 Replaying {sum(1 for e in recordings.values() if e.get('root'))} queries "
+              f"({len(recordings)} recorded searches); {args.file} uses threshold {current}, "
+              f"{cap} follow-ups per round\n")
+        rows, unrecorded = simulate(gap_analysis, recordings, args.thresholds, args.caps,
+                                    args.iterations or iterations)
+    except (OSError, ValueError, RuntimeError, PatchError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    print_curve(rows, current, cap)
+    if unrecorded:
+        print(f"\n⚠️  {len(unrecorded)} follow-up queries had no recording (no sources, median latency), "
+              f"e.g. {unrecorded[0]!r} - re-record to include them")
+    if args.csv:
+        with open(args.csv, 'w', encoding='utf-8') as f:
+            f.write('threshold,cap,sources,reached,calls,added_ms,p95_added_ms,iterations\n')
+            for row in rows:
+                f.write(','.join(str(round(row[key], 3)) for key in
+                                 ('threshold', 'cap', 'sources', 'reached', 'calls', 'added_ms',
+                                  'p95_added_ms', 'iterations')) + '\n')
+        print(f"\n💾 Curve: {args.csv}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,60 +1,45 @@
 #!/usr/bin/env python3
 """
 Update article-scraper.js with improved selectors based on diagnostic results
-This script will be customized after running test-scrapers.js
+Reads the ranking evaluate_selectors.py writes from the saved fixture corpus
+(run that first: python3 evaluate_selectors.py)
 """
 
+import json
 import re
 import sys
 
-# Read scraper test results
-print("📊 Reading scraper diagnostic results...")
+RESULTS = sys.argv[1] if len(sys.argv) > 1 else '/tmp/scraper-selectors.json'
+
+# Read selector evaluation results
+print("📊 Reading selector evaluation results...")
 try:
-    with open('/tmp/scraper-test-results.txt', 'r') as f:
-        results = f.read()
+    with open(RESULTS, 'r', encoding='utf-8') as f:
+        results = json.load(f)
 except FileNotFoundError:
-    print("❌ Scraper test results not found. Run test-scrapers.js first!")
+    print("❌ Selector results not found. Run evaluate_selectors.py first!")
     sys.exit(1)
 
-# Parse results to find recommended selectors
+# Recommended selector (and scraper function) for each site
 recommendations = {}
+sites = {}
 
-# Extract recommendations for each site
-sites = {
-    'Common Dreams': 'scrapeCommonDreams',
-    'Democracy Now': 'scrapeDemocracyNow',
-    'Jacobin': 'scrapeJacobin',
-    'The Intercept': 'scrapeTheIntercept',
-    'ProPublica': 'scrapeProPublica'
-}
-
-for site_name, function_name in sites.items():
-    # Find the section for this site
-    site_section = re.search(
-        rf'TESTING: {site_name}.*?(?=TESTING:|DIAGNOSTIC COMPLETE)',
-        results,
-        re.DOTALL
-    )
-    
-    if site_section:
-        section_text = site_section.group(0)
-        
-        # Look for recommended selector
-        recommended = re.search(r'RECOMMENDED: "([^"]+)"', section_text)
-        
-        if recommended:
-            selector = recommended.group(1)
-            recommendations[site_name] = selector
-            print(f"✅ {site_name}: {selector}")
-        else:
-            print(f"⚠️  {site_name}: No working selector found")
+for site_name, site in results['sites'].items():
+    sites[site_name] = site['function']
+    if site['recommended']:
+        recommendations[site_name] = site['recommended']
+        best = site['ranking'][0]
+        print(f"✅ {site_name}: {site['recommended']} "
+              f"({best['fixtures_passed']}/{len(site['fixtures'])} pages, {best['chars']:,} chars)")
+    else:
+        print(f"⚠️  {site_name}: No working selector found")
 
 if not recommendations:
     print("\n❌ No recommendations found in test results")
     print("This might mean:")
-    print("  1. Scraper tests haven't been run yet")
+    print("  1. The fixture corpus is empty (run evaluate_selectors.py --fetch)")
     print("  2. All sites are JavaScript-rendered (need different approach)")
-    print("  3. Test results file is malformed")
+    print("  3. No selector in SELECTORS_TO_TEST matches the saved pages")
     sys.exit(1)
 
 print(f"\n✅ Found {len(recommendations)} recommended selector(s)")
@@ -80,7 +65,7 @@ for site_name, new_selector in recommendations.items():
         # Check if new selector is already first in list
         old_selectors = function_match.group(2)
         
-        if new_selector in old_selectors:
+        if f"'{new_selector}'" in old_selectors:
             print(f"ℹ️  {site_name}: Selector already present")
             continue
         
@@ -100,8 +85,8 @@ if updates_made > 0:
         f.write(scraper_content)
     
     print(f"\n✅ Successfully updated {updates_made} scraper(s)")
-    print("\n⚠️  IMPORTANT: Restart backend to apply changes:")
-    print("   pm2 stop backend && pm2 delete backend && pkill -9 node && pm2 start server.js --name backend")
+    print("\n⚠️  IMPORTANT: Reload backend to apply changes:")
+    print("   python3 pm2_reload.py --ecosystem /root/progressive-policy-assistant/backend/ecosystem.config.js")
 else:
     print("\n✅ All scrapers already have recommended selectors")
 